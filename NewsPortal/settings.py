@@ -53,7 +53,11 @@ SITE_ID = env.int("SITE_ID")
 
 # ── MIDDLEWARE ─────────────────────────────────────────────────────────────────
 MIDDLEWARE = [
+    # Задержки и счётчики по URL для /metrics; первым — чтобы мерить весь стек
+    "news.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    # SQL-статистика и детектор N+1; включается NEWS_SQL_STATS
+    "news.sqlstats.SQLStatsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.locale.LocaleMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -77,6 +81,8 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                # id категорий, на которые подписан пользователь (из кеша)
+                "news.context_processors.subscribed_categories",
             ],
         },
     },
@@ -154,9 +160,95 @@ CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = TIME_ZONE
 
 # ── ПОЧТА ──────────────────────────────────────────────────────────────────────
-EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
+# Обёртка считает письма для /metrics и передаёт их NEWS_METRICS_EMAIL_BACKEND
+EMAIL_BACKEND = "news.metrics.MetricsEmailBackend"
+NEWS_METRICS_EMAIL_BACKEND = env(
+    "EMAIL_BACKEND", default="django.core.mail.backends.console.EmailBackend"
+)
 DEFAULT_FROM_EMAIL = "dev@example.com"
 SITE_URL = env("SITE_URL", default="http://127.0.0.1:8000")
+# Сколько получателей в одной Celery-задаче рассылки (одно SMTP-соединение)
+NEWS_NOTIFICATION_CHUNK_SIZE = env.int("NEWS_NOTIFICATION_CHUNK_SIZE", default=500)
+# Сколько подписчиков дайджеста обрабатывается за один проход
+NEWS_DIGEST_CHUNK_SIZE = env.int("NEWS_DIGEST_CHUNK_SIZE", default=1000)
+
+# ── КЕШ ────────────────────────────────────────────────────────────────────────
+# Для нескольких воркеров нужен общий кеш, например CACHE_URL=redis://localhost:6379/2
+CACHES = {"default": env.cache_url("CACHE_URL", default="locmemcache://")}
+# locmem/dummy живут внутри процесса: воркеры, Celery и команды их не делят
+SHARED_CACHE = not CACHES["default"]["BACKEND"].endswith(("LocMemCache", "DummyCache"))
+# Страницы версионируются поколениями (news.cache), поэтому с общим кешем TTL
+# может быть долгим. С локальным кешем поколения у каждого процесса свои: запись
+# из другого воркера, Celery или команды их не сдвинет — держим TTL коротким
+NEWS_PAGE_CACHE_TIMEOUT = env.int(
+    "NEWS_PAGE_CACHE_TIMEOUT", default=3600 if SHARED_CACHE else 60
+)
+NEWS_PAGE_CLIENT_MAX_AGE = env.int("NEWS_PAGE_CLIENT_MAX_AGE", default=60)
+# Stale-while-revalidate: сколько секунд после истечения отдавать старую копию,
+# пока её перестраивает один запрос, и сколько ждать, если копии нет вовсе
+NEWS_CACHE_GRACE = env.int("NEWS_CACHE_GRACE", default=300)
+NEWS_CACHE_LOCK_TIMEOUT = env.int("NEWS_CACHE_LOCK_TIMEOUT", default=30)
+NEWS_CACHE_LOCK_WAIT = env.float("NEWS_CACHE_LOCK_WAIT", default=1.0)
+
+# ── ГОЛОСА ─────────────────────────────────────────────────────────────────────
+# Лайки копятся в кеше (news.votes) и сбрасываются в БД раз в N секунд.
+# Только с общим кешем: flush_votes идёт в другом процессе (планировщик/Celery)
+NEWS_VOTE_BUFFER = env.bool("NEWS_VOTE_BUFFER", default=SHARED_CACHE)
+NEWS_VOTE_FLUSH_INTERVAL = env.int("NEWS_VOTE_FLUSH_INTERVAL", default=10)
+
+# ── ЦЕНЗОР ────────────────────────────────────────────────────────────────────
+# Слова берутся из таблицы CensoredWord и (необязательно) из файла
+NEWS_CENSOR_WORDS_FILE = env("NEWS_CENSOR_WORDS_FILE", default="")
+NEWS_CENSOR_RELOAD_INTERVAL = env.int("NEWS_CENSOR_RELOAD_INTERVAL", default=5)
+# Хранить цензурированные title/text в посте — шаблоны не гоняют регулярку
+NEWS_CENSOR_ON_SAVE = env.bool("NEWS_CENSOR_ON_SAVE", default=False)
+
+# ── МАССОВАЯ ЗАГРУЗКА ──────────────────────────────────────────────────────────
+# Максимум постов в одном запросе POST /api/posts/bulk/
+NEWS_BULK_MAX_ITEMS = env.int("NEWS_BULK_MAX_ITEMS", default=500)
+
+# ── ПЕРСОНАЛЬНЫЕ ЛЕНТЫ ─────────────────────────────────────────────────────────
+# Категории с бо́льшим числом подписчиков не раскладываются по лентам при
+# публикации, а дочитываются при чтении /posts/my/
+NEWS_TIMELINE_FANOUT_LIMIT = env.int("NEWS_TIMELINE_FANOUT_LIMIT", default=10000)
+# Сколько последних записей ленты хранить на пользователя
+NEWS_TIMELINE_MAX_ENTRIES = env.int("NEWS_TIMELINE_MAX_ENTRIES", default=1000)
+
+# ── «В ТРЕНДЕ» ─────────────────────────────────────────────────────────────────
+# Очки поста за голос/комментарий вдвое меньше каждые HALF_LIFE_HOURS часов
+NEWS_TRENDING_HALF_LIFE_HOURS = env.float("NEWS_TRENDING_HALF_LIFE_HOURS", default=12)
+# Пересчёт снимка учитывает посты и комментарии за столько дней
+NEWS_TRENDING_WINDOW_DAYS = env.int("NEWS_TRENDING_WINDOW_DAYS", default=3)
+# Вес комментария относительно одного голоса
+NEWS_TRENDING_COMMENT_WEIGHT = env.float("NEWS_TRENDING_COMMENT_WEIGHT", default=2.0)
+# Длина готовых списков в кеше (на выборку: все, тип, категория, тип в категории)
+NEWS_TRENDING_SIZE = env.int("NEWS_TRENDING_SIZE", default=100)
+# Как часто пересчитывать снимок с нуля, секунд
+NEWS_TRENDING_REFRESH_INTERVAL = env.int("NEWS_TRENDING_REFRESH_INTERVAL", default=600)
+
+# ── ПОИСК ──────────────────────────────────────────────────────────────────────
+# Пусто — выбрать по БД: Postgres → нативный FTS, иначе таблица-индекс
+NEWS_SEARCH_BACKEND = env("NEWS_SEARCH_BACKEND", default="")
+
+# ── SQL-СТАТИСТИКА ─────────────────────────────────────────────────────────────
+# Заголовки X-DB-* и лог news.sqlstats для запросов и Celery-задач
+NEWS_SQL_STATS = env.bool("NEWS_SQL_STATS", default=False)
+# Доля замеряемых запросов/задач (0..1) — для продакшена
+NEWS_SQL_STATS_SAMPLE_RATE = env.float("NEWS_SQL_STATS_SAMPLE_RATE", default=1.0)
+# Сколько одинаковых SQL за запрос считать вероятным N+1
+NEWS_SQL_STATS_NPLUSONE_THRESHOLD = env.int(
+    "NEWS_SQL_STATS_NPLUSONE_THRESHOLD", default=5
+)
+NEWS_SQL_STATS_SLOWEST = env.int("NEWS_SQL_STATS_SLOWEST", default=3)
+
+# ── МЕТРИКИ ────────────────────────────────────────────────────────────────────
+# /metrics в формате Prometheus; счётчики воркеров суммируются через CACHES,
+# поэтому при нескольких процессах нужен общий кеш
+NEWS_METRICS = env.bool("NEWS_METRICS", default=True)
+# Как часто процесс сбрасывает накопленные дельты в кеш, секунд
+NEWS_METRICS_FLUSH_INTERVAL = env.int("NEWS_METRICS_FLUSH_INTERVAL", default=10)
+# Скрейперу нужен заголовок Authorization: Bearer <токен>; пусто — только персонал
+NEWS_METRICS_TOKEN = env("NEWS_METRICS_TOKEN", default="")
 
 # ── ЛОГИ ────────────────────────────────────────────────────────────────────────
 LOGGING = {
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.db.models import Prefetch
 
-from .models import Category, Post
+from .models import Category, CensoredWord, Post
 
 
 @admin.register(Post)
@@ -27,13 +27,20 @@ class PostAdmin(admin.ModelAdmin):
 
     def get_categories(self, obj):
         """Выводит список категорий в админке"""
-        return ", ".join(obj.categories.values_list("name", flat=True))
+        # .all(), а не values_list: берём prefetch из get_queryset без запроса
+        return ", ".join(category.name for category in obj.categories.all())
 
     get_categories.short_description = "Категории"
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ("name",)
+    list_display = ("name", "subscriber_count", "post_count")
     search_fields = ("name",)
     ordering = ("name",)
+
+
+@admin.register(CensoredWord)
+class CensoredWordAdmin(admin.ModelAdmin):
+    list_display = ("word",)
+    search_fields = ("word",)
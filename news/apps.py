@@ -6,4 +6,4 @@ class NewsConfig(AppConfig):
     name = "news"
 
     def ready(self):
-        pass
+        from . import checks, metrics, signals, sqlstats  # noqa: F401
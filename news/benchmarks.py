@@ -0,0 +1,183 @@
+"""
+Утилиты для замеров производительности (используются командами benchmark_*).
+"""
+
+from __future__ import annotations
+
+import logging
+import statistics
+import time
+from collections.abc import Callable
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+
+from celery import current_app
+from django.core import mail
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+
+@dataclass
+class BenchResult:
+    name: str
+    runs: int
+    median_ms: float
+    p95_ms: float
+    queries: int
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+    def as_row(self) -> str:
+        return (
+            f"{self.name:<40} {self.median_ms:>10.2f} {self.p95_ms:>10.2f} "
+            f"{self.queries:>8}"
+        )
+
+
+HEADER = f"{'сценарий':<40} {'median мс':>10} {'p95 мс':>10} {'запросы':>8}"
+
+
+def measure(name: str, func: Callable[[], object], repeat: int = 5) -> BenchResult:
+    """Прогнать ``func`` ``repeat`` раз, вернуть медиану/p95 и число SQL-запросов."""
+    with CaptureQueriesContext(connection) as ctx:
+        func()
+    queries = len(ctx.captured_queries)
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    timings.sort()
+    p95_index = min(len(timings) - 1, round(0.95 * (len(timings) - 1)))
+    return BenchResult(
+        name=name,
+        runs=repeat,
+        median_ms=statistics.median(timings),
+        p95_ms=timings[p95_index],
+        queries=queries,
+    )
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Сквозной набор сценариев (benchmark_suite)
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+@contextmanager
+def eager_celery():
+    """Задачи выполняются в процессе: .delay() не требует брокера."""
+    conf = current_app.conf
+    previous = conf.task_always_eager
+    conf.task_always_eager = True
+    try:
+        yield
+    finally:
+        conf.task_always_eager = previous
+
+
+def suite_scenarios() -> dict[str, Callable[[], object]]:
+    """
+    Сценарии набора на текущих данных: страницы сайта и API — через тестовый
+    клиент (весь стек middleware), рассылки — вызовом задач.
+    """
+    from .digest import WeeklyDigestBuilder
+    from .models import Category, Post
+    from .tasks import send_new_post_notifications
+
+    client = Client()
+    latest = Post.objects.order_by("-created_at").first()
+    popular = (
+        Category.objects.annotate(n=Count("category_posts"))
+        .order_by("-n", "pk")
+        .first()
+    )
+    # первое слово популярного заголовка — запрос с непустым результатом
+    term = latest.title.split()[0] if latest else "новости"
+
+    def get(path: str, **params) -> Callable[[], object]:
+        def run():
+            response = client.get(path, params)
+            if response.status_code >= 400:
+                raise RuntimeError(f"HTTP {response.status_code}")
+            return response
+
+        return run
+
+    def sending(task) -> Callable[[], object]:
+        def run():
+            with eager_celery():
+                result = task()
+            mail.outbox = []  # locmem-бэкенд копит письма между прогонами
+            return result
+
+        return run
+
+    return {
+        "news_list": get(reverse("news:news_list")),
+        "news_search": get(reverse("news:news_search"), q=term),
+        "news_detail": get(reverse("news:news_detail", args=[latest.pk])),
+        "category_detail": get(reverse("news:category_detail", args=[popular.pk])),
+        "post_list": get(reverse("news:post_list"), category=popular.pk),
+        "api_news": get("/api/news/"),
+        "api_articles": get("/api/articles/"),
+        "api_posts": get("/api/posts/"),
+        "weekly_digest": sending(lambda: WeeklyDigestBuilder().run()),
+        "new_post_notifications": sending(
+            lambda: send_new_post_notifications(latest.pk)
+        ),
+    }
+
+
+def run_scenarios(
+    scenarios: dict[str, Callable[[], object]], repeat: int
+) -> dict[str, dict]:
+    """Замерить каждый сценарий; упавший попадает в отчёт с ``error``."""
+    results = {}
+    # ошибка сценария уже есть в отчёте — трейсбек django.request не нужен
+    request_logger = logging.getLogger("django.request")
+    previous, request_logger.disabled = request_logger.disabled, True
+    try:
+        for name, func in scenarios.items():
+            try:
+                results[name] = measure(name, func, repeat=repeat).as_dict()
+            except Exception as exc:  # отчёт важнее одного упавшего сценария
+                results[name] = {"name": name, "error": f"{type(exc).__name__}: {exc}"}
+    finally:
+        request_logger.disabled = previous
+    return results
+
+
+def compare_reports(
+    old: dict, new: dict, threshold: float = 1.2
+) -> list[tuple[str, str, str, bool]]:
+    """
+    Сравнить два отчёта benchmark_suite: строки ``(размер, сценарий,
+    описание, регрессия?)``. Регрессия — медиана выросла больше чем в
+    ``threshold`` раз или стало больше SQL-запросов.
+    """
+    rows = []
+    for size, scenarios in new["results"].items():
+        for name, result in scenarios.items():
+            before = old.get("results", {}).get(size, {}).get(name)
+            if not before or "error" in before or "error" in result:
+                continue
+            ratio = (
+                result["median_ms"] / before["median_ms"] if before["median_ms"] else 1
+            )
+            more_queries = result["queries"] > before["queries"]
+            rows.append(
+                (
+                    size,
+                    name,
+                    f"{before['median_ms']:.2f} → {result['median_ms']:.2f} мс "
+                    f"(×{ratio:.2f}), запросы {before['queries']} → {result['queries']}",
+                    ratio > threshold or more_queries,
+                )
+            )
+    return rows
@@ -0,0 +1,141 @@
+"""
+Массовая запись постов (``POST /api/posts/bulk/``, импорт).
+
+Одиночный пост проходит через ``save()`` и сигналы: производные поля,
+связи с категориями, поисковый индекс, рейтинг автора, поколения кеша и
+рассылка. Здесь то же самое делается один раз на пачку: ``bulk_create`` /
+``bulk_update`` для постов, одна вставка строк ``PostCategory``, один
+``bump()`` (сигналы удалённых связей сливаются в него через ``coalesced()``),
+одна задача рассылки и одна раскладка по лентам на все новые посты.
+"""
+
+from __future__ import annotations
+
+from collections import Counter, defaultdict
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import cache as page_cache
+from .models import Author, Category, Post, PostCategory, PostType
+from .search import get_search_backend
+from .tasks import push_to_timelines, send_bulk_post_notifications
+
+BATCH_SIZE = 500
+
+# поля, которые можно менять массовым обновлением
+UPDATABLE_FIELDS = ("type", "title", "text", "author_id")
+
+
+@dataclass
+class BulkResult:
+    created: list[int] = field(default_factory=list)
+    updated: list[int] = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        return {"created": self.created, "updated": self.updated}
+
+
+def _rating_deltas(posts: Iterable[Post]) -> dict[int, int]:
+    """Сдвиги рейтингов авторов после смены автора у постов с рейтингом."""
+    deltas: dict[int, int] = defaultdict(int)
+    for post in posts:
+        before = post._rating_state
+        post.remember_rating_state()
+        for key, delta in post.rating_deltas(before, post._rating_state).items():
+            deltas[dict(key)["pk"]] += delta
+    return {pk: delta for pk, delta in deltas.items() if delta}
+
+
+def bulk_save_posts(items: list[dict], batch_size: int = BATCH_SIZE) -> BulkResult:
+    """
+    Создать или обновить посты из проверенных ``items``.
+
+    Элемент — словарь с ключами ``type``, ``title``, ``text``, ``author``
+    (pk автора или None), ``categories`` (список pk). Элемент с ``id``
+    обновляет существующий пост; отсутствующие ключи его не меняют, а
+    ``categories`` заменяет набор категорий целиком.
+    """
+    result = BulkResult()
+    updates = {item["id"]: item for item in items if item.get("id")}
+    creates = [item for item in items if not item.get("id")]
+
+    # удаление старых связей шлёт post_delete на каждую строку — bump() копим
+    with page_cache.coalesced(), transaction.atomic(), Category.batched_counts():
+        existing = Post.objects.in_bulk(updates)
+        relinked = [pk for pk, item in updates.items() if "categories" in item]
+        # старые категории тоже нужно инвалидировать
+        old_category_ids = set(
+            PostCategory.objects.filter(post_id__in=relinked).values_list(
+                "category_id", flat=True
+            )
+        )
+
+        now = timezone.now()
+        derived: set[str] = set()
+        for pk, item in updates.items():
+            post = existing[pk]
+            for name in UPDATABLE_FIELDS:
+                key = name.removesuffix("_id")
+                if key in item:
+                    setattr(post, name, item[key])
+            post.updated_at = now
+            derived.update(post.refresh_derived_fields())
+        if existing:
+            Post.objects.bulk_update(
+                existing.values(),
+                [*UPDATABLE_FIELDS, *sorted(derived), "updated_at"],
+                batch_size=batch_size,
+            )
+            for pk, delta in _rating_deltas(existing.values()).items():
+                Author.apply_rating_delta(delta, pk=pk)
+
+        new_posts = [
+            Post(
+                type=item.get("type") or PostType.ARTICLE,
+                title=item["title"],
+                text=item["text"],
+                author_id=item.get("author"),
+            )
+            for item in creates
+        ]
+        for post in new_posts:
+            post.refresh_derived_fields()
+        Post.objects.bulk_create(new_posts, batch_size=batch_size)
+
+        PostCategory.objects.filter(post_id__in=relinked).delete()
+        links = [
+            PostCategory(post_id=post.pk, category_id=category_id)
+            for post, item in [
+                *zip(new_posts, creates, strict=True),
+                *((existing[pk], updates[pk]) for pk in relinked),
+            ]
+            for category_id in dict.fromkeys(item.get("categories", ()))
+        ]
+        PostCategory.objects.bulk_create(links, batch_size=batch_size)
+        # bulk_create идёт мимо сигналов; удалённые связи посчитал post_delete
+        Category.apply_count_deltas(
+            "post_count", Counter(link.category_id for link in links)
+        )
+
+        saved = [*existing.values(), *new_posts]
+        get_search_backend().index_posts(saved)
+
+        page_cache.bump(
+            page_cache.GLOBAL,
+            *(page_cache.post_scope(post.pk) for post in saved),
+            *(
+                page_cache.category_scope(pk)
+                for pk in old_category_ids | {link.category_id for link in links}
+            ),
+        )
+
+        result.created = [post.pk for post in new_posts]
+        result.updated = list(existing)
+        if result.created:
+            created = result.created
+            transaction.on_commit(lambda: send_bulk_post_notifications.delay(created))
+            transaction.on_commit(lambda: push_to_timelines.delay(created))
+    return result
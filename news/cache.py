@@ -0,0 +1,470 @@
+"""
+Страничный и фрагментный кеш: поколения + stale-while-revalidate.
+
+Ключ закешированной страницы стабилен, а в самой записи лежит подпись
+поколений её «областей» (глобальная лента, категория, пост) и момент, до
+которого она свежая. Сигналы записи увеличивают счётчики поколений, и запись
+становится устаревшей сразу после изменения контента.
+
+Устаревшую запись перестраивает ровно один запрос — тот, кто взял короткую
+блокировку через ``cache.add``. Остальные в это время получают старую копию
+(пока не истёк ``NEWS_CACHE_GRACE``), а если копии нет — недолго ждут её
+появления. Так истечение популярной страницы не превращается в лавину
+одинаковых запросов к БД. Счётчики hit/miss/stale/regenerate лежат в том же
+кеше и видны через ``cache_stats()``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import time
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import (
+    get_cache_key,
+    get_conditional_response,
+    has_vary_header,
+    learn_cache_key,
+    patch_response_headers,
+    patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag
+from django.utils.translation import get_language
+
+GLOBAL = "global"
+CATEGORIES = "categories"
+RATINGS = "ratings"  # голоса: меняют только рейтинги в ответах API
+AUTHORS = "authors"  # имена авторов на страницах постов
+CENSOR = "censor"  # словарь цензора: заголовки и тексты на страницах постов
+
+GENERATION_TIMEOUT = None  # счётчики не должны истекать раньше страниц
+PAGE_KEY_PREFIX = "pg"
+
+STAT_EVENTS = ("hit", "miss", "stale", "regenerate", "not_modified")
+STAT_NAMESPACES = ("page", "fragment")
+
+
+def category_scope(pk: int) -> str:
+    return f"category:{pk}"
+
+
+def post_scope(pk: int) -> str:
+    return f"post:{pk}"
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Поколения
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+def _generation_key(scope: str) -> str:
+    return f"gen:{scope}"
+
+
+def _fresh_generation() -> int:
+    # после вытеснения счётчика новое значение не совпадёт ни с одним прежним
+    return time.time_ns() // 1000
+
+
+def get_generations(scopes: Iterable[str]) -> list[int]:
+    """Текущие поколения областей (одним get_many, отсутствующие создаются)."""
+    scopes = list(scopes)
+    keys = [_generation_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    missing = {key: _fresh_generation() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, GENERATION_TIMEOUT)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def generation_signature(scopes: Iterable[str]) -> str:
+    """Подпись поколений ``scopes``: меняется после любого bump() одной из них."""
+    return ".".join(str(g) for g in get_generations(scopes))
+
+
+def _changed_key(scope: str) -> str:
+    return f"gen-at:{scope}"
+
+
+@dataclass
+class _Pending:
+    scopes: set[str] = field(default_factory=set)
+    keys: set[str] = field(default_factory=set)
+
+
+_pending: ContextVar[_Pending | None] = ContextVar("news_cache_pending", default=None)
+
+
+@contextmanager
+def coalesced() -> Iterator[None]:
+    """
+    Копить bump()/delete_keys() внутри блока и выполнить их на выходе одним
+    bump() и одним delete_many — для пачечных операций (сотни сигналов подряд).
+    Вложенный блок сливается с внешним.
+    """
+    if _pending.get() is not None:
+        yield
+        return
+    pending = _Pending()
+    token = _pending.set(pending)
+    try:
+        yield
+    finally:
+        _pending.reset(token)
+        if pending.keys:
+            delete_keys(*pending.keys)
+        if pending.scopes:
+            bump(*pending.scopes)
+
+
+def _after_commit_too(func: Callable[[], None]) -> None:
+    """
+    Выполнить ``func`` сейчас и ещё раз после коммита внешней транзакции.
+
+    Сигналы срабатывают до коммита (ATOMIC_REQUESTS=True): параллельный
+    запрос может увидеть новое поколение, отрендерить ещё старые строки и
+    сохранить страницу под новым поколением. Повтор после коммита делает
+    такую копию (и выданный с ней ETag) устаревшей. Откат оставляет лишь
+    лишнюю инвалидацию.
+    """
+    func()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(func)
+
+
+def delete_keys(*keys: str) -> None:
+    """``cache.delete_many`` с учётом coalesced() и коммита транзакции."""
+    pending = _pending.get()
+    if pending is not None:
+        pending.keys.update(keys)
+        return
+    keys = list(dict.fromkeys(keys))
+    _after_commit_too(lambda: cache.delete_many(keys))
+
+
+def bump(*scopes: str) -> None:
+    """Инвалидировать все страницы, зависящие от ``scopes`` (и после коммита)."""
+    pending = _pending.get()
+    if pending is not None:
+        pending.scopes.update(scopes)
+        return
+    scopes = tuple(dict.fromkeys(scopes))
+    _after_commit_too(lambda: _bump_generations(scopes))
+
+
+def _bump_generations(scopes: tuple[str, ...]) -> None:
+    for scope in scopes:
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_generation(), GENERATION_TIMEOUT)
+    # округление вверх: Last-Modified не должен оказаться раньше изменения
+    changed_at = math.ceil(time.time())
+    cache.set_many(
+        {_changed_key(scope): changed_at for scope in scopes}, GENERATION_TIMEOUT
+    )
+
+
+def last_changed(scopes: Iterable[str]) -> int:
+    """Unix-время последнего bump() любой из ``scopes`` (для Last-Modified)."""
+    keys = [_changed_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    # вытесненная отметка считается «изменилось сейчас» — это безопасно
+    missing = {key: math.ceil(time.time()) for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, GENERATION_TIMEOUT)
+        found.update(missing)
+    return max(found.values(), default=math.ceil(time.time()))
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Условные GET (ETag / Last-Modified)
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+# Страница зависит от зрителя: подписки и формы пользователя, CSRF-токен,
+# flash-сообщения. Всё это определяют cookies (сессия, csrftoken, messages),
+# поэтому ETag и ключ серверной копии учитывают заголовок Cookie, а ответы
+# несут ``Vary: Cookie``. Анонимы без cookies по-прежнему делят одну копию.
+VARY_ON = ("Cookie",)
+
+
+def make_etag(request, generation: str, *parts: str) -> str:
+    """ETag ответа: поколения + URL с параметрами + язык + cookies (+ формат)."""
+    raw = "|".join(
+        [
+            generation,
+            request.get_full_path(),
+            get_language() or "",
+            request.META.get("HTTP_COOKIE", ""),
+            *parts,
+        ]
+    )
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+def conditional_response(request, etag: str, last_modified: int):
+    """
+    304 (или 412), если у клиента актуальная копия; иначе None.
+
+    Дата не различает зрителей (копия анонима и после входа «не изменилась»),
+    поэтому при cookies ``If-Modified-Since`` не учитывается — только ETag.
+    """
+    if request.COOKIES:
+        last_modified = None
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        patch_vary_headers(response, VARY_ON)
+        _count("page", "not_modified")
+    return response
+
+
+def set_validators(response, etag: str, last_modified: int) -> None:
+    # до learn_cache_key: иначе ключ копии не учтёт cookies, а Vary
+    # от SessionMiddleware появится уже после кеширования
+    patch_vary_headers(response, VARY_ON)
+    if response.status_code == 200:
+        response.headers.setdefault("ETag", etag)
+        response.headers.setdefault("Last-Modified", http_date(last_modified))
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Настройки и счётчики
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+def page_timeout() -> int:
+    return getattr(settings, "NEWS_PAGE_CACHE_TIMEOUT", 3600)
+
+
+def client_max_age() -> int:
+    return getattr(settings, "NEWS_PAGE_CLIENT_MAX_AGE", 60)
+
+
+def grace_period() -> int:
+    return getattr(settings, "NEWS_CACHE_GRACE", 300)
+
+
+def lock_timeout() -> int:
+    return getattr(settings, "NEWS_CACHE_LOCK_TIMEOUT", 30)
+
+
+def lock_wait() -> float:
+    return getattr(settings, "NEWS_CACHE_LOCK_WAIT", 1.0)
+
+
+def _stat_key(namespace: str, event: str) -> str:
+    return f"cache-stats:{namespace}:{event}"
+
+
+def _count(namespace: str, event: str) -> None:
+    key = _stat_key(namespace, event)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # ключа нет: add атомарен, а проигравший гонку инкрементирует сам
+        # (с DummyCache add «успешен», и до incr дело не доходит)
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def cache_stats() -> dict[str, dict[str, int]]:
+    """Счётчики ``{namespace: {hit, miss, stale, regenerate}}`` одним get_many."""
+    keys = {
+        (ns, event): _stat_key(ns, event)
+        for ns in STAT_NAMESPACES
+        for event in STAT_EVENTS
+    }
+    values = cache.get_many(keys.values())
+    stats: dict[str, dict[str, int]] = {ns: {} for ns in STAT_NAMESPACES}
+    for (ns, event), key in keys.items():
+        stats[ns][event] = values.get(key, 0)
+    return stats
+
+
+def reset_cache_stats() -> None:
+    cache.delete_many(
+        [_stat_key(ns, event) for ns in STAT_NAMESPACES for event in STAT_EVENTS]
+    )
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Stale-while-revalidate
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+def _always(value) -> bool:
+    return True
+
+
+def fetch(
+    key: str,
+    build: Callable[[], object],
+    timeout: int,
+    generation: str = "",
+    namespace: str = "fragment",
+    should_store: Callable[[object], bool] = _always,
+):
+    """
+    Значение из кеша по ``key`` или результат ``build()`` — но строит его
+    только один конкурентный запрос.
+
+    Запись ``(generation, fresh_until, value)`` свежая, пока совпадает
+    поколение и не прошёл ``timeout``; после этого она ещё ``grace_period()``
+    секунд отдаётся тем, кто не получил блокировку на перестройку.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        entry_generation, fresh_until, value = entry
+        if entry_generation == generation and time.time() < fresh_until:
+            _count(namespace, "hit")
+            return value
+
+    lock_key = f"lock:{key}"
+    locked = cache.add(lock_key, 1, lock_timeout())
+    if not locked:
+        if entry is not None:
+            _count(namespace, "stale")
+            return entry[2]
+        # копии нет: ждём, пока её построит держатель блокировки
+        deadline = time.monotonic() + lock_wait()
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(key)
+            if entry is not None and entry[0] == generation:
+                _count(namespace, "hit")
+                return entry[2]
+
+    try:
+        _count(namespace, "miss" if entry is None else "regenerate")
+        value = build()
+        if should_store(value):
+            cache.set(
+                key,
+                (generation, time.time() + timeout, value),
+                timeout + grace_period(),
+            )
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return value
+
+
+def cached_fragment(
+    name: str,
+    build: Callable[[], object],
+    scopes: Iterable[str] = (),
+    timeout: int | None = None,
+):
+    """Фрагмент (кусок HTML, агрегат, счётчик), перестраиваемый одним запросом."""
+    return fetch(
+        f"frag:{name}",
+        build,
+        timeout=timeout or page_timeout(),
+        generation=generation_signature(scopes),
+        namespace="fragment",
+    )
+
+
+def _is_cacheable(request, response) -> bool:
+    """Те же правила, что у UpdateCacheMiddleware."""
+    if response.streaming or response.status_code != 200:
+        return False
+    if "private" in response.get("Cache-Control", ""):
+        return False
+    if not request.COOKIES and response.cookies and has_vary_header(response, "Cookie"):
+        return False
+    return True
+
+
+def versioned_cache_page(
+    timeout: int | None = None,
+    scopes: Callable[..., Iterable[str]] | Iterable[str] = (GLOBAL,),
+):
+    """
+    Аналог ``cache_page`` со stale-while-revalidate и поколениями ``scopes``.
+
+    ``scopes`` — список областей или функция ``(request, *args, **kwargs)``.
+    Кеш на сервере живёт ``timeout`` (по умолчанию NEWS_PAGE_CACHE_TIMEOUT),
+    а клиентам отдаётся короткий ``max-age``: свежесть обеспечивает сервер.
+    ETag/Last-Modified считаются по поколениям без запросов к БД, и
+    ``If-None-Match``/``If-Modified-Since`` получают 304 до рендера.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped(request, *args, **kwargs):
+            if request.method != "GET":
+                return view_func(request, *args, **kwargs)
+
+            page_ttl = timeout or page_timeout()
+            view_scopes = (
+                scopes(request, *args, **kwargs) if callable(scopes) else scopes
+            )
+
+            # подпись берётся до рендера: запись во время рендера её устарит
+            generation = generation_signature(view_scopes)
+            etag = make_etag(request, generation)
+            modified = last_changed(view_scopes)
+            not_modified = conditional_response(request, etag, modified)
+            if not_modified is not None:
+                return not_modified
+
+            def build():
+                response = view_func(request, *args, **kwargs)
+                if hasattr(response, "render") and callable(response.render):
+                    response.render()
+                # валидаторы хранятся вместе с копией: устаревшая копия
+                # отдаётся со своим ETag, а не с текущим
+                set_validators(response, etag, modified)
+                if _is_cacheable(request, response):
+                    patch_response_headers(response, client_max_age())
+                    if response.has_header("Expires"):
+                        del response.headers["Expires"]
+                return response
+
+            def should_store(response) -> bool:
+                return _is_cacheable(request, response)
+
+            key = get_cache_key(request, PAGE_KEY_PREFIX, "GET", cache=cache)
+            if key is not None:
+                return fetch(
+                    key,
+                    build,
+                    timeout=page_ttl,
+                    generation=generation,
+                    namespace="page",
+                    should_store=should_store,
+                )
+
+            # Vary-заголовки этого URL ещё неизвестны: первый ответ их запомнит
+            _count("page", "miss")
+            response = build()
+            if should_store(response):
+                key = learn_cache_key(
+                    request,
+                    response,
+                    page_ttl + grace_period(),
+                    PAGE_KEY_PREFIX,
+                    cache=cache,
+                )
+                cache.set(
+                    key,
+                    (generation, time.time() + page_ttl, response),
+                    page_ttl + grace_period(),
+                )
+            return response
+
+        return _wrapped
+
+    return decorator
@@ -0,0 +1,152 @@
+"""
+Цензор нежелательных слов.
+
+Словарь — таблица ``CensoredWord`` плюс необязательный файл
+``NEWS_CENSOR_WORDS_FILE`` (слово на строку, ``#`` — комментарий). Из него один
+раз строится регулярное выражение в виде префиксного дерева
+(``дура(?:к|шка)`` вместо ``дурак|дурашка``), так что проверка идёт за один
+проход без перебора альтернатив. Собранный движок живёт в памяти процесса;
+изменение словаря увеличивает версию в общем кеше, и остальные процессы
+пересобирают движок не позже чем через ``NEWS_CENSOR_RELOAD_INTERVAL`` секунд.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = "censor:version"
+
+
+def _normalize(word: str) -> str:
+    return word.strip().lower()
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Альтернатива слов, свёрнутая по общим префиксам."""
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}  # конец слова
+
+    def build(node: dict) -> str:
+        branches = [
+            re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch
+        ]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+def _stars(match: re.Match) -> str:
+    return "*" * len(match.group())
+
+
+class CensorEngine:
+    """Скомпилированный словарь: ``censor(text)`` заменяет слова звёздочками."""
+
+    def __init__(self, words: Iterable[str]):
+        self.words = frozenset(w for w in map(_normalize, words) if w)
+        self.pattern = (
+            re.compile(rf"\b{_trie_pattern(self.words)}\b", re.IGNORECASE)
+            if self.words
+            else None
+        )
+
+    def censor(self, text: str) -> str:
+        if not text or self.pattern is None:
+            return text
+        return self.pattern.sub(_stars, text)
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Загрузка словаря и инвалидация
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+@dataclass
+class _State:
+    engine: CensorEngine
+    version: int
+    file_mtime: float | None
+    checked_at: float
+
+
+_state: _State | None = None
+
+
+def reload_interval() -> float:
+    return getattr(settings, "NEWS_CENSOR_RELOAD_INTERVAL", 5)
+
+
+def censor_on_save() -> bool:
+    return getattr(settings, "NEWS_CENSOR_ON_SAVE", False)
+
+
+def _words_file() -> str:
+    return getattr(settings, "NEWS_CENSOR_WORDS_FILE", "")
+
+
+def _file_mtime() -> float | None:
+    path = _words_file()
+    try:
+        return os.path.getmtime(path) if path else None
+    except OSError:
+        return None
+
+
+def load_words() -> set[str]:
+    words = set(
+        apps.get_model("news", "CensoredWord").objects.values_list("word", flat=True)
+    )
+    path = _words_file()
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as fh:
+            words.update(
+                line for line in map(str.strip, fh) if line and not line.startswith("#")
+            )
+    return words
+
+
+def get_engine() -> CensorEngine:
+    """Движок текущего словаря; версию в кеше проверяет не чаще reload_interval()."""
+    global _state
+    now = time.monotonic()
+    state = _state
+    if state is not None and now - state.checked_at < reload_interval():
+        return state.engine
+
+    version = cache.get(VERSION_KEY, 0)
+    mtime = _file_mtime()
+    if state is not None and (state.version, state.file_mtime) == (version, mtime):
+        state.checked_at = now
+        return state.engine
+
+    _state = _State(CensorEngine(load_words()), version, mtime, now)
+    return _state.engine
+
+
+def invalidate() -> None:
+    """Словарь изменился: сбросить движок здесь и в остальных процессах."""
+    global _state
+    _state = None
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+
+
+def censor_text(text: str) -> str:
+    return get_engine().censor(text)
@@ -0,0 +1,35 @@
+"""
+Системные проверки (``manage.py check``): настройки, которым нужен общий кеш.
+
+locmem и dummy живут внутри процесса — веб-воркеры, Celery и планировщик
+видят каждый свой кеш. Буфер голосов на таком кеше теряет голоса: их копит
+воркер, а ``flush_votes`` читает кеш другого процесса.
+"""
+
+from __future__ import annotations
+
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+PROCESS_LOCAL_BACKENDS = ("LocMemCache", "DummyCache")
+
+
+def cache_is_shared() -> bool:
+    return not settings.CACHES["default"]["BACKEND"].endswith(PROCESS_LOCAL_BACKENDS)
+
+
+@register(Tags.caches)
+def check_vote_buffer(app_configs, **kwargs):
+    if not getattr(settings, "NEWS_VOTE_BUFFER", False) or cache_is_shared():
+        return []
+    return [
+        Warning(
+            "NEWS_VOTE_BUFFER включён, а кеш «default» локален для процесса.",
+            hint=(
+                "Задайте CACHE_URL с общим кешем (Redis, Memcached) или выключите "
+                "NEWS_VOTE_BUFFER: голоса из веб-воркера не увидит flush_votes "
+                "в планировщике или Celery."
+            ),
+            id="news.W001",
+        )
+    ]
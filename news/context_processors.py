@@ -0,0 +1,12 @@
+from django.utils.functional import SimpleLazyObject
+
+from . import subscriptions
+
+
+def subscribed_categories(request):
+    """``subscribed_category_ids`` в шаблонах; кеш читается, только если нужен."""
+    return {
+        "subscribed_category_ids": SimpleLazyObject(
+            lambda: subscriptions.for_request(request)
+        )
+    }
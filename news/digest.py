@@ -0,0 +1,251 @@
+"""
+Движок еженедельного дайджеста.
+
+Граф «посты недели → категории → подписчики» грузится несколькими запросами,
+после чего каждый пользователь получает одно письмо со всеми своими
+категориями. Пользователи обрабатываются пачками по возрастанию id, так что
+память не растёт с числом подписчиков.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+from .emails import Fragment, FragmentCache, UnsubscribeLinks
+from .models import Category, Post, PostCategory
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+Subscription = Category.subscribers.through
+
+
+@dataclass
+class DigestReport:
+    posts: int = 0
+    categories: int = 0
+    users: int = 0
+    emails: int = 0
+    chunks: int = 0
+    renders: int = 0
+    timings: dict[str, float] = field(default_factory=dict)
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class CategoryBlock:
+    """Общая для всех подписчиков часть дайджеста по одной категории."""
+
+    pk: int
+    name: str
+    lines: list[tuple[int, str]]  # (post_id, строка «- заголовок — ссылка»)
+    items: list[tuple[int, str]]  # (post_id, готовый <li> для HTML)
+    section: Fragment  # HTML-блок категории с плейсхолдерами items/unsubscribe_url
+
+
+class WeeklyDigestBuilder:
+    def __init__(
+        self,
+        since: datetime | None = None,
+        chunk_size: int | None = None,
+        connection=None,
+    ):
+        self.since = since or timezone.now() - timedelta(days=7)
+        self.chunk_size = chunk_size or getattr(
+            settings, "NEWS_DIGEST_CHUNK_SIZE", 1000
+        )
+        self.connection = connection
+        self.report = DigestReport()
+        self.fragments = FragmentCache()
+        self.unsubscribe_links = UnsubscribeLinks()
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.report.timings[name] = round(
+                self.report.timings.get(name, 0.0) + elapsed, 4
+            )
+
+    # ── загрузка графа ─────────────────────────────────────────────────────────
+
+    def load_blocks(self) -> dict[int, CategoryBlock]:
+        """Посты недели, сгруппированные по категориям: 3 запроса на весь прогон."""
+        posts = dict(
+            Post.objects.filter(created_at__gte=self.since)
+            .order_by("-created_at", "-id")
+            .values_list("pk", "title")
+        )
+        self.report.posts = len(posts)
+        if not posts:
+            return {}
+
+        # ссылки считаются один раз на пост, а не на каждого подписчика
+        urls = {
+            pk: settings.SITE_URL + reverse("news:news_detail", args=[pk])
+            for pk in posts
+        }
+
+        by_category: dict[int, list[int]] = defaultdict(list)
+        # только уже загруженные посты: новый пост между запросами не в posts
+        links = PostCategory.objects.filter(post_id__in=posts).values_list(
+            "category_id", "post_id"
+        )
+        for category_id, post_id in links:
+            by_category[category_id].append(post_id)
+
+        names = dict(
+            Category.objects.filter(pk__in=by_category).values_list("pk", "name")
+        )
+        order = {post_id: index for index, post_id in enumerate(posts)}
+        items = {
+            pk: format_html('<li><a href="{}">{}</a></li>', urls[pk], title)
+            for pk, title in posts.items()
+        }
+        blocks = {}
+        for category_id, post_ids in by_category.items():
+            post_ids.sort(key=order.__getitem__)
+            name = names[category_id]
+            blocks[category_id] = CategoryBlock(
+                pk=category_id,
+                name=name,
+                lines=[(pk, f"- {posts[pk]} — {urls[pk]}") for pk in post_ids],
+                items=[(pk, items[pk]) for pk in post_ids],
+                section=self.fragments.get(
+                    category_id,
+                    "email/weekly_digest_section.html",
+                    {"category": {"name": name}},
+                    personal=("items", "unsubscribe_url"),
+                ),
+            )
+        self.report.categories = len(blocks)
+        return blocks
+
+    def iter_user_chunks(self, category_ids):
+        """Пачки подписчиков ``[(user, [category_id, ...]), ...]`` по возрастанию id."""
+        last_id = 0
+        while True:
+            users = list(
+                User.objects.filter(
+                    pk__gt=last_id, subscribed_categories__in=category_ids
+                )
+                .exclude(email="")
+                .order_by("pk")
+                .distinct()
+                .only("id", "username", "email")[: self.chunk_size]
+            )
+            if not users:
+                return
+            last_id = users[-1].pk
+
+            subscribed: dict[int, list[int]] = defaultdict(list)
+            pairs = Subscription.objects.filter(
+                user_id__in=[u.pk for u in users], category_id__in=category_ids
+            ).values_list("user_id", "category_id")
+            for user_id, category_id in pairs:
+                subscribed[user_id].append(category_id)
+
+            yield [(user, subscribed[user.pk]) for user in users]
+
+    # ── сборка писем ───────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _unseen(pairs, seen: set[int]) -> list[str]:
+        return [value for pk, value in pairs if pk not in seen]
+
+    def compose(self, user, blocks: list[CategoryBlock]) -> tuple[str, str]:
+        """
+        Текст и HTML письма из готовых кусков: шаблоны здесь не рендерятся.
+        Пост из нескольких категорий пользователя попадает в письмо один раз.
+        """
+        seen: set[int] = set()
+        text = [f"Здравствуйте, {user.username}!\n\nНовые публикации за неделю:"]
+        sections = []
+        for block in blocks:
+            lines = self._unseen(block.lines, seen)
+            if not lines:
+                continue
+            items = self._unseen(block.items, seen)
+            seen.update(pk for pk, _ in block.lines)
+
+            text.append(f"\n«{block.name}»:\n" + "\n".join(lines))
+            sections.append(
+                block.section.fill(
+                    {
+                        "items": mark_safe("".join(items)),
+                        "unsubscribe_url": self.unsubscribe_links(user.pk, block.pk),
+                    }
+                )
+            )
+        text.append("\nС уважением, NewsPortal")
+
+        frame = self.fragments.get(
+            None, "email/weekly_digest.html", {}, personal=("user.username", "sections")
+        )
+        html = frame.fill(
+            {"user.username": user.username, "sections": mark_safe("".join(sections))}
+        )
+        return "\n".join(text), html
+
+    def build_messages(self, chunk, blocks) -> list[EmailMultiAlternatives]:
+        messages = []
+        for user, category_ids in chunk:
+            user_blocks = sorted(
+                (blocks[pk] for pk in category_ids), key=lambda b: b.name
+            )
+            subject = "Дайджест недели: " + ", ".join(b.name for b in user_blocks)
+            text, html = self.compose(user, user_blocks)
+            message = EmailMultiAlternatives(
+                subject=subject,
+                body=text,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[user.email],
+            )
+            message.attach_alternative(html, "text/html")
+            messages.append(message)
+        return messages
+
+    def run(self) -> DigestReport:
+        with self.phase("load"):
+            blocks = self.load_blocks()
+        if not blocks:
+            return self.report
+
+        connection = self.connection or get_connection()
+        chunks = self.iter_user_chunks(list(blocks))
+        with connection:
+            while True:
+                with self.phase("subscribers"):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                with self.phase("build"):
+                    messages = self.build_messages(chunk, blocks)
+                with self.phase("send"):
+                    sent = connection.send_messages(messages) or 0
+
+                self.report.chunks += 1
+                self.report.users += len(chunk)
+                self.report.emails += sent
+
+        self.report.renders = self.fragments.renders
+        logger.info("Еженедельный дайджест: %s", self.report.as_dict())
+        return self.report
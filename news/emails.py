@@ -0,0 +1,130 @@
+"""
+Рендеринг писем «один раз на рассылку».
+
+Общая часть письма (блок категории, рамка дайджеста) рендерится шаблоном
+один раз с плейсхолдерами вместо персональных полей и режется на сегменты.
+Для каждого получателя остаётся только склеить сегменты с его значениями —
+без повторного прохода по шаблону и без запросов в БД.
+"""
+
+from __future__ import annotations
+
+import re
+from collections.abc import Callable, Iterable, Mapping
+
+from django.conf import settings
+from django.core import signing
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.html import conditional_escape
+
+UNSUBSCRIBE_SALT = "news.emails.unsubscribe"
+UNSUBSCRIBE_MAX_AGE = 60 * 60 * 24 * 60  # ссылка из письма живёт 60 дней
+
+_MARK = "\u2063"  # INVISIBLE SEPARATOR — не встречается в обычном тексте
+_PLACEHOLDER_RE = re.compile(f"{_MARK}([\\w.]+){_MARK}")
+
+
+def _placeholder(name: str) -> str:
+    return f"{_MARK}{name}{_MARK}"
+
+
+def _inject(context: dict, path: str, value: str) -> None:
+    """Положить ``value`` в контекст по пути вида ``user.username``."""
+    *parents, leaf = path.split(".")
+    target = context
+    for key in parents:
+        target = target.setdefault(key, {})
+    target[leaf] = value
+
+
+class Fragment:
+    """Отрендеренный один раз кусок письма с «дырками» под персональные поля."""
+
+    def __init__(self, segments: list[str], fields: list[str], autoescape: bool):
+        # segments[0] field[0] segments[1] field[1] ... segments[-1]
+        self.segments = segments
+        self.fields = fields
+        self.autoescape = autoescape
+
+    @classmethod
+    def render(
+        cls,
+        template_name: str,
+        context: Mapping,
+        personal: Iterable[str] = (),
+    ) -> Fragment:
+        context = dict(context)
+        for path in personal:
+            _inject(context, path, _placeholder(path))
+        parts = _PLACEHOLDER_RE.split(render_to_string(template_name, context))
+        return cls(
+            segments=parts[0::2],
+            fields=parts[1::2],
+            autoescape=template_name.endswith(".html"),
+        )
+
+    def fill(self, values: Mapping[str, object]) -> str:
+        """Склеить сегменты с персональными значениями (HTML — с экранированием)."""
+        out = [self.segments[0]]
+        for field, segment in zip(self.fields, self.segments[1:], strict=True):
+            value = values.get(field, "")
+            out.append(str(conditional_escape(value) if self.autoescape else value))
+            out.append(segment)
+        return "".join(out)
+
+
+class FragmentCache:
+    """Кеш фрагментов на один прогон рассылки: ключ → отрендеренный Fragment."""
+
+    def __init__(self):
+        self._fragments: dict[object, Fragment] = {}
+        self.renders = 0
+
+    def get(
+        self,
+        key,
+        template_name: str,
+        context: Callable[[], Mapping] | Mapping,
+        personal: Iterable[str] = (),
+    ) -> Fragment:
+        fragment = self._fragments.get((template_name, key))
+        if fragment is None:
+            if callable(context):
+                context = context()
+            fragment = Fragment.render(template_name, context, personal)
+            self._fragments[(template_name, key)] = fragment
+            self.renders += 1
+        return fragment
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Персональные ссылки
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+def make_unsubscribe_token(user_id: int, category_id: int) -> str:
+    return signing.dumps([user_id, category_id], salt=UNSUBSCRIBE_SALT)
+
+
+def read_unsubscribe_token(token: str) -> tuple[int, int] | None:
+    try:
+        user_id, category_id = signing.loads(
+            token, salt=UNSUBSCRIBE_SALT, max_age=UNSUBSCRIBE_MAX_AGE
+        )
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    return user_id, category_id
+
+
+class UnsubscribeLinks:
+    """Ссылки отписки «в один клик»: путь вычисляется один раз на рассылку."""
+
+    def __init__(self):
+        marker = "token"
+        path = reverse("news:category_unsubscribe_token", args=[marker])
+        self.prefix, self.suffix = (settings.SITE_URL + path).rsplit(marker, 1)
+
+    def __call__(self, user_id: int, category_id: int) -> str:
+        token = make_unsubscribe_token(user_id, category_id)
+        return f"{self.prefix}{token}{self.suffix}"
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from news.censor import invalidate
+from news.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает хранимые производные полей публикаций (preview_text, "
+        "censored_*) пачками — после миграции или смены словаря цензора"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--missing-only",
+            action="store_true",
+            help="Только строки, у которых preview_text ещё не посчитан",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        invalidate()  # словарь мог поменяться в обход сигналов (bulk_create, SQL)
+
+        posts = Post.objects.only("id", "title", "text").order_by("pk")
+        if options["missing_only"]:
+            posts = posts.filter(preview_text__isnull=True)
+
+        # keyset по pk: каждая пачка — отдельная короткая транзакция
+        last_pk, updated = 0, 0
+        while True:
+            batch = list(posts.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            for post in batch:
+                # набор полей зависит от NEWS_CENSOR_ON_SAVE
+                fields = post.refresh_derived_fields()
+            with transaction.atomic():
+                updated += Post.objects.bulk_update(batch, fields)
+            last_pk = batch[-1].pk
+            self.stdout.write(f"  обработано до pk={last_pk}")
+
+        self.stdout.write(self.style.SUCCESS(f"Обновлено публикаций: {updated}"))
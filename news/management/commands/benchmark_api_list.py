@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from news.benchmarks import HEADER, measure
+from news.models import Post
+from news.serializers import PostSerializer, PostValuesSerializer
+from news.views import _post_base_qs
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает сериализацию страницы API через PostSerializer "
+        "и через values() (строк в секунду)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page-size", type=int, default=100)
+        parser.add_argument("--repeat", type=int, default=10)
+
+    def handle(self, *args, **options):
+        page_size = options["page_size"]
+        reader = PostValuesSerializer()
+
+        def model_path():
+            page = list(_post_base_qs()[:page_size])
+            return PostSerializer(page, many=True).data
+
+        def values_path():
+            page = reader.get_queryset(_post_base_qs())[:page_size]
+            return reader.to_representation(page)
+
+        rows = len(values_path())
+        self.stdout.write(f"Постов: {Post.objects.count()}, строк на страницу: {rows}")
+        self.stdout.write(HEADER + f" {'строк/с':>10}")
+        for label, func in (
+            ("ModelSerializer", model_path),
+            ("values()", values_path),
+        ):
+            result = measure(label, func, repeat=options["repeat"])
+            per_second = rows / (result.median_ms / 1000) if result.median_ms else 0
+            self.stdout.write(result.as_row() + f" {per_second:>10.0f}")
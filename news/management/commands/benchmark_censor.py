@@ -0,0 +1,70 @@
+import random
+import re
+
+from django.core.management.base import BaseCommand
+
+from news.benchmarks import HEADER, measure
+from news.censor import CensorEngine, load_words
+
+FILLER = (
+    "новости экономика рынок спорт политика город погода выборы наука культура "
+    "футбол министр компания проект решение неделя история технологии"
+).split()
+
+
+def legacy_censor(value: str, words) -> str:
+    """Прежний фильтр: регулярка собирается и компилируется на каждый вызов."""
+    pattern = re.compile(
+        r"\b(" + "|".join(re.escape(word) for word in words) + r")\b",
+        flags=re.IGNORECASE,
+    )
+    return pattern.sub(lambda m: "*" * len(m.group()), value)
+
+
+class Command(BaseCommand):
+    help = "Сравнивает прежний фильтр censor с предкомпилированным движком"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--words", type=int, default=5000, help="Длина статьи в словах"
+        )
+        parser.add_argument(
+            "--dictionary",
+            type=int,
+            default=0,
+            help="Добавить N синтетических слов в словарь (проверка масштаба)",
+        )
+        parser.add_argument(
+            "--calls", type=int, default=10, help="Вызовов фильтра на страницу"
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        words = sorted(load_words())
+        words += [f"слово{i}" for i in range(options["dictionary"])]
+        vocabulary = FILLER + words[:20]
+        body = " ".join(rng.choice(vocabulary) for _ in range(options["words"]))
+        calls = options["calls"]
+
+        engine = CensorEngine(words)
+        stored = engine.censor(body)
+
+        self.stdout.write(
+            f"Словарь: {len(words)} слов, статья: {options['words']} слов, "
+            f"вызовов на страницу: {calls}"
+        )
+        self.stdout.write(HEADER)
+        strategies = {
+            "legacy (компиляция на вызов)": lambda: legacy_censor(body, words),
+            "движок (компиляция один раз)": lambda: engine.censor(body),
+            "сохранено при save": lambda: stored,
+        }
+        for label, func in strategies.items():
+
+            def run(func=func):
+                for _ in range(calls):
+                    func()
+
+            result = measure(label, run, repeat=options["repeat"])
+            self.stdout.write(result.as_row())
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from news.benchmarks import HEADER, measure
+from news.models import Post
+from news.search import get_search_backend
+
+DEFAULT_QUERIES = ["новости", "экономика рынок", "football", "политика выборы"]
+
+
+class Command(BaseCommand):
+    help = "Сравнивает поиск по индексу с прежним icontains на текущей БД"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "queries", nargs="*", default=DEFAULT_QUERIES, help="Поисковые запросы"
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--page-size", type=int, default=5, help="Сколько строк выбирать"
+        )
+
+    def handle(self, *args, **options):
+        repeat = options["repeat"]
+        page_size = options["page_size"]
+        backend = get_search_backend()
+        base_qs = Post.objects.order_by("-created_at")
+
+        self.stdout.write(
+            f"Постов: {Post.objects.count()}, бэкенд: {type(backend).__name__}"
+        )
+        self.stdout.write(HEADER)
+
+        strategies = {
+            "icontains": lambda q: base_qs.filter(
+                Q(title__icontains=q) | Q(text__icontains=q)
+            ),
+            "index": lambda q: backend.search(base_qs, q),
+        }
+
+        for query in options["queries"]:
+            for label, build_qs in strategies.items():
+                # построение запроса + COUNT + первая страница — как во вьюхе
+                def run(query=query, build_qs=build_qs):
+                    qs = build_qs(query)
+                    return qs.count(), list(qs[:page_size])
+
+                result = measure(f"{label}: {query}", run, repeat=repeat)
+                self.stdout.write(result.as_row())
@@ -0,0 +1,138 @@
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+
+from news.benchmarks import compare_reports, run_scenarios, suite_scenarios
+from news.seed import SeedConfig, seed
+
+CACHES = {
+    # cold: каждый запрос проходит весь путь до БД и шаблона
+    "cold": {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}},
+    # warm: отдельный кеш процесса, рабочий кеш сайта не трогается
+    "warm": {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "benchmark-suite",
+        }
+    },
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Сквозной замер страниц, API и рассылок на синтетических данных "
+        "нескольких объёмов. Данные генерируются в транзакции и откатываются; "
+        "результат — JSON-отчёт для сравнения между коммитами"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="1000,10000",
+            help="Объёмы (число постов) через запятую",
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--cache", choices=sorted(CACHES), default="cold")
+        parser.add_argument("--output", help="Куда записать JSON-отчёт")
+        parser.add_argument("--compare", help="Прошлый отчёт для сравнения")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=1.2,
+            help="Во сколько раз должна вырасти медиана, чтобы считать регрессией",
+        )
+        parser.add_argument(
+            "--fail-on-regression",
+            action="store_true",
+            help="Завершиться с ошибкой, если есть регрессии (для CI)",
+        )
+
+    def _run_size(self, posts: int, repeat: int) -> dict:
+        results = {}
+        try:
+            with transaction.atomic():
+                report = seed(SeedConfig.for_posts(posts))
+                self.stdout.write(
+                    f"Объём {posts}: данные за {sum(report.timings.values()):.1f} с"
+                )
+                results = run_scenarios(suite_scenarios(), repeat)
+                raise Rollback
+        except Rollback:
+            pass
+        return results
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options["sizes"].split(",") if size]
+        except ValueError:
+            raise CommandError("--sizes: ожидались числа через запятую") from None
+
+        report = {
+            "meta": {
+                "commit": _git_commit(),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "database": connection.vendor,
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "cache": options["cache"],
+                "repeat": options["repeat"],
+            },
+            "results": {},
+        }
+        with override_settings(
+            CACHES=CACHES[options["cache"]],
+            ALLOWED_HOSTS=["testserver"],
+            EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+        ):
+            for posts in sizes:
+                results = self._run_size(posts, options["repeat"])
+                report["results"][str(posts)] = results
+                for name, result in results.items():
+                    if "error" in result:
+                        self.stdout.write(
+                            self.style.WARNING(f"  {name:<24} {result['error']}")
+                        )
+                    else:
+                        self.stdout.write(
+                            f"  {name:<24} {result['median_ms']:>9.2f} мс "
+                            f"{result['p95_ms']:>9.2f} мс p95 "
+                            f"{result['queries']:>5} запросов"
+                        )
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as fh:
+                json.dump(report, fh, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Отчёт: {options['output']}")
+
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as fh:
+                previous = json.load(fh)
+            rows = compare_reports(previous, report, options["threshold"])
+            regressions = [row for row in rows if row[3]]
+            for size, name, description, regressed in rows:
+                line = f"  [{size}] {name:<24} {description}"
+                self.stdout.write(self.style.ERROR(line) if regressed else line)
+            if regressions and options["fail_on_regression"]:
+                raise CommandError(f"Регрессий: {len(regressions)}")
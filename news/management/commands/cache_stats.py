@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from news.cache import cache_stats, reset_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Счётчики страничного и фрагментного кеша (hit/miss/stale/regenerate)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Обнулить счётчики после вывода",
+        )
+
+    def handle(self, *args, **options):
+        for namespace, counters in cache_stats().items():
+            served = counters["hit"] + counters["stale"]
+            total = served + counters["miss"] + counters["regenerate"]
+            ratio = f"{served / total:.1%}" if total else "—"
+            values = ", ".join(f"{event}={value}" for event, value in counters.items())
+            self.stdout.write(f"{namespace}: {values} (из кеша: {ratio})")
+
+        if options["reset"]:
+            reset_cache_stats()
+            self.stdout.write(self.style.SUCCESS("Счётчики обнулены"))
@@ -1,19 +1,59 @@
-from django.core.management.base import BaseCommand
+import sys
+import time
 
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from news import cache as page_cache
 from news.models import Category, Post
 
 
 class Command(BaseCommand):
-    help = "Удаляет все новости из указанной категории с подтверждением"
+    help = (
+        "Удаляет все новости из указанной категории с подтверждением. "
+        "Удаление идёт пачками по pk, каждая — в своей короткой транзакции"
+    )
 
     def add_arguments(self, parser):
         # Добавляем аргумент для указания категории
         parser.add_argument(
             "category_name", type=str, help="Название категории для удаления новостей"
         )
+        parser.add_argument(
+            "--yes",
+            action="store_true",
+            help="Не спрашивать подтверждение (для cron)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только посчитать, сколько публикаций будет удалено",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=500, help="Публикаций в одной пачке"
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0.0,
+            help="Пауза между пачками, с — чтобы не нагружать БД сайта",
+        )
+
+    def _confirm(self, category_name: str) -> bool:
+        # Подтверждаем удаление
+        self.stdout.write(
+            self.style.WARNING(
+                f'Вы уверены, что хотите удалить все новости из категории "{category_name}"?'
+            )
+        )
+        if not sys.stdin.isatty():
+            raise CommandError("Нет терминала для подтверждения: используйте --yes")
+        confirm = input('Введите "yes" для подтверждения: ')
+        return confirm.lower() == "yes"
 
     def handle(self, *args, **options):
         category_name = options["category_name"]
+        batch_size = options["batch_size"]
 
         # Проверяем, существует ли категория с таким названием
         try:
@@ -24,29 +64,55 @@ class Command(BaseCommand):
             )
             return
 
-        # Выводим все новости в этой категории
-        posts = Post.objects.filter(categories__in=[category])
-        if not posts.exists():
+        posts = Post.objects.filter(post_categories__category=category).order_by("pk")
+        total = posts.count()
+        if not total:
             self.stdout.write(
                 self.style.SUCCESS(f'Нет новостей в категории "{category_name}"')
             )
             return
 
-        # Подтверждаем удаление
-        self.stdout.write(
-            self.style.WARNING(
-                f'Вы уверены, что хотите удалить все новости из категории "{category_name}"?'
-            )
-        )
-        confirm = input('Введите "yes" для подтверждения: ')
-
-        if confirm.lower() == "yes":
-            # Удаляем новости
-            posts.delete()
+        if options["dry_run"]:
+            batches = -(-total // batch_size)
             self.stdout.write(
-                self.style.SUCCESS(
-                    f'Все новости из категории "{category_name}" были удалены'
-                )
+                f'Будет удалено публикаций: {total} из категории "{category_name}" '
+                f"({batches} пачек по {batch_size})"
             )
-        else:
+            return
+
+        if not options["yes"] and not self._confirm(category_name):
             self.stdout.write(self.style.SUCCESS("Удаление отменено"))
+            return
+
+        deleted, last_pk = 0, 0
+        started = time.monotonic()
+        while True:
+            ids = list(
+                posts.filter(pk__gt=last_pk).values_list("pk", flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            # инвалидация кеша — одним bump()/delete_many на пачку после коммита,
+            # а не на пост; prefetch отдаёт сигналам категории без запроса на пост;
+            # счётчики категорий — одним UPDATE на пачку внутри транзакции
+            with (
+                page_cache.coalesced(),
+                transaction.atomic(),
+                Category.batched_counts(),
+            ):
+                Post.objects.filter(pk__in=ids).prefetch_related(
+                    "post_categories"
+                ).delete()
+            deleted += len(ids)
+            last_pk = ids[-1]
+
+            rate = deleted / max(time.monotonic() - started, 1e-6)
+            self.stdout.write(f"  удалено {deleted}/{total}, {rate:.0f} публикаций/с")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Все новости из категории "{category_name}" были удалены ({deleted})'
+            )
+        )
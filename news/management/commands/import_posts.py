@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import csv
+import json
+import os
+import sys
+import time
+from collections import Counter
+from collections.abc import Iterator
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+
+from news import cache as page_cache
+from news.models import Author, Category, Post, PostCategory, PostType
+from news.search import InvertedIndexBackend, get_search_backend
+
+# type принимается кодом (AR/NW) или названием («Статья»/«Новость»)
+TYPES = {value.lower(): value for value in PostType.values} | {
+    str(label).lower(): value for value, label in PostType.choices
+}
+
+
+class RowError(ValueError):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Потоковый импорт публикаций из JSONL/CSV: пачечные bulk_create без "
+        "сигналов, контрольные точки для продолжения, поисковый индекс и кеш "
+        "обновляются один раз в конце. Поля строки: title, text, type (AR/NW), "
+        "author (username), categories (список или строка через «;»)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Файл .jsonl/.csv или «-» для stdin")
+        parser.add_argument("--format", choices=["jsonl", "csv"])
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument(
+            "--checkpoint",
+            help="Файл контрольной точки (по умолчанию <path>.checkpoint)",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Продолжить с контрольной точки прошлого запуска",
+        )
+        parser.add_argument(
+            "--skip-invalid",
+            action="store_true",
+            help="Пропускать невалидные строки вместо остановки",
+        )
+        parser.add_argument(
+            "--create-categories",
+            action="store_true",
+            help="Создавать отсутствующие категории",
+        )
+
+    # ── Чтение входа ────────────────────────────────────────────────────────────
+
+    def _open(self, path: str):
+        if path == "-":
+            return sys.stdin
+        try:
+            return open(path, encoding="utf-8", newline="")
+        except OSError as exc:
+            raise CommandError(f"Не удалось открыть {path}: {exc}") from exc
+
+    def _rows(self, fh, fmt: str) -> Iterator[dict]:
+        if fmt == "csv":
+            yield from csv.DictReader(fh)
+            return
+        for line in fh:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield RowError(f"невалидный JSON: {exc.msg}")
+                continue
+            yield row if isinstance(row, dict) else RowError("ожидался объект")
+
+    # ── Разбор строки ───────────────────────────────────────────────────────────
+
+    def _category_ids(self, value) -> list[int]:
+        names = value.split(";") if isinstance(value, str) else value or []
+        ids = []
+        for name in dict.fromkeys(str(n).strip() for n in names if str(n).strip()):
+            pk = self.categories.get(name)
+            if pk is None:
+                if not self.create_categories:
+                    raise RowError(f"неизвестная категория «{name}»")
+                category, _ = Category.objects.get_or_create(name=name)
+                pk = self.categories[name] = category.pk
+            ids.append(pk)
+        return ids
+
+    def _parse(self, row) -> tuple[Post, list[int]]:
+        if isinstance(row, RowError):
+            raise row
+        title = (row.get("title") or "").strip()
+        text = row.get("text") or ""
+        if not title or not text:
+            raise RowError("пустой title или text")
+        if len(title) > 255:
+            raise RowError("title длиннее 255 символов")
+
+        post_type = TYPES.get(str(row.get("type") or PostType.ARTICLE).lower())
+        if post_type is None:
+            raise RowError(f"неизвестный type «{row.get('type')}»")
+
+        author_id = None
+        username = (row.get("author") or "").strip()
+        if username:
+            author_id = self.authors.get(username)
+            if author_id is None:
+                raise RowError(f"неизвестный автор «{username}»")
+
+        post = Post(type=post_type, title=title, text=text, author_id=author_id)
+        post.refresh_derived_fields()
+        return post, self._category_ids(row.get("categories"))
+
+    # ── Контрольная точка ───────────────────────────────────────────────────────
+
+    def _load_checkpoint(self, path: str) -> dict:
+        try:
+            with open(path, encoding="utf-8") as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            raise CommandError(f"Контрольная точка {path} не найдена") from None
+
+    def _save_checkpoint(self, path: str, state: dict) -> None:
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(state, fh)
+        os.replace(tmp, path)  # атомарно: обрыв не оставит битый файл
+
+    # ── Запись ──────────────────────────────────────────────────────────────────
+
+    def _flush(self, batch: list[tuple[Post, list[int]]]) -> set[int]:
+        posts = [post for post, _ in batch]
+        with transaction.atomic():
+            Post.objects.bulk_create(posts)
+            links = [
+                PostCategory(post_id=post.pk, category_id=category_id)
+                for post, category_ids in batch
+                for category_id in category_ids
+            ]
+            PostCategory.objects.bulk_create(links, batch_size=self.batch_size)
+            Category.apply_count_deltas(
+                "post_count", Counter(link.category_id for link in links)
+            )
+        return {link.category_id for link in links}
+
+    def _reindex(self, start_pk: int) -> int:
+        """Поисковый индекс импортированных постов — один проход в конце."""
+        backend = get_search_backend()
+        posts = Post.objects.filter(pk__gt=start_pk).only("id", "title", "text")
+        indexed, last_pk = 0, start_pk
+        while True:
+            chunk = list(posts.filter(pk__gt=last_pk).order_by("pk")[: self.batch_size])
+            if not chunk:
+                break
+            backend.index_posts(chunk)
+            indexed += len(chunk)
+            last_pk = chunk[-1].pk
+        cache.delete(InvertedIndexBackend.DOC_COUNT_CACHE_KEY)
+        return indexed
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("csv" if path.endswith(".csv") else "jsonl")
+        self.batch_size = options["batch_size"]
+        self.create_categories = options["create_categories"]
+        checkpoint = options["checkpoint"] or (
+            f"{path}.checkpoint" if path != "-" else "import_posts.checkpoint"
+        )
+
+        if options["resume"]:
+            state = self._load_checkpoint(checkpoint)
+        else:
+            # всё, что новее start_pk, — этот импорт (для индекса в конце)
+            start_pk = Post.objects.aggregate(m=Max("pk"))["m"] or 0
+            state = {
+                "position": 0,
+                "imported": 0,
+                "skipped": 0,
+                "start_pk": start_pk,
+                "categories": [],
+            }
+
+        # справочники целиком в памяти: их размер не зависит от объёма импорта
+        self.authors = dict(Author.objects.values_list("user__username", "pk"))
+        self.categories = dict(Category.objects.values_list("name", "pk"))
+
+        touched_categories = set(state["categories"])
+        batch: list[tuple[Post, list[int]]] = []
+        started = time.monotonic()
+        resumed_from = position = state["position"]
+
+        def flush():
+            touched_categories.update(self._flush(batch))
+            state.update(
+                position=position,
+                imported=state["imported"] + len(batch),
+                categories=sorted(touched_categories),
+            )
+            self._save_checkpoint(checkpoint, state)
+            batch.clear()
+            rate = (position - resumed_from) / max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f"  строк {position}, импортировано {state['imported']}, "
+                f"пропущено {state['skipped']}, {rate:.0f} строк/с"
+            )
+
+        with self._open(path) as fh:
+            for number, row in enumerate(self._rows(fh, fmt), start=1):
+                if number <= resumed_from:
+                    continue
+                position = number
+                try:
+                    batch.append(self._parse(row))
+                except RowError as exc:
+                    if not options["skip_invalid"]:
+                        if batch:
+                            position -= 1
+                            flush()
+                        raise CommandError(
+                            f"Строка {number}: {exc}. Исправьте её и запустите "
+                            f"с --resume или используйте --skip-invalid"
+                        ) from None
+                    state["skipped"] += 1
+                    self.stderr.write(f"  строка {number} пропущена: {exc}")
+                if len(batch) >= self.batch_size:
+                    flush()
+            if batch or position > state["position"]:
+                flush()
+
+        # производные данные — один раз на весь импорт, а не на строку
+        indexed = self._reindex(state["start_pk"])
+        page_cache.bump(
+            page_cache.GLOBAL,
+            page_cache.CATEGORIES,
+            *(page_cache.category_scope(pk) for pk in touched_categories),
+        )
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Импортировано {state['imported']}, пропущено {state['skipped']}, "
+                f"проиндексировано {indexed} за {elapsed:.1f} с"
+            )
+        )
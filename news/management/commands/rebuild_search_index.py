@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from news.models import Post
+from news.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Полностью перестраивает поисковый индекс публикаций"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Размер пачки для bulk_create записей индекса",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        backend = get_search_backend()
+
+        posts = Post.objects.only("id", "title", "text").order_by("pk")
+        with transaction.atomic():
+            indexed = backend.rebuild(
+                posts.iterator(chunk_size=batch_size), batch_size=batch_size
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Индекс перестроен ({type(backend).__name__}): постов — {indexed}"
+            )
+        )
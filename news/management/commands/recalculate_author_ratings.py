@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from news.models import Author
+
+UPDATE_BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        "Сверяет инкрементальные рейтинги авторов с эталонным пересчётом "
+        "и исправляет расхождения"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать расхождения, ничего не менять",
+        )
+        parser.add_argument(
+            "--show",
+            type=int,
+            default=10,
+            help="Сколько расходящихся авторов вывести",
+        )
+
+    def handle(self, *args, **options):
+        # один запрос: эталонный рейтинг всех авторов подзапросами с GROUP BY
+        drifted = (
+            Author.objects.annotate(expected=Author.computed_rating())
+            .exclude(rating=F("expected"))
+            .order_by("pk")
+        )
+        rows = list(drifted.values_list("pk", "user__username", "rating", "expected"))
+
+        if not rows:
+            self.stdout.write(self.style.SUCCESS("Рейтинги авторов согласованы"))
+            return
+
+        self.stdout.write(self.style.WARNING(f"Расхождения у {len(rows)} авторов:"))
+        for _pk, username, rating, expected in rows[: options["show"]]:
+            self.stdout.write(f"  {username}: {rating} → {expected}")
+
+        if options["dry_run"]:
+            return
+
+        pks = [row[0] for row in rows]
+        updated = 0
+        with transaction.atomic():
+            for start in range(0, len(pks), UPDATE_BATCH_SIZE):
+                batch = pks[start : start + UPDATE_BATCH_SIZE]
+                updated += Author.objects.filter(pk__in=batch).update(
+                    rating=Author.computed_rating()
+                )
+        self.stdout.write(self.style.SUCCESS(f"Исправлено рейтингов: {updated}"))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.text import Truncator
+
+from news.censor import invalidate
+from news.models import PREVIEW_LENGTH, Post
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает сохранённые censored_title/censored_text/preview_text "
+        "публикаций по текущему словарю цензора (для NEWS_CENSOR_ON_SAVE)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Очистить сохранённые значения (шаблоны будут цензурить на лету)",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        invalidate()  # словарь мог поменяться в обход сигналов (bulk_create, SQL)
+
+        posts = Post.objects.only("id", "title", "text").order_by("pk")
+        batch, updated = [], 0
+        with transaction.atomic():
+            for post in posts.iterator(chunk_size=batch_size):
+                if options["clear"]:
+                    post.censored_title = post.censored_text = ""
+                    post.preview_text = Truncator(post.text).chars(PREVIEW_LENGTH)
+                else:
+                    post.apply_censor()
+                batch.append(post)
+                if len(batch) >= batch_size:
+                    updated += self._flush(batch)
+            updated += self._flush(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Обновлено публикаций: {updated}"))
+
+    @staticmethod
+    def _flush(batch) -> int:
+        count = Post.objects.bulk_update(
+            batch, ["censored_title", "censored_text", "preview_text"]
+        )
+        batch.clear()
+        return count
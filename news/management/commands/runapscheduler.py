@@ -3,68 +3,108 @@ from datetime import timedelta
 
 from apscheduler.schedulers.blocking import BlockingScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from django.conf import settings
-from django.contrib.sites.models import Site
-from django.core.mail import send_mail
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.core.management.base import BaseCommand
-from django.template.loader import render_to_string
+from django.urls import reverse
 from django.utils import timezone
 from django_apscheduler.jobstores import DjangoJobStore
 from django_apscheduler.models import DjangoJobExecution
 
+from news.emails import FragmentCache, UnsubscribeLinks
 from news.models import Category, Post
+from news.timeline import trim_timelines
+from news.trending import refresh as refresh_trending
+from news.votes import flush_votes
 
 logger = logging.getLogger(__name__)
 
+SEND_BATCH_SIZE = 500
+
 
 def send_weekly_newsletter():
     """Отправка еженедельной рассылки пользователям, подписанным на категории"""
     today = timezone.now()
     one_week_ago = today - timedelta(days=7)
 
-    # Получаем все категории с подписчиками
-    categories = Category.objects.all()
-
-    for category in categories:
-        # Получаем статьи за последнюю неделю
-        recent_posts = Post.objects.filter(
-            categories=category, created_at__gte=one_week_ago
-        )
-
-        if recent_posts.exists():
-            # Получаем список подписчиков этой категории
-            subscribers = category.subscribers.all()
-
-            # Составляем письмо для каждого подписчика
-            for subscriber in subscribers:
-                send_email_to_subscriber(subscriber, category, recent_posts)
-
-
-def send_email_to_subscriber(subscriber, category, recent_posts):
-    """Функция для отправки письма подписчику"""
-    # Создаем URL для каждой статьи
-    current_site = Site.objects.get_current()
-    post_urls = [
-        f"http://{current_site.domain}/news/{post.id}/" for post in recent_posts
-    ]
-
-    subject = f"Новые статьи в категории {category.name} за последнюю неделю"
-    html_content = render_to_string(
+    # ссылки отписки считаются один раз на прогон
+    unsubscribe_links = UnsubscribeLinks()
+    fragments = FragmentCache()
+
+    with get_connection() as connection:
+        for category in Category.objects.only("id", "name"):
+            # Получаем статьи за последнюю неделю — один запрос на категорию
+            recent_posts = list(
+                Post.objects.filter(
+                    categories=category, created_at__gte=one_week_ago
+                ).only("id", "title", "created_at")
+            )
+            if not recent_posts:
+                continue
+
+            subscribers = category.subscribers.exclude(email="").only(
+                "id", "username", "email"
+            )
+            # Составляем письмо для каждого подписчика, отправляем пачками
+            messages = []
+            for subscriber in subscribers.iterator(chunk_size=SEND_BATCH_SIZE):
+                messages.append(
+                    build_subscriber_email(
+                        subscriber,
+                        category,
+                        recent_posts,
+                        fragments,
+                        unsubscribe_links,
+                    )
+                )
+                if len(messages) >= SEND_BATCH_SIZE:
+                    connection.send_messages(messages)
+                    messages = []
+            if messages:
+                connection.send_messages(messages)
+
+
+def build_subscriber_email(
+    subscriber, category, recent_posts, fragments, unsubscribe_links
+):
+    """Письмо подписчику: блок категории рендерится один раз на прогон"""
+    html = fragments.get(
+        category.pk,
         "emails/weekly_newsletter.html",
-        {
+        lambda: {
             "category": category,
-            "posts": recent_posts,
-            "post_urls": post_urls,
+            "items": [
+                (
+                    post,
+                    settings.SITE_URL + reverse("news:news_detail", args=[post.id]),
+                )
+                for post in recent_posts
+            ],
         },
+        personal=("user.username", "unsubscribe_url"),
     )
 
-    send_mail(
+    subject = f"Новые статьи в категории {category.name} за последнюю неделю"
+    unsubscribe_url = unsubscribe_links(subscriber.pk, category.pk)
+    message = EmailMultiAlternatives(
         subject,
         "",
         "from@example.com",  # Укажите ваш email отправителя
         [subscriber.email],
-        html_message=html_content,
+        # отписка в один клик из почтового клиента (RFC 8058) — POST на ссылку
+        headers={
+            "List-Unsubscribe": f"<{unsubscribe_url}>",
+            "List-Unsubscribe-Post": "List-Unsubscribe=One-Click",
+        },
     )
+    message.attach_alternative(
+        html.fill(
+            {"user.username": subscriber.username, "unsubscribe_url": unsubscribe_url}
+        ),
+        "text/html",
+    )
+    return message
 
 
 def delete_old_job_executions(max_age=604_800):
@@ -91,6 +131,38 @@ class Command(BaseCommand):
         )
         logger.info("Добавлена задача: 'send_weekly_newsletter'.")
 
+        # Сброс буфера голосов в БД
+        scheduler.add_job(
+            flush_votes,
+            trigger=IntervalTrigger(seconds=settings.NEWS_VOTE_FLUSH_INTERVAL),
+            id="flush_votes",
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True,
+        )
+        logger.info("Добавлена задача: 'flush_votes'.")
+
+        # Обрезка персональных лент до NEWS_TIMELINE_MAX_ENTRIES
+        scheduler.add_job(
+            trim_timelines,
+            trigger=CronTrigger(hour="03", minute="30"),
+            id="trim_timelines",
+            max_instances=1,
+            replace_existing=True,
+        )
+        logger.info("Добавлена задача: 'trim_timelines'.")
+
+        # Пересчёт рейтинга «в тренде»
+        scheduler.add_job(
+            refresh_trending,
+            trigger=IntervalTrigger(seconds=settings.NEWS_TRENDING_REFRESH_INTERVAL),
+            id="refresh_trending",
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True,
+        )
+        logger.info("Добавлена задача: 'refresh_trending'.")
+
         # Добавляем задачу для удаления старых задач
         scheduler.add_job(
             delete_old_job_executions,
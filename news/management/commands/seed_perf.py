@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from news.seed import SeedConfig, seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет БД синтетическими пользователями, авторами, категориями, "
+        "подписками, постами и комментариями с реалистичным перекосом "
+        "(для замеров производительности; письма и сигналы не срабатывают)"
+    )
+
+    def add_arguments(self, parser):
+        defaults = SeedConfig()
+        parser.add_argument(
+            "--posts",
+            type=int,
+            default=defaults.posts,
+            help="Число постов; остальные объёмы по умолчанию — пропорционально",
+        )
+        for name in ("users", "authors", "categories", "comments"):
+            parser.add_argument(f"--{name}", type=int)
+        parser.add_argument(
+            "--subscriptions-per-user",
+            type=int,
+            default=defaults.subscriptions_per_user,
+        )
+        parser.add_argument("--days", type=int, default=defaults.days)
+        parser.add_argument(
+            "--skew",
+            type=float,
+            default=defaults.skew,
+            help="Показатель Ципфа: 0 — равномерно, больше — сильнее перекос",
+        )
+        parser.add_argument("--seed", type=int, default=defaults.seed)
+        parser.add_argument("--prefix", default=defaults.prefix)
+
+    def handle(self, *args, **options):
+        overrides = {
+            name: options[name]
+            for name in ("users", "authors", "categories", "comments")
+            if options[name] is not None
+        }
+        config = SeedConfig.for_posts(
+            options["posts"],
+            subscriptions_per_user=options["subscriptions_per_user"],
+            days=options["days"],
+            skew=options["skew"],
+            seed=options["seed"],
+            prefix=options["prefix"],
+            **overrides,
+        )
+        if min(config.users, config.authors, config.categories) < 1:
+            raise CommandError("Нужны хотя бы один пользователь, автор и категория")
+
+        self.stdout.write(
+            f"Генерация: {config.users} пользователей, {config.authors} авторов, "
+            f"{config.categories} категорий, {config.posts} постов, "
+            f"{config.comments} комментариев"
+        )
+        with transaction.atomic():
+            report = seed(config, log=self.stdout.write)
+        total = sum(report.timings.values())
+        self.stdout.write(self.style.SUCCESS(f"Готово за {total:.1f} с"))
@@ -0,0 +1,349 @@
+"""
+Встроенные метрики в формате Prometheus (``/metrics``).
+
+Счётчики и гистограммы копятся в памяти процесса и раз в
+``NEWS_METRICS_FLUSH_INTERVAL`` секунд сбрасываются инкрементами в общий кеш
+(CACHE_URL) — так ``/metrics`` любого gunicorn-воркера отдаёт сумму по всем
+процессам. Список известных серий — журнал ``metrics:series:<n>``: серию
+заносит ровно один процесс (``cache.add``), поэтому журнал не растёт с
+перезапусками.
+
+Источники: ``MetricsMiddleware`` (запросы по имени URL), Celery-сигналы
+(длительность и ожидание в очереди задач ``news.*``), ``MetricsEmailBackend``
+(отправленные письма) и счётчики страничного кеша (``news.cache``).
+"""
+
+from __future__ import annotations
+
+import atexit
+import bisect
+import hashlib
+import threading
+import time
+from collections import defaultdict
+
+from celery.signals import before_task_publish, task_postrun, task_prerun
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+
+from . import cache as page_cache
+
+SEQ_KEY = "metrics:series:seq"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TASK_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def enabled() -> bool:
+    return getattr(settings, "NEWS_METRICS", True)
+
+
+def flush_interval() -> float:
+    return getattr(settings, "NEWS_METRICS_FLUSH_INTERVAL", 10)
+
+
+def _value_key(series: tuple) -> str:
+    return "metrics:v:" + hashlib.md5(repr(series).encode()).hexdigest()
+
+
+def _incr(key: str, delta: int) -> None:
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, None):
+            cache.incr(key, delta)
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Реестр
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+class Registry:
+    """Локальные дельты процесса + сброс в общий кеш."""
+
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+        self._lock = threading.Lock()
+        self._pending: dict[tuple, int] = defaultdict(int)
+        self._known: set[tuple] = set()
+        self._new: list[tuple] = []
+        self._flushed_at = time.monotonic()
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def add(self, series: tuple, value: int) -> None:
+        with self._lock:
+            self._pending[series] += value
+            if series not in self._known:
+                self._known.add(series)
+                self._new.append(series)
+            due = time.monotonic() - self._flushed_at >= flush_interval()
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(int)
+            new, self._new = self._new, []
+            self._flushed_at = time.monotonic()
+        for series in new:
+            # серию регистрирует в журнале только первый процесс
+            if cache.add(f"metrics:known:{_value_key(series)}", 1, None):
+                try:
+                    seq = cache.incr(SEQ_KEY)
+                except ValueError:
+                    seq = 1 if cache.add(SEQ_KEY, 1, None) else cache.incr(SEQ_KEY)
+                cache.set(f"metrics:series:{seq}", series, None)
+        for series, delta in pending.items():
+            if delta:
+                _incr(_value_key(series), delta)
+
+    def collect(self) -> dict[tuple, int]:
+        """Все серии всех процессов: ``{(метрика, метки, суффикс): значение}``."""
+        last = cache.get(SEQ_KEY, 0)
+        index = cache.get_many([f"metrics:series:{n}" for n in range(1, last + 1)])
+        series = list(dict.fromkeys(index.values()))
+        values = cache.get_many([_value_key(s) for s in series])
+        return {s: values.get(_value_key(s), 0) for s in series}
+
+    def reset(self) -> None:
+        last = cache.get(SEQ_KEY, 0)
+        index = cache.get_many([f"metrics:series:{n}" for n in range(1, last + 1)])
+        cache.delete_many(
+            [
+                *index,
+                *(_value_key(s) for s in index.values()),
+                *(f"metrics:known:{_value_key(s)}" for s in index.values()),
+                SEQ_KEY,
+            ]
+        )
+        with self._lock:
+            self._pending.clear()
+            self._known.clear()
+            self._new.clear()
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+
+def _labels(labelnames: tuple[str, ...], values: dict) -> tuple:
+    return tuple((name, str(values[name])) for name in labelnames)
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: int = 1, **labels) -> None:
+        registry.add((self.name, _labels(self.labelnames, labels), ""), amount)
+
+
+class Histogram(Metric):
+    """Сумма хранится в микросекундах: в кеше только целые инкременты."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, seconds: float, **labels) -> None:
+        key = _labels(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, seconds)
+        bucket = repr(self.buckets[index]) if index < len(self.buckets) else "+Inf"
+        registry.add((self.name, key, f"le:{bucket}"), 1)
+        registry.add((self.name, key, "count"), 1)
+        registry.add((self.name, key, "sum_us"), round(seconds * 1_000_000))
+
+
+HTTP_REQUESTS = Counter(
+    "news_http_requests_total",
+    "HTTP-запросы по имени URL, методу и классу статуса",
+    ("view", "method", "status"),
+)
+HTTP_LATENCY = Histogram(
+    "news_http_request_duration_seconds",
+    "Время обработки HTTP-запроса",
+    ("view", "method"),
+)
+TASKS = Counter(
+    "news_celery_tasks_total", "Выполненные задачи news.tasks", ("task", "state")
+)
+TASK_DURATION = Histogram(
+    "news_celery_task_duration_seconds",
+    "Длительность задачи",
+    ("task",),
+    buckets=TASK_BUCKETS,
+)
+TASK_QUEUE_WAIT = Histogram(
+    "news_celery_task_queue_wait_seconds",
+    "Ожидание задачи в очереди (от публикации до старта)",
+    ("task",),
+    buckets=TASK_BUCKETS,
+)
+MAIL_SENT = Counter("news_mail_sent_total", "Отправленные письма", ("result",))
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Вывод в формате Prometheus
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format(name: str, labels, value) -> str:
+    if labels:
+        inner = ",".join(f'{key}="{_escape(val)}"' for key, val in labels)
+        return f"{name}{{{inner}}} {value}"
+    return f"{name} {value}"
+
+
+def render() -> str:
+    registry.flush()  # свои последние дельты — до чтения
+    by_metric: dict[str, dict[tuple, dict[str, int]]] = defaultdict(
+        lambda: defaultdict(dict)
+    )
+    for (name, labels, suffix), value in registry.collect().items():
+        by_metric[name][labels][suffix] = value
+
+    lines = []
+    for metric in registry.metrics.values():
+        lines += [
+            f"# HELP {metric.name} {metric.documentation}",
+            f"# TYPE {metric.name} {metric.kind}",
+        ]
+        for labels, parts in sorted(by_metric[metric.name].items()):
+            if metric.kind == "counter":
+                lines.append(_format(metric.name, labels, parts.get("", 0)))
+                continue
+            cumulative = 0
+            for bound in [*map(repr, metric.buckets), "+Inf"]:
+                cumulative += parts.get(f"le:{bound}", 0)
+                lines.append(
+                    _format(
+                        f"{metric.name}_bucket", (*labels, ("le", bound)), cumulative
+                    )
+                )
+            lines.append(
+                _format(f"{metric.name}_sum", labels, parts.get("sum_us", 0) / 1e6)
+            )
+            lines.append(_format(f"{metric.name}_count", labels, parts.get("count", 0)))
+
+    # счётчики news.cache уже общие для всех процессов
+    lines += [
+        "# HELP news_cache_events_total События страничного и фрагментного кеша",
+        "# TYPE news_cache_events_total counter",
+    ]
+    for namespace, events in page_cache.cache_stats().items():
+        for event, value in events.items():
+            labels = (("namespace", namespace), ("event", event))
+            lines.append(_format("news_cache_events_total", labels, value))
+    return "\n".join(lines) + "\n"
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Источники
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+class MetricsMiddleware:
+    """Счётчик и гистограмма задержки по имени URL (``news:news_list`` и т.п.)."""
+
+    def __init__(self, get_response):
+        if not enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, "resolver_match", None)
+        # неразрешённые пути сводим в одну серию: иначе кардинальность без предела
+        view = match.view_name if match else "unmatched"
+        HTTP_REQUESTS.inc(
+            view=view, method=request.method, status=f"{response.status_code // 100}xx"
+        )
+        HTTP_LATENCY.observe(elapsed, view=view, method=request.method)
+        return response
+
+
+_task_started: dict[str, float] = {}
+
+
+def _tracked(name: str | None) -> bool:
+    return enabled() and bool(name) and name.startswith("news.")
+
+
+@before_task_publish.connect
+def stamp_task_publish(sender=None, headers=None, **kwargs):
+    if headers is not None and _tracked(sender):
+        headers["news_sent_at"] = time.time()
+
+
+@task_prerun.connect
+def start_task_timer(task_id=None, task=None, **kwargs):
+    if not _tracked(task.name):
+        return
+    _task_started[task_id] = time.perf_counter()
+    sent_at = getattr(task.request, "news_sent_at", None)
+    if sent_at:
+        TASK_QUEUE_WAIT.observe(max(time.time() - sent_at, 0), task=task.name)
+
+
+@task_postrun.connect
+def finish_task_timer(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is None:
+        return
+    TASK_DURATION.observe(time.perf_counter() - started, task=task.name)
+    TASKS.inc(task=task.name, state=state or "UNKNOWN")
+
+
+class MetricsEmailBackend(BaseEmailBackend):
+    """Обёртка над NEWS_METRICS_EMAIL_BACKEND, считающая отправленные письма."""
+
+    def __init__(self, fail_silently=False, **kwargs):
+        super().__init__(fail_silently=fail_silently)
+        self.backend = get_connection(
+            getattr(
+                settings,
+                "NEWS_METRICS_EMAIL_BACKEND",
+                "django.core.mail.backends.smtp.EmailBackend",
+            ),
+            fail_silently=fail_silently,
+            **kwargs,
+        )
+
+    def open(self):
+        return self.backend.open()
+
+    def close(self):
+        return self.backend.close()
+
+    def send_messages(self, email_messages):
+        messages = list(email_messages)
+        sent = self.backend.send_messages(messages) or 0
+        if sent:
+            MAIL_SENT.inc(sent, result="sent")
+        if len(messages) > sent:
+            MAIL_SENT.inc(len(messages) - sent, result="failed")
+        return sent
@@ -0,0 +1,155 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:49
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+POSTGRES_SEARCH_INDEX = "news_post_search_gin"
+
+
+def _search_gin_index():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    # Выражение должно совпадать с PostgresSearchBackend.vector()
+    return GinIndex(
+        SearchVector("title", "text", config="russian"),
+        name=POSTGRES_SEARCH_INDEX,
+    )
+
+
+def create_postgres_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.add_index(apps.get_model("news", "Post"), _search_gin_index())
+
+
+def drop_postgres_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.remove_index(apps.get_model("news", "Post"), _search_gin_index())
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("news", "0001_initial"),
+    ]
+
+    operations = [
+        # Поля TimeStampedModel, которых не было в 0001
+        migrations.AddField(
+            model_name="author",
+            name="created_at",
+            field=models.DateTimeField(
+                auto_now_add=True,
+                db_index=True,
+                default=django.utils.timezone.now,
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="author",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="created_at",
+            field=models.DateTimeField(
+                auto_now_add=True,
+                db_index=True,
+                default=django.utils.timezone.now,
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="userprofile",
+            name="created_at",
+            field=models.DateTimeField(
+                auto_now_add=True,
+                db_index=True,
+                default=django.utils.timezone.now,
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="userprofile",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AlterField(
+            model_name="comment",
+            name="created_at",
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name="comment",
+            name="rating",
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.AlterField(
+            model_name="post",
+            name="created_at",
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name="post",
+            name="type",
+            field=models.CharField(
+                choices=[("AR", "Статья"), ("NW", "Новость")],
+                db_index=True,
+                default="AR",
+                max_length=2,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(fields=["rating"], name="news_post_rating_619ce9_idx"),
+        ),
+        # Поисковый индекс
+        migrations.CreateModel(
+            name="SearchIndexEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("term", models.CharField(max_length=64)),
+                ("weight", models.PositiveIntegerField(default=1)),
+                (
+                    "post",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_entries",
+                        to="news.post",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Запись поискового индекса",
+                "verbose_name_plural": "Поисковый индекс",
+                "unique_together": {("term", "post")},
+            },
+        ),
+        migrations.RunPython(create_postgres_search_index, drop_postgres_search_index),
+    ]
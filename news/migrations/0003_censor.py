@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:12
+
+from django.db import migrations, models
+
+# Словарь, который раньше был зашит в фильтр censor (custom_filters.py)
+DEFAULT_WORDS = (
+    "плохое_слово1",
+    "плохое_слово2",
+    "редиска",
+    "овощ",
+    "дурак",
+    "дурашка",
+    "какашка",
+)
+
+
+def seed_words(apps, schema_editor):
+    CensoredWord = apps.get_model("news", "CensoredWord")
+    CensoredWord.objects.bulk_create(
+        [CensoredWord(word=word) for word in DEFAULT_WORDS], ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("news", "0002_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CensoredWord",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("word", models.CharField(max_length=64, unique=True)),
+            ],
+            options={
+                "verbose_name": "Запрещённое слово",
+                "verbose_name_plural": "Словарь цензора",
+                "ordering": ("word",),
+            },
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="censored_text",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="censored_title",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+        migrations.RunPython(seed_words, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("news", "0003_censor"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="preview_text",
+            field=models.CharField(blank=True, max_length=150, null=True),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="rendered_text",
+            field=models.TextField(blank=True, default=""),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:33
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_counts(apps, schema_editor):
+    Category = apps.get_model("news", "Category")
+    PostCategory = apps.get_model("news", "PostCategory")
+
+    def count(qs):
+        return Coalesce(
+            Subquery(
+                qs.order_by().values("category_id").annotate(n=Count("*")).values("n")
+            ),
+            Value(0),
+        )
+
+    Category.objects.update(
+        subscriber_count=count(
+            Category.subscribers.through.objects.filter(category_id=OuterRef("pk"))
+        ),
+        post_count=count(PostCategory.objects.filter(category_id=OuterRef("pk"))),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("news", "0004_post_derived_fields"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="post_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="subscriber_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("news", "0006_timeline"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrendingScore",
+            fields=[
+                (
+                    "post",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="trending",
+                        serialize=False,
+                        to="news.post",
+                    ),
+                ),
+                ("score", models.BigIntegerField(db_index=True)),
+                ("landmark", models.DateTimeField()),
+            ],
+            options={
+                "verbose_name": "Рейтинг «в тренде»",
+                "verbose_name_plural": "Рейтинг «в тренде»",
+            },
+        ),
+    ]
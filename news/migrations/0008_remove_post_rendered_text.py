@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:08
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("news", "0007_trending"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="post",
+            name="rendered_text",
+        ),
+    ]
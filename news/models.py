@@ -1,11 +1,18 @@
 from __future__ import annotations
 
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
 from django.contrib.auth import get_user_model
 from django.db import models
-from django.db.models import F, Sum
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
 from django.urls import reverse
 from django.utils.text import Truncator
 
+from .censor import censor_on_save, censor_text
+
 User = get_user_model()
 
 
@@ -23,26 +30,49 @@ class TimeStampedModel(models.Model):
 # --- Author ------------------------------------------------------------------
 
 
+POST_RATING_WEIGHT = 3
+PREVIEW_LENGTH = 150
+
+
 class Author(TimeStampedModel):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="author")
     rating = models.IntegerField(default=0)
 
-    def update_rating(self):
-        """Оптимизированная агрегация рейтинга автора."""
-
-        posts_aggr = (self.posts.aggregate(total=Sum("rating"))["total"] or 0) * 3
-        my_comments_aggr = (
-            self.user.comments.aggregate(total=Sum("rating"))["total"] or 0
-        )
-        under_my_posts_aggr = (
-            Comment.objects.filter(post__author=self).aggregate(total=Sum("rating"))[
-                "total"
-            ]
-            or 0
+    @staticmethod
+    def computed_rating():
+        """
+        Эталонный рейтинг как SQL-выражение (коррелированные подзапросы по OuterRef):
+        3 × рейтинг постов + рейтинг своих комментариев + комментариев под постами.
+        """
+
+        def total(qs, group_by):
+            return Coalesce(
+                Subquery(
+                    qs.order_by()
+                    .values(group_by)
+                    .annotate(total=Sum("rating"))
+                    .values("total")
+                ),
+                Value(0),
+            )
+
+        return (
+            total(Post.objects.filter(author=OuterRef("pk")), "author")
+            * POST_RATING_WEIGHT
+            + total(Comment.objects.filter(user=OuterRef("user")), "user")
+            + total(Comment.objects.filter(post__author=OuterRef("pk")), "post__author")
         )
 
-        self.rating = posts_aggr + my_comments_aggr + under_my_posts_aggr
-        self.save(update_fields=["rating"])
+    @classmethod
+    def apply_rating_delta(cls, delta: int, **lookup) -> None:
+        """Сдвинуть рейтинг авторов, подходящих под ``lookup``, одним UPDATE."""
+        if delta:
+            cls.objects.filter(**lookup).update(rating=F("rating") + delta)
+
+    def update_rating(self):
+        """Полный пересчёт рейтинга одним UPDATE (для сверки, не на каждый лайк)."""
+        Author.objects.filter(pk=self.pk).update(rating=Author.computed_rating())
+        self.refresh_from_db(fields=["rating"])
 
     def __str__(self):
         return f"Автор {self.user}"
@@ -51,11 +81,19 @@ class Author(TimeStampedModel):
 # --- Category ----------------------------------------------------------------
 
 
+# накапливаемые внутри Category.batched_counts() дельты: {(поле, pk): дельта}
+_pending_counts: ContextVar[dict | None] = ContextVar("category_counts", default=None)
+
+
 class Category(TimeStampedModel):
     name = models.CharField(max_length=128, unique=True)
     subscribers = models.ManyToManyField(
         User, related_name="subscribed_categories", blank=True
     )
+    # денормализованные счётчики: ведутся сигналами (news.signals) и массовыми
+    # загрузками, сверяются Category.recount()
+    subscriber_count = models.PositiveIntegerField(default=0, editable=False)
+    post_count = models.PositiveIntegerField(default=0, editable=False)
 
     def subscribe(self, user: User):
         self.subscribers.add(user)
@@ -63,10 +101,153 @@ class Category(TimeStampedModel):
     def unsubscribe(self, user: User):
         self.subscribers.remove(user)
 
+    @classmethod
+    def apply_count_deltas(cls, field: str, deltas: dict[int, int]) -> None:
+        """Сдвинуть счётчик ``field`` по ``{pk: дельта}`` — UPDATE на значение дельты."""
+        pending = _pending_counts.get()
+        if pending is not None:
+            for pk, delta in deltas.items():
+                pending[field, pk] += delta
+            return
+        by_delta: dict[int, list[int]] = defaultdict(list)
+        for pk, delta in deltas.items():
+            if delta:
+                by_delta[delta].append(pk)
+        for delta, pks in by_delta.items():
+            # не уходим ниже нуля, даже если счётчик разошёлся с таблицей связей
+            value = F(field) + delta if delta > 0 else Greatest(F(field) + delta, 0)
+            cls.objects.filter(pk__in=pks).update(**{field: value})
+
+    @classmethod
+    @contextmanager
+    def batched_counts(cls):
+        """Копить дельты счётчиков внутри блока и применить их разом на выходе."""
+        if _pending_counts.get() is not None:
+            yield
+            return
+        pending: dict = defaultdict(int)
+        token = _pending_counts.set(pending)
+        try:
+            yield
+        finally:
+            _pending_counts.reset(token)
+        by_field: dict[str, dict[int, int]] = defaultdict(dict)
+        for (field, pk), delta in pending.items():
+            by_field[field][pk] = delta
+        for field, deltas in by_field.items():
+            cls.apply_count_deltas(field, deltas)
+
+    @classmethod
+    def recount(cls, pks=None) -> int:
+        """Пересчитать счётчики по таблицам связей одним UPDATE (сверка)."""
+
+        def count(qs):
+            return Coalesce(
+                Subquery(
+                    qs.order_by()
+                    .values("category_id")
+                    .annotate(n=Count("*"))
+                    .values("n")
+                ),
+                Value(0),
+            )
+
+        qs = cls.objects.all() if pks is None else cls.objects.filter(pk__in=pks)
+        return qs.update(
+            subscriber_count=count(
+                cls.subscribers.through.objects.filter(category_id=OuterRef("pk"))
+            ),
+            post_count=count(PostCategory.objects.filter(category_id=OuterRef("pk"))),
+        )
+
     def __str__(self):
         return self.name
 
 
+# --- Вклад в рейтинг авторов -------------------------------------------------
+
+
+class RatingContributorMixin:
+    """
+    Модель, чей ``rating`` входит в рейтинг авторов (Post, Comment).
+
+    Хранит снимок своего вклада, чтобы при сохранении/удалении сдвигать
+    ``Author.rating`` на дельту за O(1) вместо полного пересчёта.
+    """
+
+    rating_state_fields: tuple[str, ...] = ()
+
+    def rating_targets(self) -> list[tuple[dict, int]]:
+        """Пары (lookup авторов, вес), которым засчитывается ``rating``."""
+        raise NotImplementedError
+
+    def remember_rating_state(self) -> None:
+        loaded = all(f in self.__dict__ for f in self.rating_state_fields)
+        self._rating_state = (self.rating_targets(), self.rating) if loaded else None
+
+    def load_rating_state(self) -> None:
+        """Снимок из БД — если объект был загружен с отложенными полями."""
+        row = (
+            type(self)
+            .objects.filter(pk=self.pk)
+            .values(*self.rating_state_fields)
+            .first()
+        )
+        if row is None:
+            self._rating_state = None
+            return
+        stored = type(self)(pk=self.pk, **row)
+        stored.remember_rating_state()
+        self._rating_state = stored._rating_state
+
+    def rating_deltas(self, before, after) -> dict[tuple, int]:
+        deltas: dict[tuple, int] = {}
+        for sign, state in ((-1, before), (1, after)):
+            if not state:
+                continue
+            targets, rating = state
+            for lookup, weight in targets:
+                key = tuple(sorted(lookup.items()))
+                deltas[key] = deltas.get(key, 0) + sign * weight * rating
+        return deltas
+
+    def apply_rating_change(self, before, after) -> None:
+        for key, delta in self.rating_deltas(before, after).items():
+            Author.apply_rating_delta(delta, **dict(key))
+
+    @property
+    def live_rating(self) -> int:
+        """``rating`` из БД плюс голоса, ещё не сброшенные из буфера."""
+        from .votes import pending_delta
+
+        pending = getattr(self, "_pending_votes", None)
+        if pending is None:
+            pending = pending_delta(self)
+        return self.rating + pending
+
+    def _vote(self, delta: int) -> None:
+        from .votes import buffer_enabled, record_vote
+
+        if buffer_enabled():
+            # горячую строку не трогаем: дельту в БД унесёт flush_votes()
+            record_vote(self, delta)
+            self._pending_votes = None
+            return
+
+        # Без гонок — F-выражения; вклад в авторов тоже дельтой
+        type(self).objects.filter(pk=self.pk).update(rating=F("rating") + delta)
+        for lookup, weight in self.rating_targets():
+            Author.apply_rating_delta(delta * weight, **lookup)
+        self.refresh_from_db(fields=["rating"])
+        self.remember_rating_state()
+
+    def like(self):
+        self._vote(1)
+
+    def dislike(self):
+        self._vote(-1)
+
+
 # --- Post --------------------------------------------------------------------
 
 
@@ -75,7 +256,7 @@ class PostType(models.TextChoices):
     NEWS = "NW", "Новость"
 
 
-class Post(TimeStampedModel):
+class Post(RatingContributorMixin, TimeStampedModel):
     author = models.ForeignKey(
         Author, on_delete=models.SET_NULL, null=True, blank=True, related_name="posts"
     )
@@ -85,6 +266,12 @@ class Post(TimeStampedModel):
     title = models.CharField(max_length=255, db_index=True)
     text = models.TextField()
     rating = models.IntegerField(default=0, db_index=True)
+    # заполняются при NEWS_CENSOR_ON_SAVE, чтобы шаблоны не прогоняли цензор
+    censored_title = models.CharField(max_length=255, blank=True, default="")
+    censored_text = models.TextField(blank=True, default="")
+    # производные text, считаются в save(): ленты грузят их вместо text.
+    # NULL — ещё не посчитано (см. команду backfill_post_fields)
+    preview_text = models.CharField(max_length=PREVIEW_LENGTH, null=True, blank=True)
 
     categories = models.ManyToManyField(
         "Category", through="PostCategory", related_name="posts"
@@ -107,18 +294,67 @@ class Post(TimeStampedModel):
     def get_absolute_url(self):
         return reverse("news_detail", args=[str(self.pk)])
 
-    # Без гонок — F-выражения
-    def like(self):
-        Post.objects.filter(pk=self.pk).update(rating=F("rating") + 1)
-        self.refresh_from_db(fields=["rating"])
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or {"title", "text"} & set(update_fields):
+            derived = self.refresh_derived_fields()
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, *derived}
+        super().save(*args, **kwargs)
+
+    def refresh_derived_fields(self) -> list[str]:
+        """Пересчитать хранимые производные title/text; вернуть имена полей."""
+        # без NEWS_CENSOR_ON_SAVE превью хранится как есть и цензурится при
+        # выводе, как заголовок: смена словаря не требует пересчёта строк
+        self.preview_text = Truncator(self.text).chars(PREVIEW_LENGTH)
+        fields = ["preview_text"]
+        if censor_on_save():
+            self.apply_censor()
+            fields += ["censored_title", "censored_text"]
+        return fields
+
+    def apply_censor(self) -> None:
+        self.censored_title = censor_text(self.title)
+        self.censored_text = censor_text(self.text)
+        # цензурим только обрезанный кусок, а не всю статью
+        self.preview_text = censor_text(Truncator(self.text).chars(PREVIEW_LENGTH))
+
+    rating_state_fields = ("author_id", "rating")
+
+    def rating_targets(self):
+        if not self.author_id:
+            return []
+        return [({"pk": self.author_id}, POST_RATING_WEIGHT)]
+
+    def _vote(self, delta: int) -> None:
+        from . import cache as page_cache
+        from .trending import record_votes
+        from .votes import buffer_enabled
+
+        super()._vote(delta)
+        if not buffer_enabled():
+            # буферизованный голос сбрасывает кеш в record_vote(), а в «в тренде»
+            # попадает при flush_votes(); здесь голос уже записан в БД
+            page_cache.bump(page_cache.post_scope(self.pk), page_cache.RATINGS)
+            record_votes({self.pk: delta})
 
-    def dislike(self):
-        Post.objects.filter(pk=self.pk).update(rating=F("rating") - 1)
-        self.refresh_from_db(fields=["rating"])
+    @property
+    def display_title(self) -> str:
+        """Заголовок для шаблонов: сохранённая цензура или цензор на лету."""
+        return self.censored_title or censor_text(self.title)
+
+    @property
+    def display_text(self) -> str:
+        return self.censored_text or censor_text(self.text)
 
     @property
-    def preview(self):
-        return Truncator(self.text).chars(150)
+    def preview(self) -> str:
+        if self.preview_text is None:
+            # строка ещё не прошла backfill: считаем на лету (грузит text)
+            return censor_text(Truncator(self.text).chars(PREVIEW_LENGTH))
+        if censor_on_save():
+            return self.preview_text
+        return censor_text(self.preview_text)
 
 
 # --- PostCategory ------------------------------------------------------------
@@ -144,7 +380,7 @@ class PostCategory(models.Model):
 # --- Comment -----------------------------------------------------------------
 
 
-class Comment(TimeStampedModel):
+class Comment(RatingContributorMixin, TimeStampedModel):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="comments")
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="comments")
     text = models.TextField()
@@ -156,13 +392,11 @@ class Comment(TimeStampedModel):
     def __str__(self):
         return f"Комментарий от {self.user} к «{self.post}»"
 
-    def like(self):
-        Comment.objects.filter(pk=self.pk).update(rating=F("rating") + 1)
-        self.refresh_from_db(fields=["rating"])
+    rating_state_fields = ("user_id", "post_id", "rating")
 
-    def dislike(self):
-        Comment.objects.filter(pk=self.pk).update(rating=F("rating") - 1)
-        self.refresh_from_db(fields=["rating"])
+    def rating_targets(self):
+        # свой комментарий автору + комментарий под постом автору поста
+        return [({"user_id": self.user_id}, 1), ({"posts__pk": self.post_id}, 1)]
 
 
 # --- UserProfile -------------------------------------------------------------
@@ -174,3 +408,89 @@ class UserProfile(TimeStampedModel):
 
     def __str__(self):
         return f"Профиль пользователя {self.user}"
+
+
+# --- SearchIndexEntry --------------------------------------------------------
+
+
+class SearchIndexEntry(models.Model):
+    """Инвертированный индекс полнотекстового поиска: терм → пост (см. news.search)."""
+
+    term = models.CharField(max_length=64)
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="search_entries"
+    )
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        unique_together = (("term", "post"),)
+        verbose_name = "Запись поискового индекса"
+        verbose_name_plural = "Поисковый индекс"
+
+    def __str__(self):
+        return f"{self.term} → {self.post_id}"
+
+
+class TimelineEntry(models.Model):
+    """Запись персональной ленты «мои категории» (см. news.timeline)."""
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="timeline_entries"
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="timeline_entries"
+    )
+    # копия Post.created_at: страница ленты читается по одному индексу
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = (("user", "post"),)
+        indexes = [
+            models.Index(
+                fields=["user", "-created_at", "-post"], name="timeline_page_idx"
+            )
+        ]
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Персональные ленты"
+
+    def __str__(self):
+        return f"{self.user_id} ← {self.post_id}"
+
+
+# --- CensoredWord ------------------------------------------------------------
+
+
+class CensoredWord(models.Model):
+    """Слово словаря цензора (см. news.censor)."""
+
+    word = models.CharField(max_length=64, unique=True)
+
+    class Meta:
+        ordering = ("word",)
+        verbose_name = "Запрещённое слово"
+        verbose_name_plural = "Словарь цензора"
+
+    def __str__(self):
+        return self.word
+
+    def save(self, *args, **kwargs):
+        self.word = self.word.strip().lower()
+        super().save(*args, **kwargs)
+
+
+class TrendingScore(models.Model):
+    """Снимок рейтинга «в тренде» на момент пересчёта (см. news.trending)."""
+
+    post = models.OneToOneField(
+        Post, on_delete=models.CASCADE, primary_key=True, related_name="trending"
+    )
+    # очки × trending.SCALE с затуханием, отсчитанным от landmark
+    score = models.BigIntegerField(db_index=True)
+    landmark = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Рейтинг «в тренде»"
+        verbose_name_plural = "Рейтинг «в тренде»"
+
+    def __str__(self):
+        return f"{self.post_id}: {self.score}"
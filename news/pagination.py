@@ -0,0 +1,304 @@
+"""
+Keyset (cursor) пагинация для ленты и API.
+
+Вместо ``OFFSET`` + ``COUNT(*)`` страница выбирается условием
+``(created_at, id) < (последняя строка)`` по индексу, поэтому страница N стоит
+столько же, сколько первая. Курсор — подписанный ``django.core.signing``
+токен со значениями полей сортировки, клиенту он непрозрачен.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from collections import OrderedDict
+from collections.abc import Iterator, Sequence
+from datetime import datetime
+
+from django.core import signing
+from django.core.paginator import Paginator
+from django.db.models import Q, QuerySet
+from django.http import HttpRequest, QueryDict
+from django.utils.functional import cached_property
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .cache import cached_fragment
+
+DEFAULT_ORDERING = ("-created_at", "-id")
+CURSOR_SALT = "news.pagination.cursor"
+COUNT_CACHE_TIMEOUT = 300
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Оценка количества без COUNT(*) на каждый запрос
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+def cached_count(qs: QuerySet, timeout: int = COUNT_CACHE_TIMEOUT) -> int:
+    """Количество строк queryset, закешированное по тексту SQL-запроса."""
+    sql_hash = hashlib.md5(str(qs.query).encode()).hexdigest()
+    name = f"count:{qs.model._meta.label_lower}:{sql_hash}"
+    # COUNT(*) по большой таблице пересчитывает один запрос, остальные ждут
+    return cached_fragment(name, lambda: qs.order_by().count(), timeout=timeout)
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, который берёт общее количество из кеша (для ?page=N)."""
+
+    @cached_property
+    def count(self) -> int:
+        return cached_count(self.object_list)
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Курсоры
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+def _to_json(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def encode_cursor(values: Sequence, forward: bool) -> str:
+    return signing.dumps(
+        {"v": [_to_json(v) for v in values], "f": forward}, salt=CURSOR_SALT
+    )
+
+
+def decode_cursor(token: str | None, size: int) -> tuple[list, bool] | None:
+    """Вернуть (значения, направление) или None для пустого/битого курсора."""
+    if not token:
+        return None
+    try:
+        payload = signing.loads(token, salt=CURSOR_SALT)
+        values, forward = payload["v"], payload["f"]
+    except (signing.BadSignature, KeyError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values, bool(forward)
+
+
+def _field_name(field: str) -> str:
+    return field.lstrip("-")
+
+
+def keyset_filter(ordering: Sequence[str], values: Sequence, forward: bool) -> Q:
+    """
+    Лексикографическое условие «строго после/до» для составного ключа.
+
+    Для ``("-created_at", "-id")`` вперёд получается
+    ``created_at < c OR (created_at = c AND id < i)`` плюс избыточное
+    ``created_at <= c``, чтобы планировщик сразу пошёл по индексу.
+    """
+    condition = None
+    for index, field in enumerate(ordering):
+        descending = field.startswith("-")
+        lookup = "lt" if descending == forward else "gt"
+        term = Q(**{f"{_field_name(field)}__{lookup}": values[index]})
+        for prev_field, prev_value in zip(
+            ordering[:index], values[:index], strict=True
+        ):
+            term &= Q(**{_field_name(prev_field): prev_value})
+        condition = term if condition is None else condition | term
+
+    first = ordering[0]
+    bound = "lte" if first.startswith("-") == forward else "gte"
+    return Q(**{f"{_field_name(first)}__{bound}": values[0]}) & condition
+
+
+def _reverse_ordering(ordering: Sequence[str]) -> list[str]:
+    return [f[1:] if f.startswith("-") else f"-{f}" for f in ordering]
+
+
+class KeysetPage:
+    """Страница keyset-пагинации; в шаблоне ведёт себя как ``page_obj``."""
+
+    def __init__(
+        self,
+        object_list: list,
+        ordering: Sequence[str],
+        has_next: bool,
+        has_previous: bool,
+        total_estimate: int | None = None,
+    ):
+        self.object_list = object_list
+        self.ordering = ordering
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.total_estimate = total_estimate
+        self.next_query = ""
+        self.previous_query = ""
+
+    def __iter__(self) -> Iterator:
+        return iter(self.object_list)
+
+    def __len__(self) -> int:
+        return len(self.object_list)
+
+    def __bool__(self) -> bool:
+        return bool(self.object_list)
+
+    def _cursor_for(self, obj, forward: bool) -> str:
+        fields = [_field_name(f) for f in self.ordering]
+        # строки values() (быстрый путь API) — словари, а не модели
+        if isinstance(obj, dict):
+            values = [obj[f] for f in fields]
+        else:
+            values = [getattr(obj, f) for f in fields]
+        return encode_cursor(values, forward)
+
+    @property
+    def next_cursor(self) -> str | None:
+        if not (self.has_next and self.object_list):
+            return None
+        return self._cursor_for(self.object_list[-1], forward=True)
+
+    @property
+    def previous_cursor(self) -> str | None:
+        if not (self.has_previous and self.object_list):
+            return None
+        return self._cursor_for(self.object_list[0], forward=False)
+
+
+def paginate_keyset(
+    qs: QuerySet,
+    cursor: str | None,
+    per_page: int,
+    ordering: Sequence[str] = DEFAULT_ORDERING,
+) -> KeysetPage:
+    """Выбрать одну страницу ``qs`` после/до курсора (``per_page + 1`` строк)."""
+    decoded = decode_cursor(cursor, len(ordering))
+    forward = True
+    if decoded:
+        values, forward = decoded
+        qs = qs.filter(keyset_filter(ordering, values, forward))
+
+    order = list(ordering) if forward else _reverse_ordering(ordering)
+    rows = list(qs.order_by(*order)[: per_page + 1])
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if forward:
+        return KeysetPage(rows, ordering, has_next=has_more, has_previous=bool(decoded))
+    rows.reverse()
+    return KeysetPage(rows, ordering, has_next=True, has_previous=has_more)
+
+
+def paginate_request(
+    request: HttpRequest,
+    qs: QuerySet,
+    per_page: int,
+    ordering: Sequence[str] = DEFAULT_ORDERING,
+    cursor_param: str = "cursor",
+    total: int | None = None,
+) -> KeysetPage:
+    """
+    Keyset-страница для HTML-вьюх: ссылки сохраняют остальные GET-параметры.
+    ``total`` — готовое количество (денормализованный счётчик) вместо COUNT(*).
+    """
+    page = paginate_keyset(qs, request.GET.get(cursor_param), per_page, ordering)
+    page.total_estimate = cached_count(qs) if total is None else total
+
+    def query_with(cursor: str | None) -> str:
+        params: QueryDict = request.GET.copy()
+        params.pop("page", None)
+        if cursor:
+            params[cursor_param] = cursor
+        else:
+            params.pop(cursor_param, None)
+        return params.urlencode()
+
+    page.next_query = query_with(page.next_cursor)
+    page.previous_query = query_with(page.previous_cursor)
+    return page
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# DRF
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+class LegacyPageNumberPagination(PageNumberPagination):
+    """Совместимость со старыми клиентами ``?page=N`` (COUNT берётся из кеша)."""
+
+    django_paginator_class = CachedCountPaginator
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class PostCursorPagination(BasePagination):
+    """
+    Keyset-пагинация для API постов по ``(created_at, id)``.
+
+    Формат ответа прежний (``count``/``next``/``previous``/``results``), но
+    ``next``/``previous`` содержат непрозрачный ``?cursor=``, а ``count`` —
+    закешированная оценка. Запросы с ``?page=N`` обслуживает
+    ``LegacyPageNumberPagination``.
+    """
+
+    ordering = DEFAULT_ORDERING
+    cursor_query_param = "cursor"
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    legacy_class = LegacyPageNumberPagination
+
+    def get_page_size(self, request) -> int:
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.legacy = None
+        if PageNumberPagination.page_query_param in request.query_params:
+            self.legacy = self.legacy_class()
+            return self.legacy.paginate_queryset(queryset, request, view)
+
+        self.page = paginate_keyset(
+            queryset,
+            request.query_params.get(self.cursor_query_param),
+            self.get_page_size(request),
+            self.ordering,
+        )
+        self.page.total_estimate = cached_count(queryset)
+        return list(self.page)
+
+    def _link(self, cursor: str | None) -> str | None:
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self) -> str | None:
+        return self._link(self.page.next_cursor)
+
+    def get_previous_link(self) -> str | None:
+        link = self._link(self.page.previous_cursor)
+        if link is None and self.page.has_previous:
+            return remove_query_param(
+                self.request.build_absolute_uri(), self.cursor_query_param
+            )
+        return link
+
+    def get_paginated_response(self, data):
+        if self.legacy is not None:
+            return self.legacy.get_paginated_response(data)
+        return Response(
+            OrderedDict(
+                [
+                    ("count", self.page.total_estimate),
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return PageNumberPagination().get_paginated_response_schema(schema)
@@ -0,0 +1,392 @@
+"""
+Полнотекстовый поиск по публикациям.
+
+Два бэкенда с общим интерфейсом:
+
+* ``InvertedIndexBackend`` — собственный инвертированный индекс в таблице
+  ``SearchIndexEntry`` (SQLite и любые другие БД);
+* ``PostgresSearchBackend`` — нативный full-text Postgres (``to_tsvector`` +
+  GIN-индекс из миграции), таблица индекса не используется.
+
+Бэкенд выбирается по ``settings.NEWS_SEARCH_BACKEND`` или по вендору БД.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from collections import Counter
+from collections.abc import Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import (
+    Case,
+    Count,
+    F,
+    FloatField,
+    OuterRef,
+    QuerySet,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.utils.module_loading import import_string
+
+from .models import Post, SearchIndexEntry
+
+TITLE_WEIGHT = 3
+TEXT_WEIGHT = 1
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 8
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_CYRILLIC_RE = re.compile(r"[а-я]")
+
+STOP_WORDS = frozenset("""
+    и в во не что он на я с со как а то все она так его но да ты к у же вы за
+    бы по только ее мне было вот от меня еще нет о из ему теперь когда даже ну
+    ли если уже или ни быть был него до вас нибудь опять уж вам ведь там потом
+    себя ничего ей может они тут где есть надо ней для мы тебя их чем была сам
+    чтоб без будто чего раз тоже себе под будет ж тогда кто этот того потому
+    этого какой совсем ним здесь этом один почти мой тем чтобы нее были куда
+    зачем всех никогда можно при наконец два об другой хоть после над больше
+    тот через эти нас про всего них какая много разве три эту моя впрочем
+    хорошо свою этой перед иногда лучше чуть том нельзя такой им более всегда
+    конечно всю между это
+    a an and are as at be but by for from has have in is it its of on or that
+    the this to was were will with
+    """.split())
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Стемминг
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+_RU_VOWELS = "аеиоуыэюя"
+_RU_PERFECTIVE_GERUND = re.compile(
+    r"((?<=[ая])(в|вши|вшись)|(ив|ивши|ившись|ыв|ывши|ывшись))$"
+)
+_RU_REFLEXIVE = re.compile(r"(с[яь])$")
+_RU_ADJECTIVE = re.compile(
+    r"(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|ую|юю|ая|яя|ою|ею)$"
+)
+_RU_PARTICIPLE = re.compile(r"((?<=[ая])(ем|нн|вш|ющ|щ)|(ивш|ывш|ующ))$")
+_RU_VERB = re.compile(
+    r"((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)"
+    r"|(ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|ят"
+    r"|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю))$"
+)
+_RU_NOUN = re.compile(
+    r"(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|ам|ом"
+    r"|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$"
+)
+_RU_DERIVATIONAL = re.compile(r"(ост|ость)$")
+_RU_SUPERLATIVE = re.compile(r"(ейш|ейше)$")
+
+
+def _ru_regions(word: str) -> tuple[int, int]:
+    """Границы RV и R2 по правилам Snowball для русского языка."""
+    rv = len(word)
+    for i, ch in enumerate(word):
+        if ch in _RU_VOWELS:
+            rv = i + 1
+            break
+
+    def next_region(start: int) -> int:
+        for i in range(start + 1, len(word)):
+            if word[i] not in _RU_VOWELS and word[i - 1] in _RU_VOWELS:
+                return i + 1
+        return len(word)
+
+    r1 = next_region(0)
+    r2 = next_region(r1)
+    return rv, r2
+
+
+def stem_russian(word: str) -> str:
+    """Упрощённая реализация русского стеммера Snowball (Портер)."""
+    rv, r2 = _ru_regions(word)
+    head, tail = word[:rv], word[rv:]
+
+    # Шаг 1
+    stripped = _RU_PERFECTIVE_GERUND.sub("", tail, count=1)
+    if stripped == tail:
+        tail = _RU_REFLEXIVE.sub("", tail, count=1)
+        stripped = _RU_ADJECTIVE.sub("", tail, count=1)
+        if stripped != tail:
+            stripped = _RU_PARTICIPLE.sub("", stripped, count=1)
+        else:
+            stripped = _RU_VERB.sub("", tail, count=1)
+            if stripped == tail:
+                stripped = _RU_NOUN.sub("", tail, count=1)
+    tail = stripped
+
+    # Шаг 2
+    if tail.endswith("и"):
+        tail = tail[:-1]
+
+    # Шаг 3 — словообразовательные окончания только в R2
+    r2_offset = max(r2 - rv, 0)
+    if _RU_DERIVATIONAL.search(tail[r2_offset:]):
+        tail = _RU_DERIVATIONAL.sub("", tail, count=1)
+
+    # Шаг 4
+    if tail.endswith("нн"):
+        tail = tail[:-1]
+    else:
+        superlative = _RU_SUPERLATIVE.sub("", tail, count=1)
+        if superlative != tail:
+            tail = superlative[:-1] if superlative.endswith("нн") else superlative
+        elif tail.endswith("ь"):
+            tail = tail[:-1]
+
+    return head + tail
+
+
+_EN_SUFFIXES = (
+    ("ational", "ate"),
+    ("tional", "tion"),
+    ("ization", "ize"),
+    ("fulness", "ful"),
+    ("ousness", "ous"),
+    ("iveness", "ive"),
+    ("ements", ""),
+    ("ement", ""),
+    ("ments", ""),
+    ("ment", ""),
+    ("ingly", ""),
+    ("edly", ""),
+    ("ness", ""),
+    ("ings", ""),
+    ("ing", ""),
+    ("ies", "y"),
+    ("ied", "y"),
+    ("ers", ""),
+    ("er", ""),
+    ("ed", ""),
+    ("ly", ""),
+    ("es", ""),
+    ("s", ""),
+)
+
+
+def stem_english(word: str) -> str:
+    """Лёгкий суффиксный стеммер для английских слов (в духе Porter/Lovins)."""
+    if len(word) <= 3 or word.endswith("ss"):
+        return word
+    for suffix, replacement in _EN_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            stem = word[: -len(suffix)] + replacement
+            # running -> run, stopped -> stop
+            if (
+                not replacement
+                and suffix in ("ing", "ed", "er", "ers", "ings")
+                and len(stem) > 3
+                and stem[-1] == stem[-2]
+                and stem[-1] not in "lsz"
+            ):
+                stem = stem[:-1]
+            return stem
+    return word
+
+
+def stem(word: str) -> str:
+    if _CYRILLIC_RE.search(word):
+        return stem_russian(word)
+    if word.isascii():
+        return stem_english(word)
+    return word
+
+
+def tokenize(text: str) -> list[str]:
+    """Разбить текст на нормализованные основы слов (без стоп-слов)."""
+    terms = []
+    for raw in _TOKEN_RE.findall((text or "").lower().replace("ё", "е")):
+        if len(raw) < 2 or raw in STOP_WORDS or raw.isdigit() and len(raw) < 3:
+            continue
+        terms.append(stem(raw)[:MAX_TERM_LENGTH])
+    return terms
+
+
+def query_terms(query: str) -> list[str]:
+    """Уникальные термы поискового запроса в исходном порядке."""
+    return list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Бэкенды
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+class BaseSearchBackend:
+    """Общий интерфейс поискового бэкенда."""
+
+    def index_post(self, post: Post) -> None:
+        raise NotImplementedError
+
+    def index_posts(self, posts: Iterable[Post]) -> None:
+        """Проиндексировать пачку постов (массовая загрузка, news.bulk)."""
+        for post in posts:
+            self.index_post(post)
+
+    def rebuild(self, posts: Iterable[Post], batch_size: int = 1000) -> int:
+        raise NotImplementedError
+
+    def search(self, qs: QuerySet[Post], query: str) -> QuerySet[Post]:
+        """Отфильтровать ``qs`` по запросу и отсортировать по релевантности."""
+        raise NotImplementedError
+
+
+class InvertedIndexBackend(BaseSearchBackend):
+    """
+    Инвертированный индекс «терм → пост» с весами.
+
+    Вес терма в посте — ``3 * tf(title) + tf(text)``; при поиске умножается на
+    IDF терма. Все термы запроса обязательны (AND), как и у прежнего icontains.
+    """
+
+    DOC_COUNT_CACHE_KEY = "search:doc_count"
+    DOC_COUNT_TTL = 600
+
+    @staticmethod
+    def build_entries(post: Post) -> list[SearchIndexEntry]:
+        weights: Counter[str] = Counter()
+        for term in tokenize(post.title):
+            weights[term] += TITLE_WEIGHT
+        for term in tokenize(post.text):
+            weights[term] += TEXT_WEIGHT
+        return [
+            SearchIndexEntry(term=term, post_id=post.pk, weight=weight)
+            for term, weight in weights.items()
+        ]
+
+    def index_post(self, post: Post) -> None:
+        with transaction.atomic():
+            SearchIndexEntry.objects.filter(post_id=post.pk).delete()
+            SearchIndexEntry.objects.bulk_create(self.build_entries(post))
+
+    def index_posts(self, posts: Iterable[Post], batch_size: int = 1000) -> None:
+        posts = list(posts)
+        with transaction.atomic():
+            SearchIndexEntry.objects.filter(post_id__in=[p.pk for p in posts]).delete()
+            SearchIndexEntry.objects.bulk_create(
+                [entry for post in posts for entry in self.build_entries(post)],
+                batch_size=batch_size,
+            )
+
+    def rebuild(self, posts: Iterable[Post], batch_size: int = 1000) -> int:
+        SearchIndexEntry.objects.all().delete()
+        indexed = 0
+        buffer: list[SearchIndexEntry] = []
+        for post in posts:
+            buffer.extend(self.build_entries(post))
+            indexed += 1
+            if len(buffer) >= batch_size:
+                SearchIndexEntry.objects.bulk_create(buffer, batch_size=batch_size)
+                buffer = []
+        if buffer:
+            SearchIndexEntry.objects.bulk_create(buffer, batch_size=batch_size)
+        cache.delete(self.DOC_COUNT_CACHE_KEY)
+        return indexed
+
+    def _doc_count(self) -> int:
+        total = cache.get(self.DOC_COUNT_CACHE_KEY)
+        if total is None:
+            total = Post.objects.count()
+            cache.set(self.DOC_COUNT_CACHE_KEY, total, self.DOC_COUNT_TTL)
+        return total
+
+    def search(self, qs: QuerySet[Post], query: str) -> QuerySet[Post]:
+        terms = query_terms(query)
+        if not terms:
+            return qs.none()
+
+        doc_freq = dict(
+            SearchIndexEntry.objects.filter(term__in=terms)
+            .values_list("term")
+            .annotate(df=Count("post_id"))
+        )
+        if len(doc_freq) < len(terms):
+            # хотя бы один терм не встречается нигде — при AND результатов нет
+            return qs.none()
+
+        total = max(self._doc_count(), 1)
+        idf = Case(
+            *[
+                When(term=term, then=Value(math.log(1 + total / df)))
+                for term, df in doc_freq.items()
+            ],
+            output_field=FloatField(),
+        )
+        matches = (
+            SearchIndexEntry.objects.filter(term__in=terms)
+            .values("post_id")
+            .annotate(hits=Count("term"), score=Sum(F("weight") * idf))
+            .filter(hits=len(terms))
+        )
+        rank = matches.filter(post_id=OuterRef("pk")).values("score")[:1]
+        return (
+            qs.filter(pk__in=matches.values("post_id"))
+            .annotate(search_rank=Subquery(rank, output_field=FloatField()))
+            .order_by("-search_rank", "-created_at")
+        )
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    Нативный full-text поиск PostgreSQL.
+
+    Выражение ``to_tsvector`` совпадает с функциональным GIN-индексом из
+    миграции, поэтому отдельная таблица не нужна: индекс поддерживает сама БД.
+    Конфигурация ``russian`` стеммит кириллицу, а латиницу отдаёт ``english_stem``.
+    """
+
+    config = "russian"
+
+    def index_post(self, post: Post) -> None:
+        pass
+
+    def index_posts(self, posts: Iterable[Post]) -> None:
+        pass
+
+    def rebuild(self, posts: Iterable[Post], batch_size: int = 1000) -> int:
+        with connection.cursor() as cursor:
+            cursor.execute("REINDEX INDEX news_post_search_gin")
+        return Post.objects.count()
+
+    def vector(self):
+        from django.contrib.postgres.search import SearchVector
+
+        return SearchVector("title", "text", config=self.config)
+
+    def search(self, qs: QuerySet[Post], query: str) -> QuerySet[Post]:
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        if not query_terms(query):
+            return qs.none()
+        search_query = SearchQuery(query, config=self.config, search_type="plain")
+        vector = self.vector()
+        return (
+            qs.annotate(search_vector=vector)
+            .filter(search_vector=search_query)
+            .annotate(search_rank=SearchRank(vector, search_query))
+            .order_by("-search_rank", "-created_at")
+        )
+
+
+def get_search_backend() -> BaseSearchBackend:
+    backend_path = getattr(settings, "NEWS_SEARCH_BACKEND", None)
+    if backend_path:
+        return import_string(backend_path)()
+    if connection.vendor == "postgresql":
+        return PostgresSearchBackend()
+    return InvertedIndexBackend()
+
+
+def search_posts(qs: QuerySet[Post], query: str) -> QuerySet[Post]:
+    """Точка входа для вьюх: полнотекстовый поиск поверх готового queryset."""
+    return get_search_backend().search(qs, query)
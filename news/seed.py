@@ -0,0 +1,288 @@
+"""
+Синтетические данные для замеров (``seed_perf``, ``benchmark_suite``).
+
+Объёмы задаются ``SeedConfig``, распределения — с перекосом, как на живом
+портале: немногие авторы пишут большую часть постов, немногие категории
+собирают большую часть подписок и публикаций, обсуждения концентрируются
+на популярных постах (веса по закону Ципфа). Всё пишется пачками
+``bulk_create`` без сигналов; производные данные (поисковый индекс, рейтинги
+авторов, «в тренде», поколения кеша) обновляются один раз в конце.
+"""
+
+from __future__ import annotations
+
+import itertools
+import random
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+from . import cache as page_cache
+from . import trending
+from .models import Author, Category, Comment, Post, PostCategory, PostType
+from .search import get_search_backend
+
+User = get_user_model()
+
+BATCH_SIZE = 2000
+
+SYLLABLES = (
+    "но", "во", "сти", "ры", "нок", "эко", "но", "ми", "ка", "по", "ли", "ти",
+    "ка", "спорт", "матч", "го", "род", "на", "ука", "тех", "но", "ло", "гии",
+)  # fmt: skip
+
+
+@dataclass
+class SeedConfig:
+    users: int = 1000
+    authors: int = 50
+    categories: int = 20
+    posts: int = 5000
+    comments: int = 15000
+    subscriptions_per_user: int = 3
+    days: int = 90  # на сколько дней назад растянуть даты публикаций
+    skew: float = 1.1  # показатель Ципфа: 0 — равномерно, больше — круче
+    seed: int = 42
+    prefix: str = "perf"
+
+    @classmethod
+    def for_posts(cls, posts: int, **overrides) -> SeedConfig:
+        """Остальные объёмы — пропорционально числу постов."""
+        values = {
+            "users": max(10, posts // 5),
+            "authors": max(3, posts // 100),
+            "categories": max(3, int(posts**0.5) // 3),
+            "posts": posts,
+            "comments": posts * 3,
+        }
+        return cls(**{**values, **overrides})
+
+
+@dataclass
+class SeedReport:
+    counts: dict[str, int] = field(default_factory=dict)
+    timings: dict[str, float] = field(default_factory=dict)
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class _Zipf:
+    """Выбор элементов с весами 1 / rank**skew за O(log n)."""
+
+    def __init__(self, rng: random.Random, items: list, skew: float):
+        self.rng = rng
+        self.items = items
+        self.cum_weights = list(
+            itertools.accumulate(1 / (rank**skew) for rank in range(1, len(items) + 1))
+        )
+
+    def pick(self, k: int = 1) -> list:
+        return self.rng.choices(self.items, cum_weights=self.cum_weights, k=k)
+
+    def pick_distinct(self, k: int) -> list:
+        k = min(k, len(self.items))
+        chosen: dict = {}
+        while len(chosen) < k:
+            chosen.update(dict.fromkeys(self.pick(k - len(chosen))))
+        return list(chosen)
+
+
+class Seeder:
+    def __init__(self, config: SeedConfig, log=None):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.log = log or (lambda message: None)
+        self.report = SeedReport()
+        self.words = [
+            "".join(self.rng.choices(SYLLABLES, k=self.rng.randint(1, 4)))
+            for _ in range(2000)
+        ]
+        self.vocabulary = _Zipf(self.rng, self.words, 1.0)
+
+    def _phase(self, name: str, started: float, count: int) -> None:
+        self.report.counts[name] = count
+        self.report.timings[name] = round(time.monotonic() - started, 3)
+        self.log(f"  {name}: {count} за {self.report.timings[name]:.1f} с")
+
+    def _sentence(self, length: int) -> str:
+        return " ".join(self.vocabulary.pick(length)).capitalize()
+
+    def _text(self) -> str:
+        paragraphs = self.rng.randint(1, 6)
+        return "\n\n".join(
+            ". ".join(self._sentence(self.rng.randint(5, 15)) for _ in range(4)) + "."
+            for _ in range(paragraphs)
+        )
+
+    def _rating(self, scale: float) -> int:
+        # большинство около нуля, длинный хвост популярных
+        value = int(self.rng.paretovariate(1.5) * scale) - int(scale)
+        return value if self.rng.random() > 0.15 else -value
+
+    def _spread_dates(self, model, pks: list[int]) -> None:
+        """auto_now_add не даёт задать дату в bulk_create — правим UPDATE ... CASE."""
+        now = timezone.now()
+        span = self.config.days * 24 * 3600
+        for start in range(0, len(pks), 500):
+            batch = pks[start : start + 500]
+            dates = Case(
+                *(
+                    When(
+                        pk=pk,
+                        then=Value(now - timedelta(seconds=self.rng.randint(0, span))),
+                    )
+                    for pk in batch
+                ),
+                output_field=DateTimeField(),
+            )
+            model.objects.filter(pk__in=batch).update(created_at=dates)
+
+    def _users(self) -> list[int]:
+        started = time.monotonic()
+        prefix = self.config.prefix
+        offset = User.objects.filter(username__startswith=f"{prefix}_user_").count()
+        password = make_password(None)  # неиспользуемый пароль, хеш один на всех
+        users = [
+            User(
+                username=f"{prefix}_user_{offset + i}",
+                email=f"{prefix}_user_{offset + i}@example.com",
+                password=password,
+            )
+            for i in range(self.config.users)
+        ]
+        User.objects.bulk_create(users, batch_size=BATCH_SIZE)
+        self._phase("users", started, len(users))
+        return [user.pk for user in users]
+
+    def _authors(self, user_ids: list[int]) -> list[int]:
+        started = time.monotonic()
+        authors = [Author(user_id=pk) for pk in user_ids[: self.config.authors]]
+        Author.objects.bulk_create(authors, batch_size=BATCH_SIZE)
+        self._phase("authors", started, len(authors))
+        return [author.pk for author in authors]
+
+    def _categories(self) -> list[int]:
+        started = time.monotonic()
+        prefix = self.config.prefix
+        offset = Category.objects.filter(name__startswith=f"{prefix} ").count()
+        categories = [
+            Category(name=f"{prefix} {self._sentence(2).lower()} {offset + i}")
+            for i in range(self.config.categories)
+        ]
+        Category.objects.bulk_create(categories, batch_size=BATCH_SIZE)
+        self._phase("categories", started, len(categories))
+        return [category.pk for category in categories]
+
+    def _subscriptions(self, user_ids: list[int], categories: _Zipf) -> None:
+        started = time.monotonic()
+        Subscription = Category.subscribers.through
+        rows = []
+        mean = self.config.subscriptions_per_user
+        for user_id in user_ids:
+            k = min(int(self.rng.expovariate(1 / mean)) if mean else 0, 10)
+            rows += [
+                Subscription(user_id=user_id, category_id=category_id)
+                for category_id in categories.pick_distinct(k)
+            ]
+        Subscription.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        self._phase("subscriptions", started, len(rows))
+
+    def _posts(self, authors: _Zipf, categories: _Zipf) -> list[int]:
+        started = time.monotonic()
+        post_ids: list[int] = []
+        remaining = self.config.posts
+        while remaining > 0:
+            size = min(remaining, BATCH_SIZE)
+            posts = []
+            for _ in range(size):
+                post = Post(
+                    author_id=authors.pick()[0],
+                    type=PostType.NEWS if self.rng.random() < 0.3 else PostType.ARTICLE,
+                    title=self._sentence(self.rng.randint(3, 9)),
+                    text=self._text(),
+                    rating=self._rating(5),
+                )
+                post.refresh_derived_fields()
+                posts.append(post)
+            with transaction.atomic():
+                Post.objects.bulk_create(posts)
+                PostCategory.objects.bulk_create(
+                    [
+                        PostCategory(post_id=post.pk, category_id=category_id)
+                        for post in posts
+                        for category_id in categories.pick_distinct(
+                            self.rng.choice((1, 1, 1, 2, 2, 3))
+                        )
+                    ],
+                    batch_size=BATCH_SIZE,
+                )
+                self._spread_dates(Post, [post.pk for post in posts])
+            post_ids += [post.pk for post in posts]
+            remaining -= size
+        self._phase("posts", started, len(post_ids))
+        return post_ids
+
+    def _comments(self, post_ids: list[int], user_ids: list[int]) -> None:
+        started = time.monotonic()
+        # обсуждают в основном свежие посты: ранг по убыванию pk
+        posts = _Zipf(self.rng, post_ids[::-1], self.config.skew)
+        users = _Zipf(self.rng, user_ids, self.config.skew)
+        remaining = self.config.comments
+        while remaining > 0:
+            size = min(remaining, BATCH_SIZE)
+            comments = [
+                Comment(
+                    post_id=post_id,
+                    user_id=user_id,
+                    text=self._sentence(self.rng.randint(3, 20)),
+                    rating=self._rating(1),
+                )
+                for post_id, user_id in zip(
+                    posts.pick(size), users.pick(size), strict=True
+                )
+            ]
+            Comment.objects.bulk_create(comments)
+            remaining -= size
+        self._phase("comments", started, self.config.comments)
+
+    def _derived(
+        self, post_ids: list[int], author_ids: list[int], category_ids: list[int]
+    ) -> None:
+        started = time.monotonic()
+        backend = get_search_backend()
+        for start in range(0, len(post_ids), BATCH_SIZE):
+            chunk = Post.objects.filter(
+                pk__in=post_ids[start : start + BATCH_SIZE]
+            ).only("id", "title", "text")
+            backend.index_posts(chunk)
+        for start in range(0, len(author_ids), 500):
+            Author.objects.filter(pk__in=author_ids[start : start + 500]).update(
+                rating=Author.computed_rating()
+            )
+        Category.recount(category_ids)
+        trending.refresh()
+        page_cache.bump(page_cache.GLOBAL, page_cache.CATEGORIES)
+        self._phase("derived", started, len(post_ids))
+
+    def run(self) -> SeedReport:
+        config = self.config
+        user_ids = self._users()
+        author_ids = self._authors(user_ids)
+        category_ids = self._categories()
+        categories = _Zipf(self.rng, category_ids, config.skew)
+        self._subscriptions(user_ids, categories)
+        post_ids = self._posts(_Zipf(self.rng, author_ids, config.skew), categories)
+        self._comments(post_ids, user_ids)
+        self._derived(post_ids, author_ids, category_ids)
+        return self.report
+
+
+def seed(config: SeedConfig, log=None) -> SeedReport:
+    return Seeder(config, log=log).run()
@@ -1,17 +1,308 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+from django.conf import settings
 from rest_framework import serializers
 
-from .models import Post
+from .models import Author, Category, Post, PostCategory, PostType
+from .votes import pending_deltas, prefetch_pending_votes
+
+POST_FIELDS = (
+    "author",
+    "type",
+    "created_at",
+    "categories",
+    "title",
+    "text",
+    "rating",
+)
+EXPANDABLE = ("author", "categories")
+
+# колонки Post, без которых поле ответа не построить
+FIELD_COLUMNS = {
+    "author": ("author_id",),
+    "type": ("type",),
+    "created_at": ("created_at",),
+    "categories": (),
+    "title": ("title",),
+    "text": ("text",),
+    "rating": ("rating",),
+}
+AUTHOR_COLUMNS = ("author__id", "author__rating", "author__user__username")
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# ?fields= / ?exclude= / ?expand=
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+def _split(value: str | None) -> list[str]:
+    return [part.strip() for part in (value or "").split(",") if part.strip()]
+
+
+@dataclass(frozen=True)
+class FieldSelection:
+    """Какие поля поста отдавать и какие связи разворачивать в объекты."""
+
+    fields: tuple[str, ...] = POST_FIELDS
+    expand: frozenset[str] = frozenset()
+
+    @classmethod
+    def from_query(cls, params) -> FieldSelection:
+        fields, exclude = _split(params.get("fields")), _split(params.get("exclude"))
+        expand = _split(params.get("expand"))
+
+        errors = {}
+        for name, values, allowed in (
+            ("fields", fields, POST_FIELDS),
+            ("exclude", exclude, POST_FIELDS),
+            ("expand", expand, EXPANDABLE),
+        ):
+            unknown = sorted(set(values) - set(allowed))
+            if unknown:
+                errors[name] = [f"Неизвестные поля: {', '.join(unknown)}"]
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        selected = [
+            name
+            for name in POST_FIELDS
+            if (not fields or name in fields) and name not in exclude
+        ]
+        return cls(tuple(selected), frozenset(expand) & set(selected))
+
+    @property
+    def columns(self) -> list[str]:
+        columns = ["id"]
+        for name in self.fields:
+            columns += FIELD_COLUMNS[name]
+        if "author" in self.expand:
+            columns += AUTHOR_COLUMNS
+        return columns
+
+    def restrict(self, queryset):
+        """Убрать из SELECT невостребованные колонки, связи и prefetch."""
+        queryset = queryset.only(*self.columns)
+        if "author" not in self.expand:
+            queryset = queryset.select_related(None)
+        if "categories" not in self.fields:
+            queryset = queryset.prefetch_related(None)
+        return queryset
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Сериализаторы
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+class AuthorBriefSerializer(serializers.ModelSerializer):
+    username = serializers.CharField(source="user.username", read_only=True)
+
+    class Meta:
+        model = Author
+        fields = ["id", "username", "rating"]
+
+
+class CategoryBriefSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Category
+        fields = ["id", "name"]
+
+
+class PostListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, "all") else data)
+        prefetch_pending_votes(items)  # несброшенные голоса — одним get_many
+        return super().to_representation(items)
 
 
 class PostSerializer(serializers.ModelSerializer):
+    """
+    Пост. ``selection`` (FieldSelection) ограничивает набор полей и
+    разворачивает author/categories во вложенные объекты — только для чтения.
+    """
+
     class Meta:
         model = Post
-        fields = [
-            "author",
-            "type",
-            "created_at",
-            "categories",
-            "title",
-            "text",
-            "rating",
-        ]
+        list_serializer_class = PostListSerializer
+        fields = list(POST_FIELDS)
+
+    def __init__(self, *args, selection: FieldSelection | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if selection is None:
+            return
+        for name in set(self.fields) - set(selection.fields):
+            self.fields.pop(name)
+        if "author" in selection.expand:
+            self.fields["author"] = AuthorBriefSerializer(read_only=True)
+        if "categories" in selection.expand:
+            self.fields["categories"] = CategoryBriefSerializer(
+                many=True, read_only=True
+            )
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if "rating" in data:
+            data["rating"] = instance.live_rating
+        return data
+
+
+class PostValuesSerializer:
+    """
+    Быстрый read-only путь для списков: тот же JSON, что у PostSerializer,
+    но строки берутся из ``values()``, категории — одним запросом на страницу,
+    а словари собираются напрямую, без полей DRF на каждую строку.
+    """
+
+    def __init__(self, selection: FieldSelection | None = None):
+        self.selection = selection or FieldSelection()
+        # форматирование даты то же, что у ModelSerializer (таймзона, «Z»)
+        self.created_at = serializers.DateTimeField()
+
+    def get_queryset(self, queryset):
+        # created_at/id нужны курсору пагинации, даже если их нет в ответе
+        columns = dict.fromkeys([*self.selection.columns, "created_at"])
+        return queryset.select_related(None).prefetch_related(None).values(*columns)
+
+    def _categories(self, ids: Iterable[int]) -> dict[int, list]:
+        expand = "categories" in self.selection.expand
+        links = (
+            PostCategory.objects.filter(post_id__in=ids)
+            .order_by("post_id", "category_id")
+            .values_list(
+                "post_id", "category_id", *(["category__name"] if expand else [])
+            )
+        )
+        categories = defaultdict(list)
+        for post_id, category_id, *name in links:
+            categories[post_id].append(
+                {"id": category_id, "name": name[0]} if expand else category_id
+            )
+        return categories
+
+    def _author(self, row: dict):
+        if "author" not in self.selection.expand:
+            return row["author_id"]
+        if row["author_id"] is None:
+            return None
+        return {
+            "id": row["author__id"],
+            "username": row["author__user__username"],
+            "rating": row["author__rating"],
+        }
+
+    def to_representation(self, rows) -> list[dict]:
+        rows = list(rows)
+        ids = [row["id"] for row in rows]
+        fields = self.selection.fields
+
+        categories = self._categories(ids) if "categories" in fields else {}
+        pending = pending_deltas(Post, ids) if "rating" in fields else {}
+        format_datetime = self.created_at.to_representation
+        getters = {
+            "author": self._author,
+            "type": lambda row: row["type"],
+            "created_at": lambda row: format_datetime(row["created_at"]),
+            "categories": lambda row: categories.get(row["id"], []),
+            "title": lambda row: row["title"],
+            "text": lambda row: row["text"],
+            "rating": lambda row: row["rating"] + pending.get(row["id"], 0),
+        }
+        selected = [(name, getters[name]) for name in fields]
+        return [{name: get(row) for name, get in selected} for row in rows]
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Массовая загрузка (news.bulk)
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+def bulk_max_items() -> int:
+    return getattr(settings, "NEWS_BULK_MAX_ITEMS", 500)
+
+
+def _missing(model, pks: set[int]) -> list[int]:
+    found = set(model.objects.filter(pk__in=pks).values_list("pk", flat=True))
+    return sorted(pks - found)
+
+
+class PostBulkListSerializer(serializers.ListSerializer):
+    """Ссылки всей пачки проверяются тремя запросами, а не по запросу на поле."""
+
+    def validate(self, attrs):
+        ids = [item["id"] for item in attrs if "id" in item]
+        authors = {item["author"] for item in attrs if item.get("author") is not None}
+        categories = {pk for item in attrs for pk in item.get("categories", ())}
+
+        errors = {}
+        if len(ids) != len(set(ids)):
+            errors["id"] = ["Пост встречается в пачке несколько раз."]
+        for name, model, pks in (
+            ("id", Post, set(ids)),
+            ("author", Author, authors),
+            ("categories", Category, categories),
+        ):
+            missing = _missing(model, pks) if pks and name not in errors else []
+            if missing:
+                errors[name] = [f"Не найдены: {', '.join(map(str, missing))}"]
+        if errors:
+            raise serializers.ValidationError(errors)
+        return attrs
+
+
+class PostBulkSerializer(serializers.Serializer):
+    """
+    Элемент пачки: без ``id`` — новый пост, с ``id`` — обновление
+    (не переданные поля не меняются). Связи — просто pk.
+    """
+
+    id = serializers.IntegerField(required=False, min_value=1)
+    type = serializers.ChoiceField(choices=PostType.choices, required=False)
+    title = serializers.CharField(max_length=255, required=False)
+    text = serializers.CharField(required=False)
+    author = serializers.IntegerField(required=False, allow_null=True)
+    categories = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    class Meta:
+        list_serializer_class = PostBulkListSerializer
+
+    def validate(self, attrs):
+        if "id" not in attrs:
+            missing = [name for name in ("title", "text") if name not in attrs]
+            if missing:
+                raise serializers.ValidationError(
+                    {name: ["Обязательное поле."] for name in missing}
+                )
+        return attrs
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Подписки (news.subscriptions)
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+class SubscriptionChangeSerializer(serializers.Serializer):
+    """Списки pk категорий; существование проверяется одним запросом на всё."""
+
+    subscribe = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False, default=list
+    )
+    unsubscribe = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False, default=list
+    )
+
+    def validate(self, attrs):
+        ids = set(attrs["subscribe"]) | set(attrs["unsubscribe"])
+        if len(ids) > bulk_max_items():
+            raise serializers.ValidationError(
+                f"Не больше {bulk_max_items()} категорий за запрос."
+            )
+        missing = _missing(Category, ids) if ids else []
+        if missing:
+            raise serializers.ValidationError(
+                {"categories": [f"Не найдены: {', '.join(map(str, missing))}"]}
+            )
+        return attrs
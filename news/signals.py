@@ -1,31 +1,288 @@
 import logging
 
-from django.db.models.signals import post_delete, post_save
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_init,
+    post_save,
+    pre_delete,
+    pre_save,
+)
 from django.dispatch import receiver
 
-from .models import Post
-from .tasks import send_new_post_notifications
+from . import cache as page_cache
+from . import censor, subscriptions, trending
+from .models import Author, Category, CensoredWord, Comment, Post, PostCategory
+from .search import get_search_backend
+from .tasks import push_to_timelines, send_new_post_notifications
 
 logger = logging.getLogger(__name__)
 
+User = get_user_model()
+
+SEARCHABLE_FIELDS = frozenset({"title", "text"})
+
 
 @receiver(post_save, sender=Post)
 def on_post_saved(sender, instance: Post, created, **kwargs):
     # инвалидируем кеш карточки
-    cache_key = f"article_{instance.pk}"
-    from django.core.cache import cache
-
-    cache.delete(cache_key)
+    page_cache.delete_keys(f"article_{instance.pk}")
 
     if created:
         logger.debug("Планируем рассылку уведомлений для post_id=%s", instance.pk)
-        # асинхронно рассылаем (Celery)
-        send_new_post_notifications.delay(instance.pk)
+        # асинхронно рассылаем (Celery) — только после коммита транзакции,
+        # иначе воркер может не увидеть пост (ATOMIC_REQUESTS=True)
+        post_id = instance.pk
+        transaction.on_commit(lambda: send_new_post_notifications.delay(post_id))
+        transaction.on_commit(lambda: push_to_timelines.delay([post_id]))
+
+
+@receiver(post_save, sender=Post)
+def on_post_saved_update_search_index(sender, instance: Post, update_fields, **kwargs):
+    # лайки и прочие точечные апдейты текст не меняют — индекс не трогаем
+    if update_fields and not SEARCHABLE_FIELDS & set(update_fields):
+        return
+    get_search_backend().index_post(instance)
 
 
 @receiver(post_delete, sender=Post)
 def on_post_deleted(sender, instance: Post, **kwargs):
-    cache_key = f"article_{instance.pk}"
-    from django.core.cache import cache
+    page_cache.delete_keys(f"article_{instance.pk}")
+    # строки SearchIndexEntry удаляются каскадом вместе с постом
+
+
+# ── Инкрементальный рейтинг авторов ─────────────────────────────────────────────
+# Подписываемся по sender, а не на все модели: слушатель post_delete без sender
+# отключил бы fast-delete в каскадах для всего проекта.
+
+
+def _touches_rating(instance, update_fields) -> bool:
+    if not update_fields:
+        return True
+    names = {f.removesuffix("_id") for f in update_fields}
+    return bool(names & {f.removesuffix("_id") for f in instance.rating_state_fields})
+
+
+@receiver(post_init, sender=Post)
+@receiver(post_init, sender=Comment)
+def remember_rating_state(sender, instance, **kwargs):
+    instance.remember_rating_state()
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=Comment)
+@receiver(pre_delete, sender=Post)
+@receiver(pre_delete, sender=Comment)
+def ensure_rating_state(sender, instance, **kwargs):
+    if not instance._state.adding and instance._rating_state is None:
+        instance.load_rating_state()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+def apply_rating_change_on_save(
+    sender, instance, created, update_fields, raw, **kwargs
+):
+    if raw or not (created or _touches_rating(instance, update_fields)):
+        return
+    before = None if created else instance._rating_state
+    instance.remember_rating_state()
+    instance.apply_rating_change(before, instance._rating_state)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+def apply_rating_change_on_delete(sender, instance, **kwargs):
+    instance.apply_rating_change(instance._rating_state, None)
+
+
+# ── Поколения страничного кеша ──────────────────────────────────────────────────
+
+
+def _bump_post(post_id: int, category_ids=()) -> None:
+    page_cache.bump(
+        page_cache.GLOBAL,
+        page_cache.post_scope(post_id),
+        *(page_cache.category_scope(pk) for pk in category_ids),
+    )
+
+
+@receiver(post_save, sender=Post)
+def bump_generations_on_post_save(sender, instance: Post, created, **kwargs):
+    # у нового поста категорий ещё нет — их добавит m2m_changed ниже
+    category_ids = (
+        ()
+        if created
+        else instance.post_categories.values_list("category_id", flat=True)
+    )
+    _bump_post(instance.pk, category_ids)
+
+
+@receiver(pre_delete, sender=Post)
+def bump_generations_on_post_delete(sender, instance: Post, **kwargs):
+    # категории поста нужно прочитать до каскадного удаления связей;
+    # .all() берёт prefetch_related("post_categories"), если он был
+    _bump_post(instance.pk, [pc.category_id for pc in instance.post_categories.all()])
+
+
+@receiver(m2m_changed, sender=Post.categories.through)
+def bump_generations_on_post_categories(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if reverse:
+        # category.posts.add(...): instance — категория, pk_set — посты
+        page_cache.bump(
+            page_cache.GLOBAL,
+            page_cache.category_scope(instance.pk),
+            *(page_cache.post_scope(pk) for pk in pk_set or ()),
+        )
+        return
+    if action == "pre_clear":
+        pk_set = instance.post_categories.values_list("category_id", flat=True)
+    _bump_post(instance.pk, pk_set or ())
+
+
+@receiver(post_save, sender=PostCategory)
+@receiver(post_delete, sender=PostCategory)
+def bump_generations_on_post_category_row(sender, instance: PostCategory, **kwargs):
+    _bump_post(instance.post_id, [instance.category_id])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_generations_on_category(sender, instance: Category, **kwargs):
+    page_cache.bump(page_cache.CATEGORIES, page_cache.category_scope(instance.pk))
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def bump_generations_on_author(sender, **kwargs):
+    page_cache.bump(page_cache.AUTHORS)
+
+
+@receiver(post_save, sender=User)
+def bump_generations_on_user(sender, instance, created, update_fields, **kwargs):
+    # у нового пользователя ещё нет постов; вход сохраняет только last_login
+    if created or (update_fields is not None and "username" not in update_fields):
+        return
+    page_cache.bump(page_cache.AUTHORS)
+
+
+@receiver(m2m_changed, sender=Category.subscribers.through)
+def bump_generations_on_subscribers(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        category_ids = [instance.pk]
+    elif action == "pre_clear":
+        # user.subscribed_categories.clear(): затронуты все текущие подписки
+        category_ids = instance.subscribed_categories.values_list("pk", flat=True)
+    else:
+        category_ids = pk_set
+    page_cache.bump(
+        page_cache.CATEGORIES,
+        *(page_cache.category_scope(pk) for pk in category_ids),
+    )
+
+
+# ── Счётчики категорий ──────────────────────────────────────────────────────────
+# post_add получает только реально вставленные pk; remove/clear передают то, что
+# просили удалить, поэтому фактические строки читаем до удаления (pre_*).
+
+Subscription = Category.subscribers.through
+
+
+@receiver(m2m_changed, sender=Subscription)
+def count_subscribers(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "post_add":
+        deltas = dict.fromkeys(pk_set, 1) if reverse else {instance.pk: len(pk_set)}
+    elif action in ("pre_remove", "pre_clear") and reverse:
+        # user.subscribed_categories.remove(...)/clear()
+        rows = sender.objects.filter(user_id=instance.pk)
+        if action == "pre_remove":
+            rows = rows.filter(category_id__in=pk_set)
+        deltas = dict.fromkeys(rows.values_list("category_id", flat=True), -1)
+    elif action in ("pre_remove", "pre_clear"):
+        rows = sender.objects.filter(category_id=instance.pk)
+        if action == "pre_remove":
+            rows = rows.filter(user_id__in=pk_set)
+        deltas = {instance.pk: -rows.count()}
+    else:
+        return
+    Category.apply_count_deltas("subscriber_count", deltas)
+
+
+@receiver(m2m_changed, sender=Subscription)
+def invalidate_subscription_sets(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and not reverse:
+        # category.subscribers.clear(): затронуты все подписчики категории
+        subscriptions.invalidate(
+            sender.objects.filter(category_id=instance.pk).values_list(
+                "user_id", flat=True
+            )
+        )
+    elif action in ("post_add", "post_remove", "post_clear"):
+        if reverse:
+            subscriptions.invalidate([instance.pk])
+        elif pk_set:
+            subscriptions.invalidate(pk_set)
+
+
+@receiver(pre_delete, sender=User)
+def count_subscribers_on_user_delete(sender, instance, **kwargs):
+    # строки подписок удалятся каскадом без сигналов m2m_changed
+    category_ids = Subscription.objects.filter(user_id=instance.pk).values_list(
+        "category_id", flat=True
+    )
+    Category.apply_count_deltas("subscriber_count", dict.fromkeys(category_ids, -1))
+
+
+@receiver(m2m_changed, sender=Post.categories.through)
+def count_posts_added(sender, instance, action, reverse, pk_set, **kwargs):
+    # удаление связей (remove/clear/каскад) идёт через post_delete PostCategory
+    if action != "post_add":
+        return
+    deltas = {instance.pk: len(pk_set)} if reverse else dict.fromkeys(pk_set, 1)
+    Category.apply_count_deltas("post_count", deltas)
+
+
+@receiver(post_save, sender=PostCategory)
+def count_post_category_created(sender, instance: PostCategory, created, **kwargs):
+    if created:
+        Category.apply_count_deltas("post_count", {instance.category_id: 1})
+
+
+@receiver(post_delete, sender=PostCategory)
+def count_post_category_deleted(sender, instance: PostCategory, **kwargs):
+    Category.apply_count_deltas("post_count", {instance.category_id: -1})
+
+
+# ── «В тренде» ──────────────────────────────────────────────────────────────────
+
+
+@receiver(post_save, sender=Comment)
+def count_comment_in_trending(sender, instance: Comment, created, **kwargs):
+    # голоса учитывает Post._vote; откатившийся комментарий очков не даёт
+    if created:
+        post_id = instance.post_id
+        transaction.on_commit(lambda: trending.record_comment(post_id))
+
+
+# ── Словарь цензора ─────────────────────────────────────────────────────────────
+
 
-    cache.delete(cache_key)
+@receiver(post_save, sender=CensoredWord)
+@receiver(post_delete, sender=CensoredWord)
+def invalidate_censor(sender, **kwargs):
+    # и после коммита: процесс мог пересобрать движок по старому словарю;
+    # при NEWS_CENSOR_ON_SAVE сохранённые поля обновляет команда recensor_posts
+    censor.invalidate()
+    transaction.on_commit(censor.invalidate)
+    # ленты и поиск цензурят при выводе, но отдаются из страничного кеша
+    page_cache.bump(page_cache.GLOBAL, page_cache.CENSOR)
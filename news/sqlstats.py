@@ -0,0 +1,206 @@
+"""
+SQL-статистика запроса/задачи и детектор N+1.
+
+``QueryRecorder`` подключается через ``connection.execute_wrapper`` — это
+работает и без DEBUG, а на каждый SQL добавляет только замер времени и
+обновление словаря. Отпечаток запроса — сам текст SQL: параметры Django
+передаёт отдельно, так что ``WHERE id = %s`` для разных id — один отпечаток.
+Одинаковый отпечаток ``NEWS_SQL_STATS_NPLUSONE_THRESHOLD`` и более раз за
+запрос — вероятный N+1.
+
+Включается настройкой ``NEWS_SQL_STATS``; ``NEWS_SQL_STATS_SAMPLE_RATE``
+задаёт долю замеряемых запросов/задач, чтобы держать его включённым в
+продакшене. Итог уходит в заголовки ответа (``X-DB-*``, ``Server-Timing``)
+и в лог ``news.sqlstats`` (поле ``sql_stats`` в extra).
+"""
+
+from __future__ import annotations
+
+import heapq
+import logging
+import random
+import time
+from contextlib import ExitStack
+from dataclasses import asdict, dataclass, field
+
+from celery.signals import task_postrun, task_prerun
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+SQL_PREVIEW_LENGTH = 300
+
+
+def enabled() -> bool:
+    return getattr(settings, "NEWS_SQL_STATS", False)
+
+
+def sample_rate() -> float:
+    return getattr(settings, "NEWS_SQL_STATS_SAMPLE_RATE", 1.0)
+
+
+def n_plus_one_threshold() -> int:
+    return getattr(settings, "NEWS_SQL_STATS_NPLUSONE_THRESHOLD", 5)
+
+
+def slowest_count() -> int:
+    return getattr(settings, "NEWS_SQL_STATS_SLOWEST", 3)
+
+
+def _sampled() -> bool:
+    rate = sample_rate()
+    return rate >= 1 or random.random() < rate
+
+
+@dataclass
+class QueryStats:
+    queries: int = 0
+    db_ms: float = 0.0
+    # [(отпечаток, повторов, мс)] — только отпечатки не реже порога
+    duplicates: list[tuple[str, int, float]] = field(default_factory=list)
+    slowest: list[tuple[float, str]] = field(default_factory=list)
+
+    @property
+    def n_plus_one(self) -> bool:
+        return bool(self.duplicates)
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), "n_plus_one": self.n_plus_one}
+
+
+class QueryRecorder:
+    """``execute_wrapper``: считает запросы, время и повторы отпечатков."""
+
+    def __init__(self, slowest: int | None = None):
+        self.count = 0
+        self.total = 0.0
+        self.fingerprints: dict[str, list] = {}  # sql → [повторов, секунд]
+        self.keep = slowest_count() if slowest is None else slowest
+        self._slowest: list[tuple[float, str]] = []  # min-куча
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.total += elapsed
+            entry = self.fingerprints.get(sql)
+            if entry is None:
+                self.fingerprints[sql] = [1, elapsed]
+            else:
+                entry[0] += 1
+                entry[1] += elapsed
+            if self.keep:
+                item = (elapsed, sql)
+                if len(self._slowest) < self.keep:
+                    heapq.heappush(self._slowest, item)
+                elif item > self._slowest[0]:
+                    heapq.heapreplace(self._slowest, item)
+
+    def record(self) -> ExitStack:
+        """Подключиться ко всем БД; обёртки снимаются при закрытии стека."""
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
+
+    def stats(self, threshold: int | None = None) -> QueryStats:
+        threshold = n_plus_one_threshold() if threshold is None else threshold
+        duplicates = sorted(
+            (
+                (sql[:SQL_PREVIEW_LENGTH], n, round(seconds * 1000, 2))
+                for sql, (n, seconds) in self.fingerprints.items()
+                if n >= threshold
+            ),
+            key=lambda item: -item[1],
+        )
+        return QueryStats(
+            queries=self.count,
+            db_ms=round(self.total * 1000, 2),
+            duplicates=duplicates,
+            slowest=[
+                (round(seconds * 1000, 2), sql[:SQL_PREVIEW_LENGTH])
+                for seconds, sql in sorted(self._slowest, reverse=True)
+            ],
+        )
+
+
+def _log(kind: str, name: str, stats: QueryStats) -> None:
+    level = logging.WARNING if stats.n_plus_one else logging.INFO
+    if not logger.isEnabledFor(level):
+        return
+    message = "%s %s: %s SQL, %.1f мс"
+    args: tuple = (kind, name, stats.queries, stats.db_ms)
+    if stats.n_plus_one:
+        sql, repeats, _ms = stats.duplicates[0]
+        message += "; вероятный N+1 (%s раз): %s"
+        args += (repeats, sql)
+    logger.log(
+        level, message, *args, extra={"sql_stats": {kind: name, **stats.as_dict()}}
+    )
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Middleware
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+class SQLStatsMiddleware:
+    """
+    Заголовки ``X-DB-Queries``, ``X-DB-Time-Ms``, ``X-DB-Max-Repeats`` и
+    ``Server-Timing: db`` плюс запись в лог. Текст SQL в заголовки не попадает.
+    """
+
+    def __init__(self, get_response):
+        if not enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not _sampled():
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.get_response(request)
+        stats = recorder.stats()
+
+        max_repeats = max((n for n, _ in recorder.fingerprints.values()), default=0)
+        response.headers["X-DB-Queries"] = str(stats.queries)
+        response.headers["X-DB-Time-Ms"] = f"{stats.db_ms:.2f}"
+        response.headers["X-DB-Max-Repeats"] = str(max_repeats)
+        timing = f"db;dur={stats.db_ms:.2f}"
+        if response.has_header("Server-Timing"):
+            timing = f"{response['Server-Timing']}, {timing}"
+        response.headers["Server-Timing"] = timing
+        _log("request", f"{request.method} {request.path}", stats)
+        return response
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Celery
+# ────────────────────────────────────────────────────────────────────────────────
+
+_task_recorders: dict[str, tuple[QueryRecorder, ExitStack]] = {}
+
+
+@task_prerun.connect
+def start_task_recording(task_id=None, task=None, **kwargs):
+    if not enabled() or not _sampled():
+        return
+    recorder = QueryRecorder()
+    _task_recorders[task_id] = (recorder, recorder.record())
+
+
+@task_postrun.connect
+def finish_task_recording(task_id=None, task=None, **kwargs):
+    entry = _task_recorders.pop(task_id, None)
+    if entry is None:
+        return
+    recorder, stack = entry
+    stack.close()
+    _log("task", task.name, recorder.stats())
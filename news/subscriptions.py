@@ -0,0 +1,71 @@
+"""
+Кешированный набор подписок пользователя.
+
+``subscribed_category_ids(user)`` — frozenset id категорий, на которые
+подписан пользователь: один запрос при промахе, дальше из кеша (и из
+атрибута запроса в пределах одного запроса). Ключ сбрасывается сигналом
+``m2m_changed`` на ``Category.subscribers`` (news.signals); удаление самой
+категории ключи не трогает — лишний id несуществующей категории безвреден.
+
+``change_subscriptions()`` меняет много подписок разом через
+``user.subscribed_categories`` — одна вставка/одно удаление, сигналы
+(счётчики, поколения кеша, этот кеш) срабатывают один раз на пачку.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+
+from django.core.cache import cache
+from django.db import transaction
+
+from . import cache as page_cache
+
+SUBSCRIPTIONS_TIMEOUT = 24 * 3600
+REQUEST_ATTR = "_subscribed_category_ids"
+
+
+def _key(user_id: int) -> str:
+    return f"subs:{user_id}"
+
+
+def subscribed_category_ids(user) -> frozenset[int]:
+    if not user.is_authenticated:
+        return frozenset()
+    key = _key(user.pk)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(user.subscribed_categories.values_list("pk", flat=True))
+        cache.set(key, ids, SUBSCRIPTIONS_TIMEOUT)
+    return ids
+
+
+def for_request(request) -> frozenset[int]:
+    """То же, но не чаще одного обращения к кешу за запрос."""
+    ids = getattr(request, REQUEST_ATTR, None)
+    if ids is None:
+        ids = subscribed_category_ids(request.user)
+        setattr(request, REQUEST_ATTR, ids)
+    return ids
+
+
+def invalidate(user_ids: Iterable[int]) -> None:
+    keys = [_key(pk) for pk in user_ids]
+    if not keys:
+        return
+    # delete_keys повторит удаление после коммита: параллельный запрос мог
+    # успеть закешировать набор, прочитанный до фиксации транзакции
+    page_cache.delete_keys(*keys)
+
+
+def change_subscriptions(
+    user, subscribe: Iterable[int] = (), unsubscribe: Iterable[int] = ()
+) -> None:
+    """Подписать/отписать ``user`` на множество категорий (pk должны существовать)."""
+    subscribe = set(subscribe)
+    unsubscribe = set(unsubscribe) - subscribe
+    with page_cache.coalesced(), transaction.atomic():
+        if subscribe:
+            user.subscribed_categories.add(*subscribe)
+        if unsubscribe:
+            user.subscribed_categories.remove(*unsubscribe)
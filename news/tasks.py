@@ -1,112 +1,222 @@
 from __future__ import annotations
 
-from datetime import timedelta
+import logging
+from collections import defaultdict
 
 from celery import shared_task
 from django.conf import settings
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.urls import reverse
-from django.utils import timezone
 
-from .models import Category, Post
+from .digest import WeeklyDigestBuilder
+from .emails import FragmentCache
+from .models import Category, Post, PostCategory
+from .timeline import push_posts, trim_timelines
+from .trending import refresh as refresh_trending
+from .votes import flush_votes
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+# ── Уведомления о новых постах ──────────────────────────────────────────────────
+
+
+def _notification_chunk_size() -> int:
+    return getattr(settings, "NEWS_NOTIFICATION_CHUNK_SIZE", 500)
+
+
+def _deliver_new_post(post: Post, recipients: list[tuple[User, Category]]) -> int:
+    """
+    Разослать письма о ``post`` получателям ``(user, category)`` одной пачкой.
+
+    HTML рендерится один раз на категорию (имя пользователя вклеивается во
+    фрагмент), все письма уходят через одно SMTP-соединение.
+    """
+    post_url = settings.SITE_URL + reverse("news:news_detail", args=[post.pk])
+    fragments = FragmentCache()
+    messages = []
+
+    for user, category in recipients:
+        html = fragments.get(
+            category.pk if category else None,
+            "email/new_post_email.html",
+            {"post": post, "post_url": post_url, "category": category},
+            personal=("user.username",),
+        )
+        category_name = category.name if category else "Новости"
+
+        message = EmailMultiAlternatives(
+            subject=f"Новая публикация в категории {category_name}",
+            body=(
+                f"Здравствуйте, {user.username}!\n\n"
+                f'Новая публикация: "{post.title}".\n'
+                f"Читать: {post_url}\n\n"
+                "С уважением, команда NewsPortal"
+            ),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[user.email],
+        )
+        message.attach_alternative(
+            html.fill({"user.username": user.username}), "text/html"
+        )
+        messages.append(message)
+
+    if not messages:
+        return 0
+    with get_connection() as connection:
+        return connection.send_messages(messages) or 0
 
 
 @shared_task
 def send_new_post_notification_email(post_id: int, user_id: int) -> None:
     """
     Отправить письмо подписчику о новой статье (одному пользователю).
-    Запускается пачкой для всех подписчиков.
+    Для массовой рассылки используется send_new_post_notifications.
     """
-    from django.contrib.auth import get_user_model
-
-    User = get_user_model()
-
     try:
         post = Post.objects.get(pk=post_id)
         user = User.objects.get(pk=user_id)
     except (Post.DoesNotExist, User.DoesNotExist):
         return
 
-    post_url = settings.SITE_URL + reverse("news:news_detail", args=[post.pk])
-    category = post.categories.first()
-
-    subject = f"Новая публикация в категории {category.name if category else 'Новости'}"
-
-    context = {
-        "user": user,
-        "post": post,
-        "post_url": post_url,
-        "category": category,
-    }
-
-    html_message = render_to_string("email/new_post_email.html", context)
-    plain_message = (
-        f"Здравствуйте, {user.username}!\n\n"
-        f'Новая публикация: "{post.title}".\n'
-        f"Читать: {post_url}\n\n"
-        "С уважением, команда NewsPortal"
+    category = (
+        post.categories.filter(subscribers=user).order_by("pk").first()
+        or post.categories.order_by("pk").first()
     )
+    _deliver_new_post(post, [(user, category)])
+
+
+def _fan_out_new_posts(post_ids: list[int]) -> int:
+    """
+    Разложить подписчиков категорий ``post_ids`` по задачам-пачкам.
 
-    send_mail(
-        subject,
-        plain_message,
-        settings.DEFAULT_FROM_EMAIL,
-        [user.email],
-        fail_silently=False,
-        html_message=html_message,
+    Подписчики выбираются одним запросом на все посты; пользователь,
+    подписанный на несколько категорий поста, получает письмо о нём один раз —
+    с первой категорией. Возвращает число поставленных в очередь пачек.
+    """
+    posts_by_category: dict[int, list[int]] = defaultdict(list)
+    links = (
+        PostCategory.objects.filter(post_id__in=post_ids)
+        .order_by("post_id", "category_id")
+        .values_list("post_id", "category_id")
+    )
+    for post_id, category_id in links:
+        posts_by_category[category_id].append(post_id)
+
+    subscriptions = (
+        Category.subscribers.through.objects.filter(category_id__in=posts_by_category)
+        .exclude(user__email="")
+        .order_by("user_id", "category_id")
+        .values_list("user_id", "category_id")
     )
 
+    chunk_size = _notification_chunk_size()
+    pending: dict[int, list[tuple[int, int]]] = defaultdict(list)
+    chunks = 0
+    last_user_id = None
+    notified: set[int] = set()  # посты, о которых текущий пользователь уже узнает
+    for user_id, category_id in subscriptions.iterator(chunk_size=2000):
+        if user_id != last_user_id:
+            last_user_id, notified = user_id, set()
+        for post_id in posts_by_category[category_id]:
+            if post_id in notified:
+                continue
+            notified.add(post_id)
+            chunk = pending[post_id]
+            chunk.append((user_id, category_id))
+            if len(chunk) >= chunk_size:
+                send_new_post_notification_batch.delay(post_id, chunk)
+                chunks += 1
+                pending[post_id] = []
+    for post_id, chunk in pending.items():
+        if chunk:
+            send_new_post_notification_batch.delay(post_id, chunk)
+            chunks += 1
+    return chunks
+
 
 @shared_task
-def send_weekly_digest() -> None:
+def send_new_post_notifications(post_id: int) -> int:
     """
-    Еженедельный дайджест по всем категориям.
-    Выбирает посты за последние 7 дней и шлёт подписчикам.
+    Fan-out уведомлений о новом посте: подписчики всех его категорий
+    раскладываются по задачам-пачкам фиксированного размера.
+    Возвращает число поставленных в очередь пачек.
     """
-    now = timezone.now()
-    week_ago = now - timedelta(days=7)
+    chunks = _fan_out_new_posts([post_id])
+    logger.info("post_id=%s: уведомления разбиты на %s пачек", post_id, chunks)
+    return chunks
+
 
-    recent_posts = (
-        Post.objects.filter(created_at__gte=week_ago)
-        .select_related("author__user")
-        .prefetch_related("categories")
+@shared_task
+def send_bulk_post_notifications(post_ids: list[int]) -> int:
+    """Один fan-out на пачку постов из массовой загрузки (news.bulk)."""
+    chunks = _fan_out_new_posts(post_ids)
+    logger.info("%s постов: уведомления разбиты на %s пачек", len(post_ids), chunks)
+    return chunks
+
+
+@shared_task
+def send_new_post_notification_batch(
+    post_id: int, recipients: list[tuple[int, int]]
+) -> int:
+    """Отправить одну пачку уведомлений: ``recipients`` — пары (user_id, category_id)."""
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None:
+        return 0
+
+    users = User.objects.only("id", "username", "email").in_bulk(
+        [user_id for user_id, _ in recipients]
+    )
+    categories = Category.objects.only("id", "name").in_bulk(
+        {category_id for _, category_id in recipients}
     )
+    resolved = [
+        (users[user_id], categories.get(category_id))
+        for user_id, category_id in recipients
+        if user_id in users and users[user_id].email
+    ]
+    return _deliver_new_post(post, resolved)
 
-    if not recent_posts.exists():
-        return
 
-    # Для простоты: идём по категориям, шлём подписчикам
-    for category in Category.objects.prefetch_related("subscribers").all():
-        posts_in_cat = recent_posts.filter(categories=category)
-        if not posts_in_cat.exists():
-            continue
+@shared_task
+def send_weekly_digest() -> dict:
+    """
+    Еженедельный дайджест: одно письмо на подписчика по всем его категориям.
+    Возвращает отчёт: сколько пользователей/писем и время каждой фазы.
+    """
+    return WeeklyDigestBuilder().run().as_dict()
 
-        subscribers = category.subscribers.all()
-        if not subscribers:
-            continue
 
-        for user in subscribers:
-            if not user.email:
-                continue
+@shared_task
+def flush_vote_buffer() -> dict:
+    """Сбросить накопленные лайки/дизлайки в БД пачечными UPDATE."""
+    return flush_votes()
 
-            post_lines = []
-            for post in posts_in_cat:
-                url = settings.SITE_URL + reverse("news:news_detail", args=[post.pk])
-                post_lines.append(f"- {post.title} — {url}")
 
-            subject = f"Дайджест недели по категории {category.name}"
-            body = (
-                f"Здравствуйте, {user.username}!\n\n"
-                f"Новые публикации в категории «{category.name}» за неделю:\n\n"
-                + "\n".join(post_lines)
-                + "\n\nС уважением, NewsPortal"
-            )
-
-            send_mail(
-                subject,
-                body,
-                settings.DEFAULT_FROM_EMAIL,
-                [user.email],
-                fail_silently=False,
-            )
+# ── Персональные ленты ──────────────────────────────────────────────────────────
+
+
+@shared_task
+def push_to_timelines(post_ids: list[int]) -> int:
+    """Разложить новые посты по лентам подписчиков (news.timeline)."""
+    pushed = push_posts(post_ids)
+    logger.info("%s постов: %s записей в персональных лентах", len(post_ids), pushed)
+    return pushed
+
+
+@shared_task
+def trim_timeline_entries() -> int:
+    """Оставить каждому пользователю NEWS_TIMELINE_MAX_ENTRIES записей ленты."""
+    return trim_timelines()
+
+
+# ── «В тренде» ──────────────────────────────────────────────────────────────────
+
+
+@shared_task
+def refresh_trending_scores() -> int:
+    """Пересчитать снимок рейтинга «в тренде» (news.trending)."""
+    return refresh_trending()
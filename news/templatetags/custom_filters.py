@@ -1,32 +1,13 @@
-import re
-
 from django import template
 
+from news.censor import censor_text
+
 register = template.Library()
 
 
-@register.filter(name="censor")
+@register.filter(name="censor", is_safe=True)
 def censor(value):
-    unwanted_words = [
-        "плохое_слово1",
-        "плохое_слово2",
-        "редиска",
-        "овощ",
-        "дурак",
-        "дурашка",
-        "какашка",
-    ]  # Добавьте свои нежелательные слова
-
-    def replace_word(match):
-        word = match.group()
-        return "*" * len(word)
-
-    # Создаем регулярное выражение, игнорирующее регистр
-    pattern = re.compile(
-        r"\b(" + "|".join(re.escape(word) for word in unwanted_words) + r")\b",
-        flags=re.IGNORECASE,
-    )
-
-    # Заменяем найденные слова на звёздочки
-    censored_value = pattern.sub(replace_word, value)
-    return censored_value
+    """Заменяет слова из словаря цензора звёздочками (см. news.censor)."""
+    if not isinstance(value, str):
+        return value
+    return censor_text(value)
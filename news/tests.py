@@ -0,0 +1,1325 @@
+import json
+import os
+import re
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import has_vary_header
+from django.utils.safestring import mark_safe
+
+from news import cache as page_cache
+from news import metrics, subscriptions, trending, votes
+from news.benchmarks import eager_celery
+from news.bulk import bulk_save_posts
+from news.censor import CensorEngine
+from news.censor import invalidate as invalidate_censor
+from news.checks import check_vote_buffer
+from news.digest import WeeklyDigestBuilder
+from news.emails import Fragment
+from news.models import (
+    Author,
+    Category,
+    CensoredWord,
+    Comment,
+    Post,
+    SearchIndexEntry,
+    TimelineEntry,
+    TrendingScore,
+)
+from news.pagination import paginate_keyset
+from news.search import query_terms, search_posts, stem_english, stem_russian
+from news.seed import SeedConfig, seed
+from news.serializers import PostSerializer, PostValuesSerializer
+from news.sqlstats import QueryRecorder
+from news.subscriptions import subscribed_category_ids
+from news.tasks import (
+    push_to_timelines,
+    send_bulk_post_notifications,
+    send_new_post_notification_batch,
+    send_new_post_notifications,
+)
+from news.templatetags.custom_filters import censor as censor_filter
+from news.timeline import push_posts, timeline_page, trim_timelines
+from news.votes import flush_votes
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username="writer")
+        self.author = self.user.author
+
+    def _post(self, title: str, text: str) -> Post:
+        return Post.objects.create(author=self.author, title=title, text=text)
+
+    def test_stemming_ru_en(self) -> None:
+        """Словоформы сводятся к одной основе."""
+        self.assertEqual(stem_russian("новости"), stem_russian("новостями"))
+        self.assertEqual(stem_russian("выборы"), stem_russian("выборов"))
+        self.assertEqual(stem_english("running"), stem_english("run"))
+        self.assertEqual(stem_english("markets"), stem_english("market"))
+
+    def test_index_maintained_on_save(self) -> None:
+        """Индекс обновляется при сохранении поста и удаляется вместе с ним."""
+        post = self._post("Выборы", "Итоги голосования")
+        self.assertTrue(post.search_entries.filter(term__in=query_terms("выборов")))
+
+        post.title = "Футбол"
+        post.save()
+        self.assertFalse(post.search_entries.filter(term__in=query_terms("выборы")))
+
+        post.delete()
+        self.assertFalse(SearchIndexEntry.objects.exists())
+
+    def test_search_ranks_title_matches_higher(self) -> None:
+        """Все термы обязательны; совпадение в заголовке важнее, чем в тексте."""
+        in_text = self._post("Погода", "Рынки и экономика")
+        in_title = self._post("Экономика", "Рынки растут")
+        self._post("Экономика", "Про спорт")
+
+        found = list(search_posts(Post.objects.all(), "экономики рынка"))
+
+        self.assertEqual(found, [in_title, in_text])
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self) -> None:
+        author = User.objects.create_user(username="writer").author
+        self.posts = [
+            Post.objects.create(author=author, title=f"Пост {i}", text="текст")
+            for i in range(7)
+        ]
+        self.expected = sorted(
+            self.posts, key=lambda p: (p.created_at, p.pk), reverse=True
+        )
+
+    def test_walk_forward_and_back(self) -> None:
+        """Курсоры next/previous обходят ленту без пропусков и повторов."""
+        qs = Post.objects.all()
+        first = paginate_keyset(qs, None, 3)
+        second = paginate_keyset(qs, first.next_cursor, 3)
+        third = paginate_keyset(qs, second.next_cursor, 3)
+
+        self.assertEqual(list(first) + list(second) + list(third), self.expected)
+        self.assertFalse(first.has_previous)
+        self.assertFalse(third.has_next)
+
+        back = paginate_keyset(qs, third.previous_cursor, 3)
+        self.assertEqual(list(back), list(second))
+        self.assertTrue(back.has_previous)
+
+    def test_tampered_cursor_falls_back_to_first_page(self) -> None:
+        page = paginate_keyset(Post.objects.all(), "garbage", 3)
+        self.assertEqual(list(page), self.expected[:3])
+
+    def test_api_cursor_pagination(self) -> None:
+        """API отдаёт прежний формат ответа, но next — это курсор."""
+        url = "/api/posts/"
+        response = self.client.get(url, {"page_size": 4})
+        data = response.json()
+
+        self.assertEqual(data["count"], 7)
+        self.assertIn("cursor=", data["next"])
+        self.assertEqual(len(data["results"]), 4)
+
+        data = self.client.get(data["next"]).json()
+        self.assertEqual(len(data["results"]), 3)
+        self.assertIsNone(data["next"])
+
+    def test_news_list_renders_cursor_links(self) -> None:
+        response = self.client.get(reverse("news:news_list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "cursor=")
+
+
+class AuthorRatingTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()  # буфер голосов живёт в кеше
+        self.author = User.objects.create_user(username="writer").author
+        self.reader = User.objects.create_user(username="reader")
+        self.post = Post.objects.create(author=self.author, title="Пост", text="текст")
+
+    def assertRatingConsistent(self) -> None:
+        self.author.refresh_from_db()
+        incremental = self.author.rating
+        self.author.update_rating()
+        self.assertEqual(incremental, self.author.rating)
+
+    def test_votes_apply_deltas(self) -> None:
+        """Лайки постов и комментариев после сброса буфера меняют рейтинг автора."""
+        comment = Comment.objects.create(post=self.post, user=self.reader, text="!")
+        self.post.like()
+        self.post.like()
+        comment.like()
+        own = Comment.objects.create(post=self.post, user=self.author.user, text="?")
+        own.dislike()
+        flush_votes()
+
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.rating, 2 * 3 + 1 + (-1 - 1))
+        self.assertRatingConsistent()
+
+    def test_save_and_delete_apply_deltas(self) -> None:
+        """Правка рейтинга через save и удаление (с каскадом) учитываются."""
+        Comment.objects.create(post=self.post, user=self.reader, text="!", rating=4)
+        self.post.rating = 2
+        self.post.save()
+        self.assertRatingConsistent()
+
+        self.post.delete()
+        self.assertRatingConsistent()
+        self.assertEqual(self.author.rating, 0)
+
+    @override_settings(NEWS_VOTE_BUFFER=True)
+    def test_buffered_votes_visible_before_flush(self) -> None:
+        """Голос виден сразу, а в БД уходит одной пачкой при flush."""
+        with self.assertNumQueries(0):
+            for _ in range(5):
+                self.post.like()
+            self.post.dislike()
+        self.assertEqual((self.post.rating, self.post.live_rating), (0, 4))
+
+        self.assertEqual(flush_votes(), {"news.post": 1})
+        self.assertEqual(flush_votes(), {})
+
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.rating, self.post.live_rating), (4, 4))
+        self.assertRatingConsistent()
+
+    @override_settings(NEWS_VOTE_BUFFER=True)
+    def test_flush_survives_evicted_counter(self) -> None:
+        """Вытесненный счётчик не откатывает курсор: дельта не применится дважды."""
+        self.post.like()
+        self.post.like()
+        with patch.object(votes.cache, "decr", side_effect=ValueError):
+            self.assertEqual(flush_votes(), {"news.post": 1})
+        self.assertEqual(flush_votes(), {})
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.rating, 2)
+        self.assertRatingConsistent()
+
+    @override_settings(NEWS_VOTE_BUFFER=True)
+    def test_buffer_on_local_cache_is_flagged(self) -> None:
+        """locmem у каждого процесса свой — буфер голосов на нём теряет голоса."""
+        self.assertEqual([w.id for w in check_vote_buffer(None)], ["news.W001"])
+        with override_settings(
+            CACHES={"default": {"BACKEND": "django_redis.cache.RedisCache"}}
+        ):
+            self.assertEqual(check_vote_buffer(None), [])
+
+    @override_settings(NEWS_VOTE_BUFFER=False)
+    def test_reconciliation_command_fixes_drift(self) -> None:
+        self.post.like()
+        Author.objects.filter(pk=self.author.pk).update(rating=100)
+
+        call_command("recalculate_author_ratings", stdout=StringIO())
+
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.rating, 3)
+
+
+class NewPostNotificationTests(TestCase):
+    def setUp(self) -> None:
+        author = User.objects.create_user(username="writer").author
+        self.sport = Category.objects.create(name="Спорт")
+        self.city = Category.objects.create(name="Город")
+        # пользователи создаются без email (иначе уходит письмо активации),
+        # адрес проставляем отдельным UPDATE
+        for i in range(5):
+            user = User.objects.create_user(username=f"reader{i}")
+            User.objects.filter(pk=user.pk).update(email=f"reader{i}@example.com")
+            self.sport.subscribers.add(user)
+            if i % 2:
+                self.city.subscribers.add(user)
+        self.post = Post.objects.create(author=author, title="Матч", text="Счёт 2:1")
+        self.post.categories.set([self.sport, self.city])
+
+    def test_fan_out_deduplicates_and_chunks(self) -> None:
+        """Подписчики нескольких категорий получают одно письмо, пачки по 2."""
+        with (
+            self.settings(NEWS_NOTIFICATION_CHUNK_SIZE=2),
+            patch.object(send_new_post_notification_batch, "delay") as delay,
+        ):
+            chunks = send_new_post_notifications(self.post.pk)
+
+        self.assertEqual(chunks, 3)
+        recipients = [r for call in delay.call_args_list for r in call.args[1]]
+        self.assertEqual(len(recipients), 5)
+        self.assertEqual(len({user_id for user_id, _ in recipients}), 5)
+
+    def test_batch_sends_personalized_messages(self) -> None:
+        pairs = list(
+            self.sport.subscribers.order_by("pk").values_list("pk", flat=True)[:2]
+        )
+        sent = send_new_post_notification_batch(
+            self.post.pk, [(user_id, self.sport.pk) for user_id in pairs]
+        )
+
+        self.assertEqual(sent, 2)
+        self.assertEqual(len(mail.outbox), 2)
+        html = mail.outbox[1].alternatives[0][0]
+        self.assertIn("reader1", html)
+        self.assertIn("Спорт", mail.outbox[1].subject)
+
+
+class WeeklyDigestTests(TestCase):
+    def setUp(self) -> None:
+        author = User.objects.create_user(username="writer").author
+        sport = Category.objects.create(name="Спорт")
+        city = Category.objects.create(name="Город")
+        for i in range(3):
+            user = User.objects.create_user(username=f"reader{i}")
+            User.objects.filter(pk=user.pk).update(email=f"reader{i}@example.com")
+            sport.subscribers.add(user)
+            city.subscribers.add(user)
+        both = Post.objects.create(author=author, title="Стадион", text="...")
+        both.categories.set([sport, city])
+        only_city = Post.objects.create(author=author, title="Парк", text="...")
+        only_city.categories.set([city])
+
+    def test_one_merged_digest_per_user(self) -> None:
+        """Одно письмо на пользователя; пост из двух категорий — один раз."""
+        report = WeeklyDigestBuilder(chunk_size=2).run()
+
+        self.assertEqual((report.users, report.emails, report.chunks), (3, 3, 2))
+        self.assertEqual(len(mail.outbox), 3)
+        body = mail.outbox[0].body
+        self.assertEqual(body.count("Стадион"), 1)
+        self.assertIn("Парк", body)
+        self.assertIn("send", report.timings)
+        # блоки категорий и рамка письма отрендерены по одному разу на прогон
+        self.assertEqual(report.renders, 3)
+        html = mail.outbox[0].alternatives[0][0]
+        self.assertIn("reader0", html)
+        self.assertEqual(html.count("Стадион"), 1)
+
+    def test_unsubscribe_link_from_digest(self) -> None:
+        WeeklyDigestBuilder().run()
+        user = User.objects.get(username="reader0")
+        link = re.search(
+            r'href="http://[^/]+(/categories/unsubscribe/[^"]+)"',
+            mail.outbox[0].alternatives[0][0],
+        ).group(1)
+
+        # GET только спрашивает подтверждение: сканеры ссылок не отписывают
+        self.assertContains(self.client.get(link), "<form")
+        self.assertEqual(user.subscribed_categories.count(), 2)
+
+        self.client.post(link, {"List-Unsubscribe": "One-Click"})
+        self.assertEqual(user.subscribed_categories.count(), 1)
+
+
+class FragmentTests(TestCase):
+    def test_personal_fields_are_escaped(self) -> None:
+        fragment = Fragment.render(
+            "email/weekly_digest.html", {}, personal=("user.username", "sections")
+        )
+        html = fragment.fill(
+            {"user.username": "<b>", "sections": mark_safe("<ul></ul>")}
+        )
+        self.assertIn("&lt;b&gt;", html)
+        self.assertIn("<ul></ul>", html)
+
+
+class PageCacheGenerationTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.author = User.objects.create_user(username="writer").author
+        self.category = Category.objects.create(name="Наука")
+
+    def test_feed_is_cached_until_write(self) -> None:
+        """Лента отдаётся из кеша, а новый пост сразу инвалидирует её."""
+        url = reverse("news:news_list")
+        Post.objects.create(author=self.author, title="Первый", text="текст")
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        # ATOMIC_REQUESTS оставляет только SAVEPOINT/RELEASE
+        self.assertFalse([q for q in queries if "SAVEPOINT" not in q["sql"]])
+        self.assertIn("max-age=60", response["Cache-Control"])
+
+        Post.objects.create(author=self.author, title="Второй", text="текст")
+        self.assertContains(self.client.get(url), "Второй")
+
+    def test_page_read_before_commit_goes_stale_on_commit(self) -> None:
+        """Копия, сохранённая между записью и коммитом, после коммита не отдаётся."""
+        url = reverse("news:news_list")
+        self.client.get(url)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            post = Post.objects.create(author=self.author, title="Свежий", text="т")
+            # параллельный запрос до коммита видит только зафиксированные строки
+            committed = Post.objects.exclude(pk=post.pk).defer("text")
+            with patch("news.views._post_list_qs", return_value=committed):
+                racing = self.client.get(url)
+        self.assertNotContains(racing, "Свежий")
+        self.assertEqual(self.client.get(url)["ETag"], racing["ETag"])
+
+        with (
+            patch.object(send_new_post_notifications, "delay"),
+            patch.object(push_to_timelines, "delay"),
+        ):
+            for callback in callbacks:
+                callback()
+        response = self.client.get(url, headers={"If-None-Match": racing["ETag"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Свежий")
+
+    def test_author_rename_bumps_authors_scope(self) -> None:
+        """Смена имени автора устаревает страницы постов, вход — нет."""
+        user = self.author.user
+        before = page_cache.get_generations([page_cache.AUTHORS])
+        self.client.force_login(user)  # сохраняет только last_login
+        self.assertEqual(page_cache.get_generations([page_cache.AUTHORS]), before)
+
+        user.username = "writer2"
+        user.save()
+        self.assertNotEqual(page_cache.get_generations([page_cache.AUTHORS]), before)
+
+    def test_category_scopes_bumped_by_m2m(self) -> None:
+        """Привязка поста к категории меняет поколения ленты, поста и категории."""
+        post = Post.objects.create(author=self.author, title="Пост", text="текст")
+        scopes = [
+            page_cache.GLOBAL,
+            page_cache.post_scope(post.pk),
+            page_cache.category_scope(self.category.pk),
+        ]
+        before = page_cache.get_generations(scopes)
+
+        post.categories.add(self.category)
+
+        after = page_cache.get_generations(scopes)
+        self.assertTrue(all(a != b for a, b in zip(before, after, strict=True)))
+
+    def test_stale_copy_served_while_locked(self) -> None:
+        """Пока один запрос перестраивает запись, остальные получают старую копию."""
+        page_cache.reset_cache_stats()
+        page_cache.fetch("k", lambda: "v1", timeout=60, generation="1")
+
+        cache.add("lock:k", 1)  # перестройку уже ведёт другой запрос
+        stale = page_cache.fetch("k", lambda: "v2", timeout=60, generation="2")
+        cache.delete("lock:k")
+        fresh = page_cache.fetch("k", lambda: "v2", timeout=60, generation="2")
+
+        self.assertEqual((stale, fresh), ("v1", "v2"))
+        self.assertEqual(
+            page_cache.cache_stats()["fragment"],
+            {"hit": 0, "miss": 1, "stale": 1, "regenerate": 1, "not_modified": 0},
+        )
+
+
+class CategoryCountTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.author = User.objects.create_user(username="writer").author
+        self.science = Category.objects.create(name="Наука")
+        self.sport = Category.objects.create(name="Спорт")
+        self.users = [User.objects.create_user(username=f"u{i}") for i in range(4)]
+
+    def counts(self, category: Category) -> tuple[int, int]:
+        category.refresh_from_db()
+        return category.subscriber_count, category.post_count
+
+    def test_subscriber_count_follows_m2m(self) -> None:
+        self.science.subscribers.add(*self.users)
+        self.science.subscribers.add(self.users[0])  # повтор не считается
+        self.users[1].subscribed_categories.add(self.sport)
+        self.assertEqual(self.counts(self.science)[0], 4)
+
+        self.science.subscribers.remove(self.users[0], self.users[0])
+        self.users[1].subscribed_categories.clear()
+        self.users[2].delete()
+        self.assertEqual(self.counts(self.science)[0], 1)
+        self.assertEqual(self.counts(self.sport)[0], 0)
+
+        self.science.subscribers.clear()
+        self.assertEqual(self.counts(self.science)[0], 0)
+
+    def test_post_count_follows_links(self) -> None:
+        posts = [
+            Post.objects.create(author=self.author, title=f"Пост {i}", text="т")
+            for i in range(3)
+        ]
+        posts[0].categories.add(self.science, self.sport)
+        self.science.category_posts.create(post=posts[1])
+        bulk_save_posts(
+            [{"title": "Пачка", "text": "т", "categories": [self.science.pk]}]
+        )
+        self.assertEqual(self.counts(self.science)[1], 3)
+
+        posts[0].categories.remove(self.sport)
+        posts[1].delete()
+        self.assertEqual(self.counts(self.science)[1], 2)
+        self.assertEqual(self.counts(self.sport)[1], 0)
+
+        Category.objects.update(post_count=0, subscriber_count=0)
+        Category.recount()
+        self.assertEqual(self.counts(self.science), (0, 2))
+
+    def test_detail_page_paginates_subscribers(self) -> None:
+        self.science.subscribers.add(*self.users)
+        self.client.force_login(self.users[0])
+        url = reverse("news:category_detail", args=[self.science.pk])
+
+        with patch("news.views.SUBSCRIBERS_PAGE_SIZE", 3):
+            response = self.client.get(url)
+        page = response.context["subscribers"]
+        self.assertEqual(len(page), 3)
+        self.assertEqual(page.total_estimate, 4)
+        self.assertTrue(response.context["is_subscribed"])
+        self.assertContains(response, "подписчиков: 4")
+
+        with patch("news.views.SUBSCRIBERS_PAGE_SIZE", 3):
+            rest = self.client.get(f"{url}?{page.next_query}").context["subscribers"]
+        self.assertEqual([u.username for u in rest], ["u3"])
+
+    def test_list_page_reads_counts(self) -> None:
+        self.science.subscribers.add(self.users[0])
+        self.client.force_login(self.users[0])
+        response = self.client.get(reverse("news:category_list"))
+        self.assertEqual(response.context["subscribed_ids"], {self.science.pk})
+        self.assertContains(response, "Отписаться", count=1)
+
+
+class SubscriptionCacheTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = User.objects.create_user(username="reader")
+        self.categories = [Category.objects.create(name=f"Кат {i}") for i in range(3)]
+
+    def test_set_is_cached_and_invalidated(self) -> None:
+        self.categories[0].subscribers.add(self.user)
+        self.assertEqual(subscribed_category_ids(self.user), {self.categories[0].pk})
+        with self.assertNumQueries(0):
+            subscribed_category_ids(self.user)
+
+        self.user.subscribed_categories.add(self.categories[1])
+        self.assertEqual(len(subscribed_category_ids(self.user)), 2)
+        self.categories[0].subscribers.clear()
+        self.assertEqual(subscribed_category_ids(self.user), {self.categories[1].pk})
+
+    def test_pages_read_state_from_cache(self) -> None:
+        self.client.force_login(self.user)
+        self.client.post(
+            reverse("news:category_subscribe", args=[self.categories[0].pk])
+        )
+        self.client.get(reverse("news:category_list"))  # прогрев набора
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("news:category_detail", args=[self.categories[0].pk])
+            )
+        self.assertTrue(response.context["is_subscribed"])
+        # постраничный список подписчиков остаётся, проверки подписки — нет
+        lookup = '"news_category_subscribers"."user_id" ='
+        self.assertFalse([q for q in queries if lookup in q["sql"]])
+
+    def test_bulk_api(self) -> None:
+        a, b, c = (category.pk for category in self.categories)
+        self.categories[2].subscribers.add(self.user)
+        url = "/api/subscriptions/"
+        self.assertEqual(self.client.post(url, {}).status_code, 403)
+
+        self.client.force_login(self.user)
+        response = self.client.post(
+            url,
+            {"subscribe": [a, b], "unsubscribe": [c]},
+            content_type="application/json",
+        )
+        self.assertEqual(response.json(), {"categories": [a, b]})
+        self.categories[2].refresh_from_db()
+        self.assertEqual(self.categories[2].subscriber_count, 0)
+
+        bad = self.client.post(
+            url, {"subscribe": [a, 999]}, content_type="application/json"
+        )
+        self.assertEqual(bad.status_code, 400)
+        self.assertEqual(self.client.get(url).json(), {"categories": [a, b]})
+
+
+class TimelineTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.author = User.objects.create_user(username="writer").author
+        self.reader = User.objects.create_user(username="reader")
+        self.science = Category.objects.create(name="Наука")
+        self.sport = Category.objects.create(name="Спорт")
+        self.science.subscribers.add(self.reader)
+        self.sport.subscribers.add(self.reader)
+
+    def publish(self, title: str, *categories: Category) -> Post:
+        with eager_celery(), self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(author=self.author, title=title, text="т")
+            post.categories.add(*categories)
+        return post
+
+    def test_new_post_is_pushed_once_per_subscriber(self) -> None:
+        post = self.publish("Общий", self.science, self.sport)
+        self.assertEqual(
+            list(TimelineEntry.objects.values_list("user_id", "post_id")),
+            [(self.reader.pk, post.pk)],
+        )
+        self.assertEqual(push_posts([post.pk]), 1)  # повтор не дублирует запись
+        self.assertEqual(TimelineEntry.objects.count(), 1)
+
+    def test_pages_merge_pushed_and_pulled_posts(self) -> None:
+        posts = [self.publish(f"Наука {i}", self.science) for i in range(3)]
+        with override_settings(NEWS_TIMELINE_FANOUT_LIMIT=0):
+            cache.clear()
+            posts += [self.publish(f"Спорт {i}", self.sport) for i in range(2)]
+            self.assertFalse(TimelineEntry.objects.filter(post__in=posts[3:]))
+
+            first = timeline_page(self.reader, None, 3)
+            second = timeline_page(self.reader, first.next_cursor, 3)
+        newest = [post.pk for post in reversed(posts)]
+        self.assertEqual([p.pk for p in first], newest[:3])
+        self.assertEqual([p.pk for p in second], newest[3:])
+        self.assertFalse(second.has_next)
+
+    def test_view_api_and_trim(self) -> None:
+        for i in range(4):
+            self.publish(f"Пост {i}", self.science)
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse("news:my_feed"))
+        self.assertContains(response, "Пост 3")
+
+        data = self.client.get("/api/posts/my/", {"page_size": 3}).json()
+        self.assertEqual([row["title"] for row in data["results"]][0], "Пост 3")
+        rest = self.client.get(data["next"]).json()
+        self.assertEqual([row["title"] for row in rest["results"]], ["Пост 0"])
+        self.assertIsNone(rest["next"])
+
+        self.assertEqual(trim_timelines(limit=2), 2)
+        titles = [p.title for p in timeline_page(self.reader, None, 10)]
+        self.assertEqual(titles, ["Пост 3", "Пост 2"])
+
+
+class TrendingTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.author = User.objects.create_user(username="writer").author
+        self.reader = User.objects.create_user(username="reader")
+        self.science = Category.objects.create(name="Наука")
+        self.now = timezone.now()
+
+    def make(self, title, rating, hours_ago, post_type="AR", *categories) -> Post:
+        post = Post.objects.create(
+            author=self.author, title=title, text="т", type=post_type, rating=rating
+        )
+        post.categories.add(*categories)
+        created_at = self.now - timedelta(hours=hours_ago)
+        Post.objects.filter(pk=post.pk).update(created_at=created_at)
+        return post
+
+    def test_refresh_decays_scores_per_scope(self) -> None:
+        old = self.make("Вчерашняя", 8, 36, "NW", self.science)
+        fresh = self.make("Свежая", 2, 1)
+        self.make("Неделю назад", 100, 24 * 7)
+
+        self.assertEqual(trending.refresh(self.now), 2)
+        self.assertEqual(TrendingScore.objects.count(), 2)
+        # 8 · 2^-3 = 1 < 2 · 2^(-1/12)
+        self.assertEqual(trending.top(10), [fresh.pk, old.pk])
+        self.assertEqual(trending.top(10, post_type="NW"), [old.pk])
+        self.assertEqual(trending.top(10, category_id=self.science.pk), [old.pk])
+
+    @override_settings(NEWS_VOTE_BUFFER=True)
+    def test_votes_and_comments_reorder_cached_lists(self) -> None:
+        first = self.make("Первая", 3, 0, "AR", self.science)
+        second = self.make("Вторая", 1, 0, "AR", self.science)
+        trending.refresh(self.now)
+        self.assertEqual(
+            trending.top(10, category_id=self.science.pk), [first.pk, second.pk]
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=second, user=self.reader, text="к")
+        second.like()
+        flush_votes()  # голоса попадают в рейтинг пачкой при сбросе буфера
+        with self.assertNumQueries(0):
+            ids = trending.top(10, category_id=self.science.pk)
+        self.assertEqual(ids, [second.pk, first.pk])
+
+        for _ in range(3):
+            first.dislike()
+        flush_votes()
+        self.assertEqual(trending.top(10), [second.pk])
+
+    def test_stale_landmark_is_moved_when_scoring(self) -> None:
+        """Без пересчётов 2^((t − L)/H) переполнился бы: запись переносит landmark."""
+        post = self.make("Горячая", 2, 0)
+        stale = self.now - timedelta(days=1200)  # 2400 периодов полураспада
+        cache.set(trending.EPOCH_KEY, int(stale.timestamp()), None)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=post, user=self.reader, text="к")
+
+        self.assertGreaterEqual(
+            cache.get(trending.EPOCH_KEY), int(self.now.timestamp())
+        )
+        # рейтинг и комментарий — по разу: событие вошло в пересчёт из БД
+        self.assertAlmostEqual(
+            TrendingScore.objects.get(post=post).score, 4 * trending.SCALE, delta=5
+        )
+        self.assertEqual(trending.top(10), [post.pk])
+
+    def test_view_and_api(self) -> None:
+        post = self.make("Горячая", 5, 0, "NW", self.science)
+        self.make("Статья", 1, 0)
+        trending.refresh(self.now)
+
+        response = self.client.get(reverse("news:trending"), {"type": "nw"})
+        self.assertContains(response, "Горячая")
+        self.assertNotContains(response, "<strong>Статья")
+        self.assertEqual(
+            self.client.get(reverse("news:trending"), {"category": 999}).status_code,
+            404,
+        )
+
+        data = self.client.get(
+            "/api/posts/trending/", {"category": self.science.pk, "limit": 1}
+        ).json()
+        self.assertEqual([row["title"] for row in data["results"]], [post.title])
+
+
+class PostListFilterTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        author = User.objects.create_user(username="writer").author
+        self.science = Category.objects.create(name="Наука")
+        self.sport = Category.objects.create(name="Спорт")
+        Category.objects.create(name="Научпоп")
+        for i in range(7):
+            post = Post.objects.create(author=author, title=f"Пост {i}", text="т")
+            post.categories.add(self.science, *([self.sport] if i % 2 else []))
+        Post.objects.create(author=author, title="Без категорий", text="т")
+
+    def test_filters_by_ids_with_semi_join(self) -> None:
+        url = reverse("news:post_list")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                url, {"category": [self.science.pk, self.sport.pk]}
+            )
+        page = response.context["page_obj"]
+        self.assertEqual(len(page), 5)
+        self.assertEqual(len({post.pk for post in page}), 5)
+        self.assertEqual(page.total_estimate, 7)
+        sql = " ".join(q["sql"] for q in queries)
+        self.assertIn("EXISTS", sql)
+        self.assertNotIn("DISTINCT", sql)
+        self.assertNotIn("LIKE", sql)
+
+        rest = self.client.get(f"{url}?{page.next_query}").context["page_obj"]
+        self.assertEqual(len(rest), 2)
+        self.assertFalse({post.pk for post in page} & {post.pk for post in rest})
+
+    def test_single_category_and_legacy_name(self) -> None:
+        url = reverse("news:post_list")
+        by_id = self.client.get(url, {"category": self.sport.pk}).context["page_obj"]
+        by_name = self.client.get(url, {"category": "спорт"}).context["page_obj"]
+        self.assertEqual(by_id.total_estimate, 3)  # из Category.post_count
+        self.assertEqual([p.pk for p in by_id], [p.pk for p in by_name])
+
+        missing = self.client.get(url, {"category": "нет такой"})
+        self.assertEqual(len(missing.context["page_obj"]), 0)
+        everything = self.client.get(url, {"category": ""})
+        self.assertEqual(everything.context["page_obj"].total_estimate, 8)
+
+    def test_sidebar_comes_from_cache(self) -> None:
+        self.client.get(reverse("news:post_list"))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("news:post_list"), {"page": "x"})
+        sidebar = 'ORDER BY "news_category"."name"'
+        self.assertFalse([q for q in queries if sidebar in q["sql"]])
+        self.assertEqual(len(response.context["categories"]), 3)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.author = User.objects.create_user(username="writer").author
+        self.post = Post.objects.create(author=self.author, title="Пост", text="т")
+
+    def assertNotModified(self, url: str, headers: dict) -> None:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, headers=headers)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([q for q in queries if "SAVEPOINT" not in q["sql"]])
+
+    def test_feed_and_detail_revalidate_without_queries(self) -> None:
+        """Повторный запрос с If-None-Match получает 304 без обращения к БД."""
+        for url in (
+            reverse("news:news_list"),
+            "/api/posts/",
+            f"/api/posts/{self.post.pk}/",
+        ):
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                self.assertTrue(first.has_header("Last-Modified"))
+                self.assertNotModified(url, {"If-None-Match": first["ETag"]})
+
+    def test_login_between_requests_changes_page(self) -> None:
+        """Копия анонима не достаётся вошедшему пользователю — ни 304, ни из кеша."""
+        category = Category.objects.create(name="Наука")
+        url = reverse("news:category_list")
+        anonymous = self.client.get(url)
+        self.assertTrue(has_vary_header(anonymous, "Cookie"))
+        self.assertNotContains(anonymous, "Отписаться")
+
+        reader = User.objects.create_user(username="reader")
+        subscriptions.change_subscriptions(reader, subscribe=[category.pk])
+        self.client.force_login(reader)
+        headers = {
+            "If-None-Match": anonymous["ETag"],
+            "If-Modified-Since": anonymous["Last-Modified"],
+        }
+        response = self.client.get(url, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], anonymous["ETag"])
+        self.assertContains(response, "Отписаться")
+
+        # первый ответ выставил csrftoken — дальше cookies не меняются
+        etag = self.client.get(url)["ETag"]
+        again = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(again.status_code, 304)
+        self.assertTrue(has_vary_header(again, "Cookie"))
+
+        self.client.logout()
+        self.assertNotContains(self.client.get(url), "Отписаться")
+
+    def test_expanded_names_change_etag(self) -> None:
+        """Переименование автора или категории меняет ETag развёрнутого ответа."""
+        category = Category.objects.create(name="Наука")
+        self.post.categories.add(category)
+        params = {"expand": "author,categories"}
+        urls = ("/api/posts/", f"/api/posts/{self.post.pk}/")
+        etags = {url: self.client.get(url, params)["ETag"] for url in urls}
+
+        category.name = "Техника"
+        category.save()
+        user = self.author.user
+        user.username = "editor"
+        user.save()
+
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url, params, headers={"If-None-Match": etags[url]}
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, "Техника")
+                self.assertContains(response, "editor")
+
+    @override_settings(NEWS_VOTE_BUFFER=False)
+    def test_unbuffered_vote_changes_etag(self) -> None:
+        detail = f"/api/posts/{self.post.pk}/"
+        etag = self.client.get(detail)["ETag"]
+
+        self.post.like()  # сразу в БД, мимо буфера
+        response = self.client.get(detail, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["rating"], 1)
+
+    @override_settings(NEWS_VOTE_BUFFER=True)
+    def test_write_changes_etag(self) -> None:
+        detail = f"/api/posts/{self.post.pk}/"
+        etag = self.client.get(detail)["ETag"]
+        self.assertNotModified(detail, {"If-None-Match": etag})
+
+        self.post.like()  # голос из буфера меняет live_rating в ответе
+        response = self.client.get(detail, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+        listed = self.client.get("/api/posts/")
+        self.assertNotModified(
+            "/api/posts/", {"If-Modified-Since": listed["Last-Modified"]}
+        )
+        Post.objects.create(author=self.author, title="Новый", text="т")
+        self.assertEqual(
+            self.client.get(
+                "/api/posts/", headers={"If-None-Match": listed["ETag"]}
+            ).status_code,
+            200,
+        )
+
+
+class BulkPostApiTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = User.objects.create_user(username="partner")
+        self.client.force_login(self.user)
+        self.science = Category.objects.create(name="Наука")
+        self.sport = Category.objects.create(name="Спорт")
+
+    def post_bulk(self, items):
+        return self.client.post(
+            "/api/posts/bulk/", items, content_type="application/json"
+        )
+
+    def test_bulk_create_is_batched(self) -> None:
+        """Число запросов не зависит от размера пачки; рассылка — одна задача."""
+        items = [
+            {
+                "title": f"Новость {i}",
+                "text": "Квантовый компьютер",
+                "type": "NW",
+                "author": self.user.author.pk,
+                "categories": [self.science.pk, self.sport.pk],
+            }
+            for i in range(20)
+        ]
+        feed_generation = page_cache.get_generations([page_cache.GLOBAL])
+
+        with (
+            patch.object(send_bulk_post_notifications, "delay") as delay,
+            patch.object(push_to_timelines, "delay") as push,
+            self.captureOnCommitCallbacks(execute=True),
+            CaptureQueriesContext(connection) as queries,
+        ):
+            response = self.post_bulk(items)
+
+        self.assertEqual(response.status_code, 201)
+        created = response.json()["created"]
+        self.assertEqual(len(created), 20)
+        self.assertLess(len(queries), 20)
+        delay.assert_called_once_with(created)
+        push.assert_called_once_with(created)
+        self.assertEqual(self.science.posts.count(), 20)
+        self.assertEqual(search_posts(Post.objects.all(), "квантовый").count(), 20)
+        self.assertNotEqual(
+            page_cache.get_generations([page_cache.GLOBAL]), feed_generation
+        )
+
+    def test_bulk_update_checks_permissions_once(self) -> None:
+        own = Post.objects.create(author=self.user.author, title="Мой", text="т")
+        other = User.objects.create_user(username="other").author
+        foreign = Post.objects.create(author=other, title="Чужой", text="т")
+
+        response = self.post_bulk(
+            [{"id": own.pk, "title": "Мой!"}, {"id": foreign.pk, "title": "Взлом"}]
+        )
+        self.assertEqual(response.status_code, 403)
+
+        response = self.post_bulk(
+            [{"id": own.pk, "title": "Мой!", "categories": [self.sport.pk]}]
+        )
+        self.assertEqual(response.status_code, 200)  # ничего не создано
+        self.assertEqual(response.json(), {"created": [], "updated": [own.pk]})
+        own.refresh_from_db()
+        self.assertEqual(own.title, "Мой!")
+        self.assertEqual(own.text, "т")
+        self.assertEqual(list(own.categories.all()), [self.sport])
+
+    def test_bulk_relink_bumps_each_scope_once(self) -> None:
+        """Сигналы удалённых связей сливаются с общим bump() пачки."""
+        posts = [
+            Post.objects.create(author=self.user.author, title=f"П{i}", text="т")
+            for i in range(3)
+        ]
+        for post in posts:
+            post.categories.add(self.science)
+        scope = [page_cache.category_scope(self.science.pk)]
+        before = page_cache.get_generations(scope)
+
+        bulk_save_posts([{"id": p.pk, "categories": [self.sport.pk]} for p in posts])
+
+        after = page_cache.get_generations(scope)
+        self.assertEqual(after[0] - before[0], 1)
+
+    def test_bulk_validates_references(self) -> None:
+        response = self.post_bulk([{"title": "Т", "text": "т", "categories": [999]}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("999", str(response.json()))
+        self.assertFalse(Post.objects.exists())
+
+
+class ImportPostsTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        User.objects.create_user(username="writer")
+        Category.objects.create(name="Наука")
+        rows = [
+            {"title": "Квантовый скачок", "text": "т", "author": "writer"},
+            {"title": "Без автора", "text": "т", "categories": ["Наука"]},
+            {"title": "", "text": "пустой заголовок"},
+            {"title": "Новость", "text": "т", "type": "Новость", "categories": "Спорт"},
+        ]
+        fd, self.path = tempfile.mkstemp(suffix=".jsonl")
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            fh.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+        self.addCleanup(os.remove, self.path)
+
+    def test_import_skips_invalid_rows_and_indexes_once(self) -> None:
+        call_command(
+            "import_posts",
+            self.path,
+            "--batch-size=2",
+            "--skip-invalid",
+            "--create-categories",
+            stdout=StringIO(),
+            stderr=StringIO(),
+        )
+
+        self.assertEqual(Post.objects.count(), 3)
+        news = Post.objects.get(title="Новость")
+        self.assertEqual((news.type, news.categories.get().name), ("NW", "Спорт"))
+        self.assertEqual(Post.objects.get(title="Без автора").preview_text, "т")
+        self.assertEqual(search_posts(Post.objects.all(), "квантовый").count(), 1)
+        self.assertFalse(os.path.exists(self.path + ".checkpoint"))
+
+    def test_stops_on_invalid_row_and_resumes(self) -> None:
+        with self.assertRaisesMessage(CommandError, "Строка 3"):
+            call_command("import_posts", self.path, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 2)
+
+        # исправленный вход: с --resume первые две строки не повторяются
+        with open(self.path, encoding="utf-8") as fh:
+            lines = fh.readlines()
+        lines[2] = json.dumps({"title": "Исправлено", "text": "т"}) + "\n"
+        with open(self.path, "w", encoding="utf-8") as fh:
+            fh.writelines(lines[:3])
+        call_command("import_posts", self.path, "--resume", stdout=StringIO())
+
+        self.assertEqual(Post.objects.count(), 3)
+        self.assertTrue(Post.objects.filter(title="Исправлено").exists())
+
+
+class DeleteNewsFromCategoryTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        author = User.objects.create_user(username="writer").author
+        self.sport = Category.objects.create(name="Спорт")
+        self.city = Category.objects.create(name="Город")
+        for i in range(5):
+            Post.objects.create(author=author, title=f"Матч {i}", text="т")
+            Post.objects.latest("pk").categories.add(self.sport)
+        self.kept = Post.objects.create(author=author, title="Город", text="т")
+        self.kept.categories.add(self.city)
+
+    def test_dry_run_deletes_nothing(self) -> None:
+        out = StringIO()
+        call_command("delete_news_from_category", "Спорт", "--dry-run", stdout=out)
+        self.assertIn("5", out.getvalue())
+        self.assertEqual(Post.objects.count(), 6)
+
+    def test_batched_delete_coalesces_cache_bumps(self) -> None:
+        """Каждая пачка — один bump() на выходе, а не по одному на пост."""
+        scopes = [page_cache.GLOBAL, page_cache.category_scope(self.sport.pk)]
+        before = page_cache.get_generations(scopes)
+        call_command(
+            "delete_news_from_category",
+            "Спорт",
+            "--yes",
+            "--batch-size=2",
+            stdout=StringIO(),
+        )
+
+        self.assertEqual(list(Post.objects.all()), [self.kept])
+        after = page_cache.get_generations(scopes)
+        # пачки 2 + 2 + 1 — по одному инкременту поколения на пачку
+        self.assertEqual([a - b for a, b in zip(after, before, strict=True)], [3, 3])
+
+
+class PerfSuiteTests(TestCase):
+    def test_seed_is_skewed_and_consistent(self) -> None:
+        """Посты сосредоточены у немногих авторов, рейтинги авторов сходятся."""
+        report = seed(SeedConfig.for_posts(200, users=40, authors=10, seed=1))
+        self.assertEqual(report.counts["posts"], 200)
+        self.assertEqual(Comment.objects.count(), 600)
+
+        per_author = sorted(
+            Author.objects.annotate(n=Count("posts")).values_list("n", flat=True)
+        )
+        self.assertGreater(per_author[-1], 4 * per_author[0] + 1)
+        out = StringIO()
+        call_command("recalculate_author_ratings", "--dry-run", stdout=out)
+        self.assertIn("согласованы", out.getvalue())
+
+    def test_suite_writes_report_and_rolls_back(self) -> None:
+        fd, path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+
+        call_command(
+            "benchmark_suite",
+            "--sizes=30",
+            "--repeat=1",
+            f"--output={path}",
+            stdout=StringIO(),
+        )
+
+        with open(path, encoding="utf-8") as fh:
+            report = json.load(fh)
+        results = report["results"]["30"]
+        self.assertIn("api_posts", results)
+        self.assertGreater(results["news_list"]["queries"], 0)
+        self.assertFalse(Post.objects.exists())
+
+
+class SQLStatsTests(TestCase):
+    def setUp(self) -> None:
+        author = User.objects.create_user(username="writer").author
+        categories = [Category.objects.create(name=f"Кат {i}") for i in range(3)]
+        for i in range(6):
+            post = Post.objects.create(author=author, title=f"Пост {i}", text="т")
+            post.categories.set(categories)
+
+    def test_recorder_flags_repeated_queries(self) -> None:
+        recorder = QueryRecorder()
+        with recorder.record():
+            for post in Post.objects.all():
+                list(post.categories.values_list("name", flat=True))
+
+        stats = recorder.stats(threshold=5)
+        self.assertEqual(stats.queries, 7)
+        self.assertTrue(stats.n_plus_one)
+        self.assertEqual(stats.duplicates[0][1], 6)
+
+    @override_settings(NEWS_SQL_STATS=True)
+    def test_admin_changelist_uses_prefetch(self) -> None:
+        """get_categories больше не делает запрос на каждую строку."""
+        admin = User.objects.create_superuser(username="admin", email="")
+        self.client.force_login(admin)
+
+        with self.assertLogs("news.sqlstats", "INFO") as logs:
+            response = self.client.get(reverse("admin:news_post_changelist"))
+
+        self.assertContains(response, "Кат 0, Кат 1, Кат 2")
+        self.assertIn("db;dur=", response["Server-Timing"])
+        self.assertGreater(int(response["X-DB-Queries"]), 0)
+        self.assertFalse(logs.records[-1].sql_stats["n_plus_one"])
+
+
+class MetricsTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        metrics.registry.reset()
+
+    def test_request_task_and_mail_series(self) -> None:
+        self.client.get("/api/posts/")
+        self.client.get("/api/posts/")
+        self.client.get("/nowhere/")
+        send_bulk_post_notifications.apply(args=([],))
+        with override_settings(
+            EMAIL_BACKEND="news.metrics.MetricsEmailBackend",
+            NEWS_METRICS_EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+        ):
+            mail.send_mail("Тема", "Текст", None, ["a@example.com"])
+
+        self.client.force_login(User.objects.create_user("ops", is_staff=True))
+        text = self.client.get(reverse("metrics")).content.decode()
+        self.assertIn(
+            'news_http_requests_total{view="api-posts-list",method="GET",status="2xx"} 2',
+            text,
+        )
+        self.assertIn('view="unmatched",method="GET",status="4xx"} 1', text)
+        self.assertIn(
+            'news_http_request_duration_seconds_count{view="api-posts-list",'
+            'method="GET"} 2',
+            text,
+        )
+        self.assertIn(
+            'news_http_request_duration_seconds_bucket{view="api-posts-list",'
+            'method="GET",le="+Inf"} 2',
+            text,
+        )
+        self.assertIn(
+            'news_celery_tasks_total{task="news.tasks.send_bulk_post_notifications",'
+            'state="SUCCESS"} 1',
+            text,
+        )
+        self.assertIn('news_mail_sent_total{result="sent"} 1', text)
+        self.assertIn("# TYPE news_cache_events_total counter", text)
+
+    def test_flushed_series_are_shared(self) -> None:
+        """Дельты другого процесса видны после его сброса в общий кеш."""
+        metrics.MAIL_SENT.inc(3, result="sent")
+        metrics.registry.flush()
+        metrics.registry._known.clear()  # «другой воркер» с пустым реестром
+        metrics.MAIL_SENT.inc(2, result="sent")
+
+        self.assertIn('news_mail_sent_total{result="sent"} 5', metrics.render())
+
+    @override_settings(NEWS_METRICS_TOKEN="secret")
+    def test_token_required(self) -> None:
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        response = self.client.get(
+            reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret"
+        )
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(NEWS_METRICS_TOKEN="")
+    def test_closed_without_token(self) -> None:
+        """Без токена метрики видит только персонал — пустой Bearer не проходит."""
+        url = reverse("metrics")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(
+            self.client.get(url, HTTP_AUTHORIZATION="Bearer ").status_code, 403
+        )
+        self.client.force_login(User.objects.create_user("reader"))
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(User.objects.create_user("ops", is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class CensorTests(TestCase):
+    def setUp(self) -> None:
+        invalidate_censor()  # движок мог запомнить словарь из другого теста
+        self.author = User.objects.create_user(username="writer").author
+
+    def test_engine_matches_whole_words_case_insensitive(self) -> None:
+        engine = CensorEngine(["дурак", "дурашка", "овощ"])
+        self.assertEqual(
+            engine.censor("Дурак и дурашка, но не дураки. ОВОЩ!"),
+            "***** и *******, но не дураки. ****!",
+        )
+
+    def test_dictionary_change_invalidates_engine(self) -> None:
+        """Фильтр берёт слова из БД и видит изменения словаря сразу."""
+        self.assertEqual(censor_filter("Редиска"), "*******")
+        CensoredWord.objects.create(word="Брокколи")
+        self.assertEqual(censor_filter("брокколи"), "********")
+
+    def test_dictionary_change_invalidates_cached_feed(self) -> None:
+        cache.clear()
+        Post.objects.create(author=self.author, title="Брокколи", text="брокколи")
+        url = reverse("news:news_list")
+        self.assertContains(self.client.get(url), "Брокколи")
+
+        CensoredWord.objects.create(word="Брокколи")
+        response = self.client.get(url)
+        self.assertNotContains(response, "Брокколи")
+        self.assertContains(response, "********")
+
+    @override_settings(NEWS_CENSOR_ON_SAVE=True)
+    def test_censored_fields_stored_on_save(self) -> None:
+        post = Post.objects.create(author=self.author, title="Редиска", text="овощ")
+        self.assertEqual((post.censored_title, post.censored_text), ("*******", "****"))
+
+        post.title = "Дурак"
+        post.save(update_fields=["title"])
+        post.refresh_from_db()
+        self.assertEqual(post.display_title, "*****")
+
+    @override_settings(NEWS_CENSOR_ON_SAVE=True)
+    def test_recensor_posts_command(self) -> None:
+        post = Post.objects.create(author=self.author, title="Брокколи", text="ок")
+        CensoredWord.objects.create(word="Брокколи")
+
+        call_command("recensor_posts", stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.censored_title, "********")
+
+        call_command("recensor_posts", "--clear", stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual((post.censored_title, post.display_title), ("", "********"))
+
+
+class PostDerivedFieldsTests(TestCase):
+    def setUp(self) -> None:
+        self.author = User.objects.create_user(username="writer").author
+
+    def test_preview_stored_and_feed_defers_text(self) -> None:
+        """Превью считается при save, лента не грузит text."""
+        post = Post.objects.create(author=self.author, title="Т", text="слово " * 100)
+        self.assertEqual(len(post.preview_text), 150)
+
+        response = self.client.get(reverse("news:news_list"))
+        listed = response.context["page_obj"].object_list[0]
+        self.assertIn("text", listed.get_deferred_fields())
+        with self.assertNumQueries(0):
+            self.assertEqual(listed.preview, post.preview_text)
+
+    def test_backfill_command(self) -> None:
+        post = Post.objects.create(author=self.author, title="Т", text="Редиска\n\nок")
+        Post.objects.filter(pk=post.pk).update(preview_text=None)
+
+        call_command("backfill_post_fields", "--missing-only", stdout=StringIO())
+
+        post.refresh_from_db()
+        self.assertEqual(post.preview_text, "Редиска\n\nок")
+        self.assertEqual(post.preview, "*******\n\nок")
+
+    def test_preview_follows_censor_mode(self) -> None:
+        """Без NEWS_CENSOR_ON_SAVE превью цензурится при выводе, с ним — хранится."""
+        invalidate_censor()
+        post = Post.objects.create(author=self.author, title="Т", text="Брокколи")
+        CensoredWord.objects.create(word="Брокколи")
+        self.assertEqual((post.preview_text, post.preview), ("Брокколи", "********"))
+
+        with override_settings(NEWS_CENSOR_ON_SAVE=True):
+            post.save()
+            self.assertEqual((post.preview_text, post.preview), ("********",) * 2)
+
+
+class FastApiListTests(TestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        author = User.objects.create_user(username="writer").author
+        science, sport = Category.objects.create(name="Наука"), Category.objects.create(
+            name="Спорт"
+        )
+        for i in range(3):
+            post = Post.objects.create(author=author, title=f"Пост {i}", text="текст")
+            post.categories.add(science, sport)
+        Post.objects.create(author=None, title="Без автора", text="текст").like()
+
+    def test_values_path_matches_model_serializer(self) -> None:
+        """Быстрый путь отдаёт тот же JSON, что PostSerializer."""
+        qs = Post.objects.prefetch_related("categories").order_by("-created_at", "-id")
+        expected = PostSerializer(qs, many=True).data
+        reader = PostValuesSerializer()
+
+        with self.assertNumQueries(2):  # строки + категории страницы
+            actual = reader.to_representation(reader.get_queryset(qs))
+
+        self.assertEqual(actual, expected)
+
+    def test_api_list_uses_values_path(self) -> None:
+        # COUNT, страница, категории + SAVEPOINT/RELEASE от ATOMIC_REQUESTS
+        with self.assertNumQueries(5):
+            data = self.client.get("/api/posts/", {"page_size": 2}).json()
+        self.assertEqual(len(data["results"]), 2)
+        self.assertEqual(len(self.client.get(data["next"]).json()["results"]), 2)
+
+    def test_sparse_fields_and_expand(self) -> None:
+        """?fields/?exclude/?expand меняют и ответ, и SELECT."""
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(
+                "/api/posts/", {"fields": "title,rating", "page_size": 1}
+            ).json()
+        self.assertEqual(list(data["results"][0]), ["title", "rating"])
+        self.assertFalse([q for q in queries if '"text"' in q["sql"]])
+
+        post = Post.objects.exclude(author=None).first()
+        detail = self.client.get(
+            f"/api/posts/{post.pk}/", {"exclude": "text", "expand": "author,categories"}
+        ).json()
+        self.assertNotIn("text", detail)
+        self.assertEqual(detail["author"]["username"], "writer")
+        self.assertEqual([c["name"] for c in detail["categories"]], ["Наука", "Спорт"])
+
+        listed = self.client.get(
+            "/api/posts/", {"expand": "author,categories", "page_size": 4}
+        ).json()["results"]
+        self.assertEqual(listed[1]["author"], detail["author"])
+        self.assertIsNone(listed[0]["author"])
+
+        bad = self.client.get("/api/posts/", {"fields": "password"})
+        self.assertEqual(bad.status_code, 400)
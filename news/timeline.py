@@ -0,0 +1,175 @@
+"""
+Персональная лента «мои категории» (fan-out on write).
+
+Новый пост после коммита раскладывается задачей ``push_to_timelines`` в
+таблицу ``TimelineEntry`` — по строке на подписчика его категорий, пачками
+``bulk_create``. Страница ленты — диапазон по индексу
+``(user, -created_at, -post)``: стоимость зависит от размера страницы, а не
+от числа подписок или постов.
+
+Категории, где подписчиков больше ``NEWS_TIMELINE_FANOUT_LIMIT``, не
+раскладываются (одна публикация дала бы сотни тысяч строк): их посты лента
+дочитывает при чтении — keyset-выборкой по ``Post`` — и сливает с
+материализованной частью. Лента — история доставки: отписка не убирает уже
+доставленные записи, новая подписка не добавляет старые посты.
+``trim_timelines()`` оставляет каждому пользователю не больше
+``NEWS_TIMELINE_MAX_ENTRIES`` последних записей.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Count, Exists, OuterRef, QuerySet
+
+from . import cache as page_cache
+from . import subscriptions
+from .models import Category, Post, PostCategory, TimelineEntry
+from .pagination import KeysetPage, decode_cursor, keyset_filter
+
+BATCH_SIZE = 2000
+ORDERING = ("-created_at", "-id")
+ENTRY_ORDERING = ("-created_at", "-post_id")
+
+
+def fanout_limit() -> int:
+    return getattr(settings, "NEWS_TIMELINE_FANOUT_LIMIT", 10_000)
+
+
+def max_entries() -> int:
+    return getattr(settings, "NEWS_TIMELINE_MAX_ENTRIES", 1000)
+
+
+def pull_category_ids() -> frozenset[int]:
+    """Большие категории — читаются при чтении, а не раскладываются."""
+    return page_cache.cached_fragment(
+        "timeline-pull-categories",
+        lambda: frozenset(
+            Category.objects.filter(subscriber_count__gt=fanout_limit()).values_list(
+                "pk", flat=True
+            )
+        ),
+        scopes=[page_cache.CATEGORIES],
+    )
+
+
+def push_posts(post_ids: list[int]) -> int:
+    """Разложить посты по лентам подписчиков; вернуть число записей в пачках."""
+    pulled = pull_category_ids()
+    posts_by_category: dict[int, list[int]] = defaultdict(list)
+    links = PostCategory.objects.filter(post_id__in=post_ids).values_list(
+        "post_id", "category_id"
+    )
+    for post_id, category_id in links:
+        if category_id not in pulled:
+            posts_by_category[category_id].append(post_id)
+    if not posts_by_category:
+        return 0
+
+    created_at = dict(
+        Post.objects.filter(pk__in=post_ids).values_list("pk", "created_at")
+    )
+    subscribers = (
+        Category.subscribers.through.objects.filter(category_id__in=posts_by_category)
+        .order_by("user_id")
+        .values_list("user_id", "category_id")
+    )
+
+    pushed = 0
+    batch: list[TimelineEntry] = []
+    last_user_id, delivered = None, set()
+    for user_id, category_id in subscribers.iterator(chunk_size=BATCH_SIZE):
+        if user_id != last_user_id:
+            last_user_id, delivered = user_id, set()
+        for post_id in posts_by_category[category_id]:
+            # пост из нескольких категорий пользователя — одна запись
+            if post_id in delivered or post_id not in created_at:
+                continue
+            delivered.add(post_id)
+            batch.append(
+                TimelineEntry(
+                    user_id=user_id, post_id=post_id, created_at=created_at[post_id]
+                )
+            )
+        if len(batch) >= BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            pushed += len(batch)
+            batch = []
+    if batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        pushed += len(batch)
+    return pushed
+
+
+def timeline_page(
+    user, cursor: str | None, per_page: int, queryset: QuerySet | None = None
+) -> KeysetPage:
+    """
+    Страница ленты после ``cursor`` (только вперёд): ``per_page + 1`` записей
+    из таблицы плюс столько же постов больших категорий, слитые по дате.
+    ``queryset`` задаёт, как загрузить сами посты (модели или ``values()``).
+    """
+    decoded = decode_cursor(cursor, len(ORDERING))
+    values = decoded[0] if decoded and decoded[1] else None
+
+    entries = TimelineEntry.objects.filter(user_id=user.pk)
+    if values:
+        entries = entries.filter(keyset_filter(ENTRY_ORDERING, values, True))
+    keys = set(
+        entries.order_by(*ENTRY_ORDERING).values_list("created_at", "post_id")[
+            : per_page + 1
+        ]
+    )
+
+    pulled = subscriptions.subscribed_category_ids(user) & pull_category_ids()
+    if pulled:
+        posts = Post.objects.filter(
+            Exists(
+                PostCategory.objects.filter(
+                    post_id=OuterRef("pk"), category_id__in=pulled
+                )
+            )
+        )
+        if values:
+            posts = posts.filter(keyset_filter(ORDERING, values, True))
+        keys.update(
+            posts.order_by(*ORDERING).values_list("created_at", "id")[: per_page + 1]
+        )
+
+    merged = sorted(keys, reverse=True)
+    page_ids = [post_id for _, post_id in merged[:per_page]]
+    if queryset is None:
+        queryset = Post.objects.all()
+    rows = {
+        (row["id"] if isinstance(row, dict) else row.pk): row
+        for row in queryset.filter(pk__in=page_ids)
+    }
+    return KeysetPage(
+        [rows[pk] for pk in page_ids if pk in rows],
+        ORDERING,
+        has_next=len(merged) > per_page,
+        has_previous=False,
+    )
+
+
+def trim_timelines(limit: int | None = None) -> int:
+    """Удалить записи сверх ``limit`` последних у каждого пользователя."""
+    limit = max_entries() if limit is None else limit
+    overflowing = (
+        TimelineEntry.objects.values("user_id")
+        .annotate(n=Count("*"))
+        .filter(n__gt=limit)
+        .values_list("user_id", flat=True)
+    )
+    deleted = 0
+    for user_id in overflowing:
+        entries = TimelineEntry.objects.filter(user_id=user_id)
+        # последняя из оставляемых записей; всё, что после неё, — удалить
+        boundary = entries.order_by(*ENTRY_ORDERING).values_list(
+            "created_at", "post_id"
+        )[limit - 1]
+        deleted += entries.filter(
+            keyset_filter(ENTRY_ORDERING, list(boundary), True)
+        ).delete()[0]
+    return deleted
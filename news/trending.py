@@ -0,0 +1,332 @@
+"""
+Рейтинг «в тренде»: посты по голосам и комментариям с затуханием во времени.
+
+Очки считаются по схеме forward decay: событие в момент ``t`` весит
+``w · 2^((t − L) / H)``, где ``H`` — ``NEWS_TRENDING_HALF_LIFE_HOURS``, а ``L`` —
+момент последнего пересчёта (landmark). Множитель у всех постов общий, поэтому
+порядок тот же, что у «честно» затухающих очков, но накопленное не нужно
+пересчитывать: новый голос или комментарий только прибавляет своё слагаемое.
+
+``refresh()`` (раз в ``NEWS_TRENDING_REFRESH_INTERVAL`` секунд) строит снимок с
+нуля за окно ``NEWS_TRENDING_WINDOW_DAYS``: рейтинг поста считается
+выставленным в момент публикации, комментарии — в момент написания. Снимок
+пишется в таблицу ``TrendingScore`` и в кеш: очки каждого поста (целые —
+``cache.incr`` атомарен) и отсортированный top-``NEWS_TRENDING_SIZE`` на каждую
+выборку: все посты, тип, категория, тип в категории. Ключи кеша содержат
+landmark, так что пересчёт переключает их разом.
+
+Между пересчётами ``record_votes()`` (пачкой из ``flush_votes()`` — клик
+по-прежнему не трогает БД) и ``record_comment()`` прибавляют очки и
+переставляют пост в списках его выборок — O(N) на список, без сортировки
+таблицы. ``top()`` — срез готового списка; пропавший из кеша список
+восстанавливается из таблицы. Гонка двух процессов на одном списке может
+потерять перестановку (не очки) — до ближайшего пересчёта. Голоса за посты
+старше окна пересчёт не видит: времени голоса в БД нет.
+
+Множитель ``2^((t − L) / H)`` растёт без предела, если пересчёты не идут
+(планировщик остановлен). Поэтому запись очков сама переносит landmark —
+пересчитывает снимок, — как только показатель превысил ``MAX_EXPONENT``.
+"""
+
+from __future__ import annotations
+
+import bisect
+import heapq
+from collections import defaultdict
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from .models import Comment, Post, PostCategory, TrendingScore
+
+SCALE = 1000  # очки хранятся целыми: тысячные доли
+EPOCH_KEY = "trending:epoch"
+KEY_TIMEOUT = 24 * 3600
+BATCH_SIZE = 2000
+# множитель до 2^16: очки остаются далеко от предела 64-битного incr
+MAX_EXPONENT = 16
+RESCALE_LOCK_KEY = "trending:rescale"
+RESCALE_LOCK_TIMEOUT = 600
+
+
+def half_life() -> timedelta:
+    return timedelta(hours=getattr(settings, "NEWS_TRENDING_HALF_LIFE_HOURS", 12))
+
+
+def window() -> timedelta:
+    return timedelta(days=getattr(settings, "NEWS_TRENDING_WINDOW_DAYS", 3))
+
+
+def comment_weight() -> float:
+    return getattr(settings, "NEWS_TRENDING_COMMENT_WEIGHT", 2.0)
+
+
+def size() -> int:
+    return getattr(settings, "NEWS_TRENDING_SIZE", 100)
+
+
+def _points(weight: float, moment: datetime, landmark: datetime) -> int:
+    return round(weight * SCALE * 2 ** ((moment - landmark) / half_life()))
+
+
+def scope(post_type: str | None = None, category_id: int | None = None) -> str:
+    return f"{post_type or '*'}:{category_id or '*'}"
+
+
+def _post_scopes(post_type: str, category_ids) -> list[str]:
+    return [scope(t, c) for t in (None, post_type) for c in (None, *category_ids)]
+
+
+def _score_key(epoch: int, post_id: int) -> str:
+    return f"trending:{epoch}:score:{post_id}"
+
+
+def _scopes_key(epoch: int, post_id: int) -> str:
+    return f"trending:{epoch}:scopes:{post_id}"
+
+
+def _top_key(epoch: int, name: str) -> str:
+    return f"trending:{epoch}:top:{name}"
+
+
+def _as_datetime(epoch: int) -> datetime:
+    return datetime.fromtimestamp(epoch, tz=dt_timezone.utc)
+
+
+def _epoch() -> int:
+    """Landmark (unix-время): из кеша, иначе из таблицы, иначе — сейчас."""
+    epoch = cache.get(EPOCH_KEY)
+    if epoch is None:
+        landmark = TrendingScore.objects.values_list("landmark", flat=True).first()
+        epoch = int((landmark or timezone.now()).timestamp())
+        if not cache.add(EPOCH_KEY, epoch, None):
+            epoch = cache.get(EPOCH_KEY, epoch)
+    return epoch
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Инкрементальные обновления
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+def _add_scores(epoch: int, points: dict[int, int]) -> dict[int, int]:
+    """Прибавить очки в кеше; вернуть новые значения ``{post_id: очки}``."""
+    scores, missing = {}, []
+    for pk, value in points.items():
+        try:
+            scores[pk] = cache.incr(_score_key(epoch, pk), value)
+        except ValueError:
+            missing.append(pk)
+    if missing:
+        # ключа нет: пост вне снимка или вытеснен — база из таблицы
+        base = dict(
+            TrendingScore.objects.filter(
+                post_id__in=missing, landmark=_as_datetime(epoch)
+            ).values_list("post_id", "score")
+        )
+        for pk in missing:
+            key, value = _score_key(epoch, pk), base.get(pk, 0) + points[pk]
+            if cache.add(key, value, KEY_TIMEOUT):
+                scores[pk] = value
+            else:
+                scores[pk] = cache.incr(key, points[pk])
+    return scores
+
+
+def _scopes_of(epoch: int, pks: list[int]) -> dict[int, list[str]]:
+    keys = {pk: _scopes_key(epoch, pk) for pk in pks}
+    found = cache.get_many(keys.values())
+    scopes = {pk: found[key] for pk, key in keys.items() if key in found}
+    missing = [pk for pk in pks if pk not in scopes]
+    if missing:
+        types = dict(Post.objects.filter(pk__in=missing).values_list("pk", "type"))
+        categories: dict[int, list[int]] = defaultdict(list)
+        links = PostCategory.objects.filter(post_id__in=types).values_list(
+            "post_id", "category_id"
+        )
+        for post_id, category_id in links:
+            categories[post_id].append(category_id)
+        fresh = {pk: _post_scopes(types[pk], categories[pk]) for pk in types}
+        cache.set_many({keys[pk]: value for pk, value in fresh.items()}, KEY_TIMEOUT)
+        scopes.update(fresh)
+    return scopes
+
+
+def _place(entries: list, post_id: int, score: int, limit: int) -> list:
+    """Переставить пост в списке ``[(-очки, post_id)]`` (по возрастанию)."""
+    entries = [entry for entry in entries if entry[1] != post_id]
+    item = (-score, post_id)
+    if score > 0 and (len(entries) < limit or item < entries[-1]):
+        bisect.insort(entries, item)
+        del entries[limit:]
+    return entries
+
+
+def _rescale(now: datetime) -> bool:
+    """Перенести landmark в ``now`` пересчётом; False — переносит другой процесс."""
+    if not cache.add(RESCALE_LOCK_KEY, 1, RESCALE_LOCK_TIMEOUT):
+        return False
+    try:
+        refresh(now)
+    finally:
+        cache.delete(RESCALE_LOCK_KEY)
+    return True
+
+
+def _record(weights: dict[int, float]) -> None:
+    now = timezone.now()
+    epoch = _epoch()
+    if (now - _as_datetime(epoch)) / half_life() > MAX_EXPONENT:
+        # снимок из БД уже включает эти события; пока переносит другой
+        # процесс, пишем в ключи прежнего landmark — их вот-вот заменят
+        if _rescale(now):
+            return
+        epoch = _epoch()
+    landmark = _as_datetime(epoch)
+    points = {pk: _points(weight, now, landmark) for pk, weight in weights.items()}
+    scores = _add_scores(epoch, {pk: value for pk, value in points.items() if value})
+    if not scores:
+        return
+    scopes = _scopes_of(epoch, list(scores))
+    lists = cache.get_many(
+        {_top_key(epoch, name) for pk in scores for name in scopes.get(pk, ())}
+    )
+    limit = size()
+    for pk, score in scores.items():
+        for name in scopes.get(pk, ()):
+            key = _top_key(epoch, name)
+            if key in lists:
+                lists[key] = _place(lists[key], pk, score, limit)
+    cache.set_many(lists, KEY_TIMEOUT)
+
+
+def record_votes(deltas: dict[int, int]) -> None:
+    """Учесть голоса ``{post_id: дельта}`` (из flush_votes или без буфера)."""
+    _record(deltas)
+
+
+def record_comment(post_id: int) -> None:
+    _record({post_id: comment_weight()})
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Чтение
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+def _build(epoch: int, post_type: str | None, category_id: int | None) -> list:
+    """Список выборки из таблицы; очки, набранные после пересчёта, — из кеша."""
+    rows = TrendingScore.objects.filter(landmark=_as_datetime(epoch), score__gt=0)
+    if post_type:
+        rows = rows.filter(post__type=post_type)
+    if category_id:
+        rows = rows.filter(post__categories=category_id)
+    rows = list(
+        rows.order_by("-score", "post_id").values_list("post_id", "score")[: size()]
+    )
+    current = cache.get_many([_score_key(epoch, post_id) for post_id, _ in rows])
+    entries = [
+        (-current.get(_score_key(epoch, post_id), score), post_id)
+        for post_id, score in rows
+    ]
+    return sorted(entry for entry in entries if entry[0] < 0)
+
+
+def top(
+    limit: int, post_type: str | None = None, category_id: int | None = None
+) -> list[int]:
+    """id постов «в тренде» по убыванию очков (не больше ``NEWS_TRENDING_SIZE``)."""
+    epoch = _epoch()
+    key = _top_key(epoch, scope(post_type, category_id))
+    entries = cache.get(key)
+    if entries is None:
+        entries = _build(epoch, post_type, category_id)
+        cache.set(key, entries, KEY_TIMEOUT)
+    return [post_id for _, post_id in entries[:limit]]
+
+
+def top_posts(
+    queryset: QuerySet,
+    limit: int,
+    post_type: str | None = None,
+    category_id: int | None = None,
+) -> list:
+    """Посты из ``top()`` в порядке рейтинга, загруженные через ``queryset``."""
+    ids = top(limit, post_type, category_id)
+    rows = {
+        (row["id"] if isinstance(row, dict) else row.pk): row
+        for row in queryset.filter(pk__in=ids)
+    }
+    return [rows[pk] for pk in ids if pk in rows]
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Пересчёт
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+def refresh(now: datetime | None = None) -> int:
+    """Пересчитать снимок с нуля; вернуть число постов с ненулевыми очками."""
+    landmark = (now or timezone.now()).replace(microsecond=0)
+    since = landmark - window()
+
+    totals: dict[int, float] = defaultdict(float)
+    posts = Post.objects.filter(created_at__gte=since).values_list(
+        "pk", "rating", "created_at"
+    )
+    for pk, rating, created_at in posts.iterator(chunk_size=BATCH_SIZE):
+        totals[pk] += _points(rating, created_at, landmark)
+    weight = comment_weight()
+    comments = Comment.objects.filter(created_at__gte=since).values_list(
+        "post_id", "created_at"
+    )
+    for post_id, created_at in comments.iterator(chunk_size=BATCH_SIZE):
+        totals[post_id] += _points(weight, created_at, landmark)
+    scores = {pk: round(total) for pk, total in totals.items() if round(total)}
+
+    ids = list(scores)
+    types: dict[int, str] = {}
+    categories: dict[int, list[int]] = defaultdict(list)
+    for start in range(0, len(ids), BATCH_SIZE):
+        chunk = ids[start : start + BATCH_SIZE]
+        types.update(Post.objects.filter(pk__in=chunk).values_list("pk", "type"))
+        links = PostCategory.objects.filter(post_id__in=chunk).values_list(
+            "post_id", "category_id"
+        )
+        for post_id, category_id in links:
+            categories[post_id].append(category_id)
+    # пост могли удалить, пока шёл подсчёт
+    scores = {pk: score for pk, score in scores.items() if pk in types}
+
+    with transaction.atomic():
+        TrendingScore.objects.all().delete()
+        TrendingScore.objects.bulk_create(
+            [
+                TrendingScore(post_id=pk, score=score, landmark=landmark)
+                for pk, score in scores.items()
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+    epoch = int(landmark.timestamp())
+    values: dict[str, object] = {}
+    by_scope: dict[str, list[tuple[int, int]]] = defaultdict(list)
+    for pk, score in scores.items():
+        scopes = _post_scopes(types[pk], categories[pk])
+        values[_score_key(epoch, pk)] = score
+        values[_scopes_key(epoch, pk)] = scopes
+        if score > 0:
+            for name in scopes:
+                by_scope[name].append((-score, pk))
+    limit = size()
+    for name, entries in by_scope.items():
+        values[_top_key(epoch, name)] = heapq.nsmallest(limit, entries)
+    cache.set_many(values, KEY_TIMEOUT)
+    # новый landmark — последним: до него читатели видят прежний снимок
+    cache.set(EPOCH_KEY, epoch, None)
+    return len(scores)
@@ -4,6 +4,8 @@ from django.urls import path
 from .views import (
     home,
     news_list,
+    my_feed,
+    trending_posts,
     news_detail,
     news_search,
     PostCreateView,
@@ -13,6 +15,7 @@ from .views import (
     category_detail,
     subscribe_category,
     unsubscribe_category,
+    unsubscribe_by_token,
     custom_logout,
     post_list,
     set_language,
@@ -25,6 +28,8 @@ urlpatterns = [
     path("", home, name="home"),
     path("posts/", news_list, name="news_list"),
     path("posts/search/", news_search, name="news_search"),
+    path("posts/my/", my_feed, name="my_feed"),
+    path("posts/trending/", trending_posts, name="trending"),
     path("posts/<int:pk>/", news_detail, name="news_detail"),
 
     path("posts/create/news/", PostCreateView.as_view(extra_context={"type": "NW"}), name="post_create_news"),
@@ -36,6 +41,7 @@ urlpatterns = [
     path("categories/<int:pk>/", category_detail, name="category_detail"),
     path("categories/<int:pk>/subscribe/", subscribe_category, name="category_subscribe"),
     path("categories/<int:pk>/unsubscribe/", unsubscribe_category, name="category_unsubscribe"),
+    path("categories/unsubscribe/<str:token>/", unsubscribe_by_token, name="category_unsubscribe_token"),
 
     path("logout/", custom_logout, name="logout"),
     path("posts/by-category/", post_list, name="post_list"),
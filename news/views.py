@@ -1,31 +1,53 @@
 from __future__ import annotations
 
 from datetime import datetime
+from urllib.parse import urlencode
 
-from rest_framework import viewsets
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.permissions import (
+    IsAuthenticated,
     IsAuthenticatedOrReadOnly,
     BasePermission,
     SAFE_METHODS,
 )
 
 from .forms import TimezoneForm
-from .models import Category, Post, PostType
-from .serializers import PostSerializer
+from . import cache as page_cache
+from . import metrics, subscriptions, timeline, trending
+from .bulk import bulk_save_posts
+from .cache import versioned_cache_page
+from .emails import read_unsubscribe_token
+from .models import Category, Post, PostCategory, PostType
+from .pagination import DEFAULT_ORDERING, PostCursorPagination, paginate_request
+from .search import search_posts
+from .serializers import (
+    FieldSelection,
+    PostBulkSerializer,
+    PostSerializer,
+    PostValuesSerializer,
+    SubscriptionChangeSerializer,
+    bulk_max_items,
+)
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
-from django.core.paginator import Paginator
-from django.db.models import Q, QuerySet
-from django.http import HttpRequest, HttpResponse
+from django.db.models import Exists, OuterRef, Q, QuerySet
+from django.http import Http404, HttpRequest, HttpResponse, HttpResponseForbidden
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
 from django.utils import translation
+from django.utils.crypto import constant_time_compare
 from django.utils.translation import activate
 from django.utils.translation import gettext_lazy as _
-from django.views.decorators.cache import cache_page
+from django.views.decorators.cache import cache_page, never_cache
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
 from django.views.generic import CreateView, DeleteView, DetailView, UpdateView
 
 
@@ -45,46 +67,108 @@ def home(request: HttpRequest) -> HttpResponse:
 # ────────────────────────────────────────────────────────────────────────────────
 
 
-@cache_page(600)
+SUBSCRIBERS_PAGE_SIZE = 50
+
+
+@versioned_cache_page(scopes=lambda request, pk: [page_cache.category_scope(pk)])
 def category_detail(request: HttpRequest, pk: int) -> HttpResponse:
-    """Страница одной категории."""
-    category = get_object_or_404(
-        Category.objects.prefetch_related("subscribers"), pk=pk
+    """
+    Страница одной категории. Количество берётся из ``subscriber_count``,
+    подписчики — keyset-страницами, подписка текущего пользователя — из
+    кешированного набора (news.subscriptions).
+    """
+    category = get_object_or_404(Category, pk=pk)
+    subscribers = paginate_request(
+        request,
+        category.subscribers.only("id", "username"),
+        SUBSCRIBERS_PAGE_SIZE,
+        ordering=("id",),
+        total=category.subscriber_count,
+    )
+    return render(
+        request,
+        "categories/detail.html",
+        {
+            "category": category,
+            "subscribers": subscribers,
+            "is_subscribed": category.pk in subscriptions.for_request(request),
+        },
     )
-    return render(request, "categories/detail.html", {"category": category})
 
 
-@cache_page(600)
+@versioned_cache_page(scopes=[page_cache.CATEGORIES])
 def category_list(request: HttpRequest) -> HttpResponse:
-    """Список всех категорий."""
+    """Список всех категорий со счётчиками; подписки пользователя — из кеша."""
     categories = Category.objects.all().order_by("name")
-    return render(request, "categories/list.html", {"categories": categories})
+    return render(
+        request,
+        "categories/list.html",
+        {
+            "categories": categories,
+            "subscribed_ids": subscriptions.for_request(request),
+        },
+    )
+
+
+def _category_name_or_404(pk: int) -> str:
+    """Название из кешированного списка категорий — без запроса к БД."""
+    name = dict(_category_choices()).get(pk)
+    if name is None:
+        raise Http404
+    return name
 
 
 @login_required
 def subscribe_category(request: HttpRequest, pk: int) -> HttpResponse:
     """Подписка на категорию."""
-    category = get_object_or_404(Category, pk=pk)
-    category.subscribe(request.user)
+    name = _category_name_or_404(pk)
+    subscriptions.change_subscriptions(request.user, subscribe=[pk])
     messages.success(
         request,
         _("Вы подписались на категорию «%(name)s».")
-        % {"name": category.name},
+        % {"name": name},
     )
-    return redirect("category_detail", pk=category.pk)
+    return redirect("news:category_detail", pk=pk)
 
 
 @login_required
 def unsubscribe_category(request: HttpRequest, pk: int) -> HttpResponse:
     """Отписка от категории."""
-    category = get_object_or_404(Category, pk=pk)
-    category.unsubscribe(request.user)
+    name = _category_name_or_404(pk)
+    subscriptions.change_subscriptions(request.user, unsubscribe=[pk])
+    messages.info(
+        request,
+        _("Вы отписались от категории «%(name)s».")
+        % {"name": name},
+    )
+    return redirect("news:category_detail", pk=pk)
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def unsubscribe_by_token(request: HttpRequest, token: str) -> HttpResponse:
+    """
+    Отписка по подписанной ссылке из письма (без логина). GET только
+    показывает подтверждение — сканеры ссылок в почте никого не отпишут;
+    отписывает POST: кнопка на странице или почтовый клиент по RFC 8058
+    (``List-Unsubscribe-Post``). CSRF-токен не нужен: полномочия даёт ссылка.
+    """
+    payload = read_unsubscribe_token(token)
+    if payload is None:
+        messages.error(request, _("Ссылка для отписки недействительна."))
+        return redirect("news:category_list")
+
+    user_id, category_id = payload
+    category = get_object_or_404(Category, pk=category_id)
+    if request.method == "GET":
+        return render(request, "categories/unsubscribe.html", {"category": category})
+    category.subscribers.remove(user_id)
     messages.info(
         request,
         _("Вы отписались от категории «%(name)s».")
         % {"name": category.name},
     )
-    return redirect("category_detail", pk=category.pk)
+    return redirect("news:category_list")
 
 
 # ────────────────────────────────────────────────────────────────────────────────
@@ -103,15 +187,48 @@ def custom_logout(request: HttpRequest) -> HttpResponse:
 # ────────────────────────────────────────────────────────────────────────────────
 
 
+NEWS_PAGE_SIZE = 5
+LIST_DEFERRED_FIELDS = ("text", "censored_text")
+
+
 def _post_base_qs() -> QuerySet[Post]:
     """Базовый queryset для Post с жадными загрузками."""
     return (
         Post.objects.select_related("author__user")
         .prefetch_related("categories")
-        .order_by("-created_at")
+        .order_by(*DEFAULT_ORDERING)
+    )
+
+
+def _post_list_qs() -> QuerySet[Post]:
+    """Для лент: тело поста не грузим, шаблону хватает preview_text."""
+    return _post_base_qs().defer(*LIST_DEFERRED_FIELDS)
+
+
+def _category_choices() -> list[tuple[int, str]]:
+    """(id, название) всех категорий из кеша; сбрасывается поколением CATEGORIES."""
+    return page_cache.cached_fragment(
+        "category-choices",
+        lambda: list(Category.objects.order_by("name").values_list("id", "name")),
+        scopes=[page_cache.CATEGORIES],
     )
 
 
+def _selected_category_ids(
+    values: list[str], categories: list[tuple[int, str]]
+) -> list[int]:
+    """id категорий из ``?category=``: число или точное название (без регистра)."""
+    by_name = {name.casefold(): pk for pk, name in categories}
+    known = set(by_name.values())
+    ids = []
+    for value in values:
+        value = value.strip()
+        pk = int(value) if value.isdigit() else by_name.get(value.casefold())
+        if pk in known:
+            ids.append(pk)
+    return list(dict.fromkeys(ids))
+
+
 def _parse_iso_date(value: str) -> datetime | None:
     """Безопасный парсер ISO-даты для фильтра `created_at__gte`."""
     if not value:
@@ -128,22 +245,76 @@ def _parse_iso_date(value: str) -> datetime | None:
 # ────────────────────────────────────────────────────────────────────────────────
 
 
-@cache_page(300)
+@versioned_cache_page(scopes=[page_cache.GLOBAL])
 def news_list(request: HttpRequest) -> HttpResponse:
     """Список постов с пагинацией (основная лента)."""
-    qs = _post_base_qs()
-    paginator = Paginator(qs, 5)
-    page_obj = paginator.get_page(request.GET.get("page"))
+    page_obj = paginate_request(request, _post_list_qs(), NEWS_PAGE_SIZE)
     return render(request, "news/list.html", {"page_obj": page_obj})
 
 
+@login_required
+def my_feed(request: HttpRequest) -> HttpResponse:
+    """Персональная лента «мои категории» (news.timeline), страницы по курсору."""
+    page_obj = timeline.timeline_page(
+        request.user, request.GET.get("cursor"), NEWS_PAGE_SIZE, _post_list_qs()
+    )
+    if page_obj.next_cursor:
+        page_obj.next_query = urlencode({"cursor": page_obj.next_cursor})
+    return render(request, "news/my_feed.html", {"page_obj": page_obj})
+
+
+def _trending_params(params) -> tuple[str | None, int | None, int]:
+    """``?type=``, ``?category=`` (id, иначе 404) и ``?limit=`` для «в тренде»."""
+    post_type = params.get("type", "").strip().upper()
+    if post_type not in PostType.values:
+        post_type = None
+    category_id = None
+    if params.get("category"):
+        try:
+            category_id = int(params["category"])
+        except ValueError:
+            raise Http404 from None
+        _category_name_or_404(category_id)
+    try:
+        limit = int(params.get("limit", NEWS_PAGE_SIZE))
+    except ValueError:
+        limit = NEWS_PAGE_SIZE
+    return post_type, category_id, min(max(limit, 1), trending.size())
+
+
+def trending_posts(request: HttpRequest) -> HttpResponse:
+    """Посты «в тренде» (news.trending): готовый top-N из кеша, без сортировки."""
+    post_type, category_id, limit = _trending_params(request.GET)
+    posts = trending.top_posts(_post_list_qs(), limit, post_type, category_id)
+    return render(
+        request,
+        "news/trending.html",
+        {
+            "posts": posts,
+            "post_types": PostType.choices,
+            "categories": _category_choices(),
+            "selected_type": post_type,
+            "selected_category": category_id,
+        },
+    )
+
+
+@versioned_cache_page(
+    # названия категорий, имя автора и цензура — тоже часть страницы
+    scopes=lambda request, pk: [
+        page_cache.post_scope(pk),
+        page_cache.CATEGORIES,
+        page_cache.AUTHORS,
+        page_cache.CENSOR,
+    ]
+)
 def news_detail(request: HttpRequest, pk: int) -> HttpResponse:
     """Детальная страница поста (через pk)."""
     post = get_object_or_404(_post_base_qs(), pk=pk)
     return render(request, "news/detail.html", {"post": post})
 
 
-@cache_page(120)
+@versioned_cache_page(scopes=[page_cache.GLOBAL])
 def news_search(request: HttpRequest) -> HttpResponse:
     """
     Поиск с простыми фильтрами.
@@ -156,9 +327,6 @@ def news_search(request: HttpRequest) -> HttpResponse:
 
     filters = Q()
 
-    if query:
-        filters &= Q(title__icontains=query) | Q(text__icontains=query)
-
     if author_name:
         filters &= Q(author__user__username__icontains=author_name)
 
@@ -176,9 +344,13 @@ def news_search(request: HttpRequest) -> HttpResponse:
     if post_type_raw in valid_types:
         filters &= Q(type=post_type_raw)
 
-    qs = _post_base_qs().filter(filters)
-    paginator = Paginator(qs, 5)
-    page_obj = paginator.get_page(request.GET.get("page"))
+    qs = _post_list_qs().filter(filters)
+    ordering = DEFAULT_ORDERING
+    if query:
+        # индекс вместо LIKE '%q%' по всему Post.text; сортировка — по релевантности
+        qs = search_posts(qs, query)
+        ordering = ("-search_rank", *DEFAULT_ORDERING)
+    page_obj = paginate_request(request, qs, NEWS_PAGE_SIZE, ordering)
 
     context = {
         "page_obj": page_obj,
@@ -296,24 +468,45 @@ class PostDetailView(DetailView):
     context_object_name = "post"
 
 
+@versioned_cache_page(scopes=[page_cache.GLOBAL, page_cache.CATEGORIES])
 def post_list(request: HttpRequest) -> HttpResponse:
     """
-    Список постов с фильтрацией по категории через query-param `?category=...`.
-    Без пагинации — полезен, если нужна отдельная страница с фильтром.
+    Лента с фильтром по категориям: ``?category=<id>`` (можно несколько; для
+    старых ссылок принимается и точное название). Фильтр — полусоединение
+    EXISTS по индексу PostCategory без JOIN и DISTINCT, страницы — keyset.
     """
-    category_name = request.GET.get("category", "").strip()
-    qs = _post_base_qs()
-    if category_name:
-        qs = qs.filter(categories__name__icontains=category_name)
-
-    categories = Category.objects.all().order_by("name")
+    categories = _category_choices()
+    requested = [v for v in request.GET.getlist("category") if v.strip()]
+    category_ids = _selected_category_ids(requested, categories)
+
+    qs = _post_list_qs()
+    total = None
+    if category_ids:
+        qs = qs.filter(
+            Exists(
+                PostCategory.objects.filter(
+                    post_id=OuterRef("pk"), category_id__in=category_ids
+                )
+            )
+        )
+        if len(category_ids) == 1:
+            # денормализованный счётчик вместо COUNT(*) по полусоединению
+            total = (
+                Category.objects.filter(pk=category_ids[0])
+                .values_list("post_count", flat=True)
+                .first()
+            )
+    elif requested:
+        qs, total = qs.none(), 0  # категория указана, но не найдена
+
+    page_obj = paginate_request(request, qs, NEWS_PAGE_SIZE, total=total)
     return render(
         request,
         "news/post_list.html",
         {
-            "posts": qs,
+            "page_obj": page_obj,
             "categories": categories,
-            "selected_category": category_name,
+            "selected_ids": set(category_ids),
         },
     )
 
@@ -354,6 +547,24 @@ def set_timezone(request: HttpRequest) -> HttpResponse:
     return render(request, "settings/set_timezone.html", {"form": form})
 
 
+@never_cache
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    """
+    Метрики в текстовом формате Prometheus (сумма по всем воркерам).
+    Доступны персоналу (is_staff) или по заголовку ``Authorization: Bearer ...``
+    с NEWS_METRICS_TOKEN; без токена скрейпер не пустят.
+    """
+    token = getattr(settings, "NEWS_METRICS_TOKEN", "")
+    has_token = bool(token) and constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    )
+    if not (has_token or request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 # ────────────────────────────────────────────────────────────────────────────────
 # DRF ViewSets
 # ────────────────────────────────────────────────────────────────────────────────
@@ -386,35 +597,206 @@ class IsAuthorOrReadOnly(BasePermission):
 
         return False
 
+    def has_bulk_object_permission(self, request, view, queryset) -> bool:
+        """То же для пачки объектов — одним запросом, а не по объекту."""
+        if request.user.is_superuser:
+            return True
+        return not queryset.exclude(author__user=request.user).exists()
+
+
+class FieldSelectionMixin:
+    """
+    ``?fields=`` / ``?exclude=`` / ``?expand=author,categories`` для чтения.
+    Невостребованные поля пропадают и из ответа, и из SQL (only/prefetch).
+    """
+
+    def get_field_selection(self) -> FieldSelection | None:
+        if self.request.method not in SAFE_METHODS:
+            return None
+        if not hasattr(self, "_field_selection"):
+            self._field_selection = FieldSelection.from_query(
+                self.request.query_params
+            )
+        return self._field_selection
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        selection = self.get_field_selection()
+        return selection.restrict(queryset) if selection else queryset
+
+    def get_serializer(self, *args, **kwargs):
+        selection = self.get_field_selection()
+        if selection is not None:
+            kwargs.setdefault("selection", selection)
+        return super().get_serializer(*args, **kwargs)
+
+
+class FastListMixin(FieldSelectionMixin):
+    """
+    ``list`` без моделей: строки из ``values()`` превращаются в JSON через
+    ``fast_list_serializer_class``. Остальные действия идут через serializer_class.
+    """
+
+    fast_list_serializer_class = PostValuesSerializer
+
+    def list(self, request, *args, **kwargs):
+        reader = self.fast_list_serializer_class(self.get_field_selection())
+        queryset = reader.get_queryset(self.filter_queryset(self.get_queryset()))
+
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(reader.to_representation(queryset))
+        return self.get_paginated_response(reader.to_representation(page))
 
-class NewsViewSet(viewsets.ModelViewSet):
+
+class ConditionalGetMixin:
+    """
+    ETag/Last-Modified для ``list``/``retrieve`` по поколениям кеша: проверка
+    ``If-None-Match``/``If-Modified-Since`` не делает запросов к БД, и 304
+    отдаётся без выборки и сериализации.
+    """
+
+    def get_conditional_scopes(self) -> list[str]:
+        if self.action == "retrieve":
+            scopes = [page_cache.post_scope(self.kwargs[self.lookup_field])]
+        else:
+            # рейтинги в списке — живые, поэтому и голоса меняют ETag
+            scopes = [page_cache.GLOBAL, page_cache.RATINGS]
+        # развёрнутые объекты меняются без записи самого поста
+        expand = self.get_field_selection().expand
+        if "author" in expand:
+            scopes += [page_cache.AUTHORS, page_cache.RATINGS]
+        if "categories" in expand:
+            scopes.append(page_cache.CATEGORIES)
+        return list(dict.fromkeys(scopes))
+
+    def _conditional(self, request, handler, *args, **kwargs):
+        scopes = self.get_conditional_scopes()
+        etag = page_cache.make_etag(
+            request,
+            page_cache.generation_signature(scopes),
+            request.accepted_media_type or "",
+        )
+        modified = page_cache.last_changed(scopes)
+        not_modified = page_cache.conditional_response(request, etag, modified)
+        if not_modified is not None:
+            return not_modified
+        response = handler(request, *args, **kwargs)
+        page_cache.set_validators(response, etag, modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(request, super().retrieve, *args, **kwargs)
+
+
+class NewsViewSet(ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     """API: только посты типа 'Новость'."""
 
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
+    pagination_class = PostCursorPagination
 
 
     def get_queryset(self) -> QuerySet[Post]:
         return _post_base_qs().filter(type=PostType.NEWS.value)
 
 
-class ArticleViewSet(viewsets.ModelViewSet):
+class ArticleViewSet(ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     """API: только посты типа 'Статья'."""
 
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
+    pagination_class = PostCursorPagination
 
 
     def get_queryset(self) -> QuerySet[Post]:
         return _post_base_qs().filter(type=PostType.ARTICLE.value)
 
 
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     """API: все посты."""
 
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
+    pagination_class = PostCursorPagination
 
 
     def get_queryset(self) -> QuerySet[Post]:
         return _post_base_qs()
+
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        """
+        Массовое создание/обновление: список постов в теле запроса
+        (элементы с ``id`` обновляются). Права проверяются один раз на пачку.
+        """
+        serializer = PostBulkSerializer(
+            data=request.data, many=True, max_length=bulk_max_items()
+        )
+        serializer.is_valid(raise_exception=True)
+
+        ids = [item["id"] for item in serializer.validated_data if "id" in item]
+        if ids:
+            targets = Post.objects.filter(pk__in=ids)
+            for permission in self.get_permissions():
+                check = getattr(permission, "has_bulk_object_permission", None)
+                if check is not None and not check(request, self, targets):
+                    self.permission_denied(
+                        request, message=getattr(permission, "message", None)
+                    )
+
+        result = bulk_save_posts(serializer.validated_data)
+        # 201 — только если пачка что-то создала; одни обновления — 200
+        code = status.HTTP_201_CREATED if result.created else status.HTTP_200_OK
+        return Response(result.as_dict(), status=code)
+
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def my(self, request):
+        """Персональная лента: ``next`` — ссылка с курсором, ``results`` — посты."""
+        reader = self.fast_list_serializer_class(self.get_field_selection())
+        page = timeline.timeline_page(
+            request.user,
+            request.query_params.get("cursor"),
+            self.paginator.get_page_size(request),
+            reader.get_queryset(Post.objects.all()),
+        )
+        next_link = None
+        if page.next_cursor:
+            next_link = replace_query_param(
+                request.build_absolute_uri(), "cursor", page.next_cursor
+            )
+        return Response(
+            {"next": next_link, "results": reader.to_representation(page.object_list)}
+        )
+
+    @action(detail=False)
+    def trending(self, request):
+        """Посты «в тренде»: ``?type=``, ``?category=``, ``?limit=``."""
+        post_type, category_id, limit = _trending_params(request.query_params)
+        reader = self.fast_list_serializer_class(self.get_field_selection())
+        rows = trending.top_posts(
+            reader.get_queryset(Post.objects.all()), limit, post_type, category_id
+        )
+        return Response({"results": reader.to_representation(rows)})
+
+
+class SubscriptionViewSet(viewsets.ViewSet):
+    """
+    ``GET /api/subscriptions/`` — id категорий, на которые подписан пользователь;
+    ``POST {"subscribe": [...], "unsubscribe": [...]}`` — изменить много разом.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        ids = subscriptions.subscribed_category_ids(request.user)
+        return Response({"categories": sorted(ids)})
+
+    def create(self, request):
+        serializer = SubscriptionChangeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        subscriptions.change_subscriptions(request.user, **serializer.validated_data)
+        return self.list(request)
@@ -0,0 +1,242 @@
+"""
+Буфер голосов (лайки/дизлайки) с отложенной записью в БД.
+
+Клик не трогает строку поста: дельта копится в счётчике кеша
+``votes:pending:<model>:<pk>``, а в журнал ``votes:log:<seq>`` пишется, что
+объект «грязный». Периодическая задача ``flush_votes()`` сворачивает журнал,
+применяет накопленные дельты пачечными ``UPDATE ... CASE`` (и к объектам, и
+к рейтингам авторов) и вычитает применённое из счётчиков. Чтение — значение
+из БД плюс ещё не сброшенная дельта (``live_rating``), так что голос виден сразу.
+
+Нужен общий для всех процессов кеш (CACHE_URL): голоса копят веб-воркеры, а
+``flush_votes()`` идёт в планировщике или Celery. Поэтому по умолчанию
+буфер включён только с общим кешем, иначе голос сразу пишется в БД; явное
+включение поверх locmem отмечает системная проверка news.W001.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from collections.abc import Iterable
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from . import cache as page_cache
+
+logger = logging.getLogger(__name__)
+
+SEQ_KEY = "votes:seq"
+CURSOR_KEY = "votes:cursor"
+GAP_KEY = "votes:gap"
+FLUSH_LOCK_KEY = "votes:flush-lock"
+LOG_TIMEOUT = 60 * 60 * 24  # записи журнала живут сутки, даже если flush стоит
+UPDATE_BATCH_SIZE = 500
+
+
+def buffer_enabled() -> bool:
+    return getattr(settings, "NEWS_VOTE_BUFFER", False)
+
+
+def _label(model) -> str:
+    return model._meta.label_lower
+
+
+def _pending_key(label: str, pk: int) -> str:
+    return f"votes:pending:{label}:{pk}"
+
+
+def _log_key(seq: int) -> str:
+    return f"votes:log:{seq}"
+
+
+def _incr(key: str, delta: int, timeout=None) -> int:
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        if cache.add(key, delta, timeout):
+            return delta
+        return cache.incr(key, delta)
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Запись и чтение
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+def record_vote(obj, delta: int) -> None:
+    """Учесть голос ``delta`` за ``obj`` без обращения к БД."""
+    label = _label(type(obj))
+    _incr(_pending_key(label, obj.pk), delta)
+    seq = _incr(SEQ_KEY, 1)
+    cache.set(_log_key(seq), (label, obj.pk), LOG_TIMEOUT)
+    if label == "news.post":
+        # live_rating поста изменился: ETag страницы поста и списков API
+        page_cache.bump(page_cache.post_scope(obj.pk), page_cache.RATINGS)
+
+
+def pending_delta(obj) -> int:
+    return cache.get(_pending_key(_label(type(obj)), obj.pk), 0)
+
+
+def pending_deltas(model, pks: Iterable[int]) -> dict[int, int]:
+    """Несброшенные дельты ``{pk: delta}`` для строк без экземпляров моделей."""
+    label = _label(model)
+    keys = {pk: _pending_key(label, pk) for pk in pks}
+    found = cache.get_many(keys.values())
+    return {pk: found[key] for pk, key in keys.items() if found.get(key)}
+
+
+def prefetch_pending_votes(objs: Iterable) -> None:
+    """Проставить ``_pending_votes`` списку объектов одним get_many."""
+    objs = [obj for obj in objs if obj.pk is not None]
+    if not objs:
+        return
+    keys = {obj: _pending_key(_label(type(obj)), obj.pk) for obj in objs}
+    found = cache.get_many(keys.values())
+    for obj, key in keys.items():
+        obj._pending_votes = found.get(key, 0)
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Сброс в БД
+# ────────────────────────────────────────────────────────────────────────────────
+
+
+def _read_log() -> tuple[dict[str, set[int]], int, list[str]]:
+    """
+    Грязные объекты из журнала ``(cursor, seq]``.
+
+    Запись журнала появляется чуть позже номера, поэтому на первой «дыре»
+    чтение останавливается. Дыра, которая пережила прошлый flush, — это
+    упавший писатель, её пропускаем (его дельта всё равно в счётчике и
+    уйдёт со следующим голосом за тот же объект).
+    """
+    start = cursor = cache.get(CURSOR_KEY, 0)
+    last = cache.get(SEQ_KEY, 0)
+    entries = cache.get_many([_log_key(seq) for seq in range(start + 1, last + 1)])
+
+    dirty: dict[str, set[int]] = defaultdict(set)
+    known_gap = cache.get(GAP_KEY)
+    for seq in range(cursor + 1, last + 1):
+        entry = entries.get(_log_key(seq))
+        if entry is None:
+            if seq != known_gap:
+                cache.set(GAP_KEY, seq, None)
+                break
+        else:
+            label, pk = entry
+            dirty[label].add(pk)
+        cursor = seq
+    return dirty, cursor, [_log_key(seq) for seq in range(start + 1, cursor + 1)]
+
+
+def _case(deltas: dict[int, int]) -> Case:
+    return Case(
+        *(When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _apply(model, deltas: dict[int, int]) -> None:
+    items = list(deltas.items())
+    for start in range(0, len(items), UPDATE_BATCH_SIZE):
+        batch = dict(items[start : start + UPDATE_BATCH_SIZE])
+        model.objects.filter(pk__in=batch).update(rating=F("rating") + _case(batch))
+
+
+def _author_deltas(model, deltas: dict[int, int]) -> dict[int, int]:
+    """Вклад голосов в рейтинги авторов: rating_targets() → pk автора."""
+    from .models import Author, Post
+
+    objs = model.objects.only(*model.rating_state_fields).in_bulk(deltas)
+    targets = [
+        (lookup, weight * deltas[pk])
+        for pk, obj in objs.items()
+        for lookup, weight in obj.rating_targets()
+    ]
+
+    # lookup вида {"user_id": ...} / {"posts__pk": ...} сводим к pk автора
+    user_ids = {lk["user_id"] for lk, _ in targets if "user_id" in lk}
+    post_ids = {lk["posts__pk"] for lk, _ in targets if "posts__pk" in lk}
+    by_user = dict(
+        Author.objects.filter(user_id__in=user_ids).values_list("user_id", "pk")
+    )
+    by_post = dict(
+        Post.objects.filter(pk__in=post_ids, author__isnull=False).values_list(
+            "pk", "author_id"
+        )
+    )
+
+    result: dict[int, int] = defaultdict(int)
+    for lookup, delta in targets:
+        if "pk" in lookup:
+            author_id = lookup["pk"]
+        elif "user_id" in lookup:
+            author_id = by_user.get(lookup["user_id"])
+        else:
+            author_id = by_post.get(lookup["posts__pk"])
+        if author_id is not None:
+            result[author_id] += delta
+    return {pk: delta for pk, delta in result.items() if delta}
+
+
+def flush_votes() -> dict[str, int]:
+    """
+    Сбросить накопленные голоса в БД. Возвращает ``{model_label: объектов}``.
+    Одновременно работает только один flush (блокировка в кеше).
+    """
+    from .models import Author
+    from .trending import record_votes
+
+    if not cache.add(FLUSH_LOCK_KEY, 1, 60):
+        return {}
+    try:
+        dirty, cursor, log_keys = _read_log()
+        applied: dict[str, dict[int, int]] = {}
+        author_deltas: dict[int, int] = defaultdict(int)
+
+        for label, pks in dirty.items():
+            keys = {pk: _pending_key(label, pk) for pk in pks}
+            found = cache.get_many(keys.values())
+            deltas = {pk: found[key] for pk, key in keys.items() if found.get(key)}
+            if deltas:
+                model = apps.get_model(label)
+                applied[label] = deltas
+                for pk, delta in _author_deltas(model, deltas).items():
+                    author_deltas[pk] += delta
+
+        with transaction.atomic():
+            for label, deltas in applied.items():
+                _apply(apps.get_model(label), deltas)
+            _apply(Author, {pk: d for pk, d in author_deltas.items() if d})
+
+        # дельты уже в БД: журнал закрываем до всего остального, чтобы
+        # ошибка ниже не привела к повторному применению тех же голосов
+        cache.set(CURSOR_KEY, cursor, None)
+        cache.delete_many(log_keys)
+        # вычитаем ровно применённое: голоса, пришедшие во время flush, остаются
+        for label, deltas in applied.items():
+            for pk, delta in deltas.items():
+                try:
+                    cache.decr(_pending_key(label, pk), delta)
+                except ValueError:
+                    pass  # счётчик вытеснен из кеша — вычитать не из чего
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
+
+    post_label = _label(apps.get_model("news", "Post"))
+    if post_label in applied:
+        page_cache.bump(*(page_cache.post_scope(pk) for pk in applied[post_label]))
+        # очки «в тренде» — пачкой за весь flush, а не на каждый клик
+        record_votes(applied[post_label])
+
+    report = {label: len(deltas) for label, deltas in applied.items()}
+    if report:
+        logger.info("Сброшены голоса: %s", report)
+    return report